@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+''' Plays many games at once, one game_player.py per seed pair.
+
+    Each running game gets its own slot of CPUs, and the driver and its game
+    are pinned to that slot, so games do not migrate between cores or share
+    caches. Cores can also be kept free for the runner itself. Everything
+    after "--" is passed on to game_player.py, e.g.:
+
+    $ python batch_player.py -n 100 -j 4 -- -g game.sps.slfasl -o results.db
+
+    With --in-process the games are played by GameSessions in this process
+    instead of by one game_player.py each, so interpreter startup, imports
+    and building the grammar are paid once for the whole batch. With
+    --zygote the games are forked from a running zygote (zygote_player.py).
+
+    Live metrics (--metrics-port, --metrics-file) are kept by the runner for
+    the whole batch rather than by each game. Turns and stage latencies are
+    only counted for games played --in-process.
+'''
+import os
+import sys
+import copy
+import random
+import subprocess
+from Queue import Queue
+from optparse import OptionParser
+from multiprocessing.pool import ThreadPool
+
+# Modify the python path so module load correctly
+sys.path.insert(0, "./validation")
+sys.path.insert(0, "./player")
+
+import validation
+from affinity import parse_cpus, format_cpus, get_affinity, set_affinity
+from metrics import start_metrics
+from results import ResultStore, STAGES
+from session import GameSession, SessionPool, make_parser
+import zygote
+
+# Largest seed we pick at random
+MAX_SEED = 999999999
+
+# game_player.py options which the runner takes for all of its games, as
+# every game would otherwise try to serve the same port
+RUNNER_OPTIONS = ['--metrics-port', '--metrics-file']
+
+
+def read_seeds(seeds_file):
+    ''' Reads one pair of seeds per line from the given file '''
+    seeds = []
+    for line in seeds_file:
+        if line.strip():
+            first, second = line.split()
+            seeds.append((int(first), int(second)))
+    return seeds
+
+
+def make_slots(cpus, cpus_per_game):
+    ''' Divides the given CPUs into slots of cpus_per_game each '''
+    return [cpus[i:i + cpus_per_game]
+            for i in range(0, len(cpus) - cpus_per_game + 1, cpus_per_game)]
+
+
+def add_metrics_options(parser):
+    ''' Adds the runner's live metrics options to parser '''
+    parser.add_option("--metrics-port", dest="metrics_port", type="int",
+                      help="Serve live metrics of all games on this local port")
+    parser.add_option("--metrics-file", dest="metrics_file", metavar="FILE",
+                      help="Rewrite live metrics to FILE every few seconds")
+
+
+def check_game_args(parser, game_args):
+    ''' Refuses game_player.py options which only the runner can take '''
+    for arg in game_args:
+        if arg.split('=')[0] in RUNNER_OPTIONS:
+            parser.error("Give %s before \"--\", to the runner" %
+                         arg.split('=')[0])
+
+
+def count_exit(metrics, status):
+    ''' Counts a game_player.py which exited with the given wait status.
+        It exits with -1 on an invalid response.
+    '''
+    if not metrics:
+        return
+    if status == 0:
+        metrics.games_finished.inc()
+    elif os.WIFEXITED(status) and os.WEXITSTATUS(status) == 255:
+        metrics.validation_failures.inc()
+
+
+def run_batch(seeds, game_args, slots, jobs, metrics=None):
+    ''' Runs game_player.py once for each pair of seeds, at most jobs at a
+        time. Each game runs on a free slot of CPUs, or unpinned if slots is
+        empty. Returns a list of (seeds, exit status) pairs.
+    '''
+    pending = list(reversed(seeds))
+    free_slots = list(slots) or [None] * jobs
+    running = {} # pid to (seeds, slot)
+    finished = []
+    while pending or running:
+        while pending and free_slots and len(running) < jobs:
+            seed_pair = pending.pop()
+            slot = free_slots.pop(0)
+            command = [sys.executable, 'game_player.py',
+                       '-s', str(seed_pair[0]), '-q', str(seed_pair[1])]
+            if slot:
+                command += ['--cpus', format_cpus(slot)]
+            child = subprocess.Popen(command + game_args)
+            running[child.pid] = (seed_pair, slot)
+            if metrics:
+                metrics.games_started.inc()
+        pid, status = os.waitpid(-1, 0)
+        if pid not in running:
+            continue
+        seed_pair, slot = running.pop(pid)
+        free_slots.append(slot)
+        count_exit(metrics, status)
+        finished.append((seed_pair, status))
+        print 'Seeds %s %s finished with status %s on CPUs %s' % \
+              (seed_pair[0], seed_pair[1], status,
+               slot and format_cpus(slot) or 'any')
+    return finished
+
+
+def run_batch_in_process(seeds, game_args, slots, jobs, metrics=None):
+    ''' Like run_batch, but plays the games in this process. The exit status
+        of a game is 1 if it failed or got an invalid response, else 0.
+    '''
+    game_options, _ = make_parser().parse_args(game_args)
+    store = None
+    if game_options.results:
+        store = ResultStore(game_options.results)
+    pool = SessionPool(jobs, slots, metrics)
+    for seed_pair in seeds:
+        options = copy.copy(game_options)
+        options.random1, options.random2 = seed_pair
+        pool.submit(GameSession(options, validator=validation))
+    finished = []
+    while pool.pending:
+        session = pool.finished()
+        seed_pair = (session.options.random1, session.options.random2)
+        status = int(session.error is not None or
+                     session.player.outcome == 'invalid')
+        if store and session.game:
+            store.record_game(session.game, game_options.record_turns and
+                                            session.turns or None)
+        finished.append((seed_pair, status))
+        print 'Seeds %s %s finished with status %s on CPUs %s' % \
+              (seed_pair[0], seed_pair[1], status,
+               session.game and session.game['cpus'] or 'any')
+    pool.close()
+    if store:
+        store.close()
+    return finished
+
+
+def run_batch_zygote(seeds, game_args, slots, jobs, path, metrics=None):
+    ''' Like run_batch, but has the zygote listening at path fork the games '''
+    free_slots = Queue()
+    for slot in list(slots) or [None] * jobs:
+        free_slots.put(slot)
+
+    def play(seed_pair):
+        slot = free_slots.get()
+        command = ['-s', str(seed_pair[0]), '-q', str(seed_pair[1])]
+        if slot:
+            command += ['--cpus', format_cpus(slot)]
+        if metrics:
+            metrics.games_started.inc()
+        try:
+            return seed_pair, slot, zygote.play(path, command + game_args)
+        finally:
+            free_slots.put(slot)
+
+    finished = []
+    pool = ThreadPool(jobs)
+    for seed_pair, slot, reply in pool.imap_unordered(play, seeds):
+        finished.append((seed_pair, reply['status']))
+        if metrics and 'game' in reply:
+            if reply['game']['outcome'] == 'invalid':
+                metrics.validation_failures.inc()
+            else:
+                metrics.games_finished.inc()
+        print 'Seeds %s %s finished with status %s on CPUs %s' % \
+              (seed_pair[0], seed_pair[1], reply['status'],
+               slot and format_cpus(slot) or 'any')
+        if 'error' in reply:
+            print reply['error']
+    pool.close()
+    return finished
+
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [options] -- [game_player.py options]')
+    parser.add_option("-n", "--count", dest="count", type="int", default=10,
+                      help="Number of games with random seeds to play")
+    parser.add_option("-f", "--seeds", dest="seeds", metavar="FILE",
+                      help="Play one game per pair of seeds in FILE instead")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int",
+                      help="Games to run at once, one per slot by default")
+    parser.add_option("--cpus-per-game", dest="cpus_per_game", type="int",
+                      default=1, help="CPUs in each game's slot")
+    parser.add_option("--runner-cpus", dest="runner_cpus", metavar="LIST",
+                      help="Keep these CPUs for the runner, not for games")
+    parser.add_option("--no-pin", dest="pin", action="store_false",
+                      default=True, help="Do not pin games to CPUs")
+    parser.add_option("--in-process", dest="in_process", action="store_true",
+                      default=False, help="Play the games in this process")
+    parser.add_option("--zygote", dest="zygote", metavar="SOCKET",
+                      help="Have the zygote listening on SOCKET fork the games")
+    add_metrics_options(parser)
+    options, args = parser.parse_args()
+    check_game_args(parser, args)
+
+    if options.seeds:
+        seeds = read_seeds(open(options.seeds))
+    else:
+        seeds = [(random.randint(1, MAX_SEED), random.randint(1, MAX_SEED))
+                 for _ in range(options.count)]
+
+    slots = []
+    cpus = get_affinity()
+    if options.runner_cpus:
+        runner_cpus = parse_cpus(options.runner_cpus)
+        set_affinity(runner_cpus)
+        cpus = [cpu for cpu in cpus if cpu not in runner_cpus]
+    if options.pin:
+        slots = make_slots(cpus, options.cpus_per_game)
+        if not slots:
+            parser.error("Not enough CPUs for one game")
+    jobs = options.jobs or len(slots) or 1
+    if slots:
+        jobs = min(jobs, len(slots))
+
+    metrics, metrics_writer = start_metrics(STAGES, options.metrics_port,
+                                            options.metrics_file)
+    if options.zygote:
+        finished = run_batch_zygote(seeds, args, slots, jobs, options.zygote,
+                                    metrics)
+    elif options.in_process:
+        finished = run_batch_in_process(seeds, args, slots, jobs, metrics)
+    else:
+        finished = run_batch(seeds, args, slots, jobs, metrics)
+    if metrics_writer:
+        metrics_writer.write()
+    failed = [seed_pair for seed_pair, status in finished if status]
+    print '%d games played, %d failed' % (len(finished), len(failed))
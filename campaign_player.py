@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+''' Finds the best player configuration with as few games as possible.
+
+    Each variant is a player configuration: a name followed by the
+    game_player.py options which make it, one per line in a variants file:
+
+        careful     -p SelfPreservationPlayer
+        keep-art    -p SelfPreservationPlayer --ignored-treasure ""
+        fighter     -p FighterPlayer --ignored-weapons "hi there,atomic"
+
+    Without a variants file every player class is a variant. Games are
+    handed out by a scheduler (player/campaign.py) which stops playing
+    variants once they are clearly worse than the leader, and stops the
+    campaign once the leader is clear. The n-th game of every variant is
+    played on the same seeds. Games which crash or get an invalid response
+    are counted apart and not scored. Their seeds are not played again, as
+    they would fail the same way; the variant goes on to the next seeds.
+    Everything after "--" is passed on to game_player.py, e.g.:
+
+    $ python campaign_player.py -f variants.txt -j 4 -- -g game.sps.slfasl
+
+    With --in-process the games are played by GameSessions in this process
+    instead of by one game_player.py each. Live metrics are kept by the
+    campaign for all of its games, as in batch_player.py.
+'''
+import os
+import sys
+import copy
+import random
+import shlex
+import subprocess
+from optparse import OptionParser
+
+# Modify the python path so module load correctly
+sys.path.insert(0, "./validation")
+sys.path.insert(0, "./player")
+
+import validation
+from affinity import format_cpus, get_affinity
+from batch_player import make_slots, add_metrics_options, check_game_args, \
+                         count_exit, MAX_SEED
+from campaign import Scheduler
+from metrics import start_metrics
+from results import ResultStore, STAGES
+from session import GameSession, SessionPool, make_parser, PLAYERS
+
+
+def read_variants(variants_file):
+    ''' Reads a name and game_player.py options per line. Returns a list of
+        (name, options) pairs.
+    '''
+    variants = []
+    for line in variants_file:
+        words = shlex.split(line, comments=True)
+        if words:
+            variants.append((words[0], words[1:]))
+    return variants
+
+
+def game_score(store, name, seed_pair):
+    ''' The score of the given game, 0 if it did not record one '''
+    rows = store.query('SELECT score FROM games WHERE label = ? AND '
+                       'seed1 = ? AND seed2 = ? ORDER BY id DESC LIMIT 1',
+                       (name, seed_pair[0], seed_pair[1]))
+    return rows and rows[0][0] or 0
+
+
+def seeds_for(seeds, run):
+    ''' The seeds of the given game of every variant, picking new ones at
+        random as the campaign goes on
+    '''
+    while len(seeds) <= run:
+        seeds.append((random.randint(1, MAX_SEED), random.randint(1, MAX_SEED)))
+    return seeds[run]
+
+
+def run_campaign(scheduler, variants, game_args, results, slots, jobs,
+                 metrics=None):
+    ''' Plays games until the scheduler has no more to hand out '''
+    options = dict(variants)
+    seeds = [] # The seeds of the n-th game of every variant
+    free_slots = list(slots) or [None] * jobs
+    running = {} # pid to (variant name, run, seeds, slot)
+    while True:
+        while free_slots and len(running) < jobs:
+            name = scheduler.next_variant()
+            if name is None:
+                break
+            run = scheduler.start(name)
+            seed_pair = seeds_for(seeds, run)
+            slot = free_slots.pop(0)
+            command = [sys.executable, 'game_player.py',
+                       '-s', str(seed_pair[0]), '-q', str(seed_pair[1]),
+                       '-o', results, '--label', name]
+            if slot:
+                command += ['--cpus', format_cpus(slot)]
+            child = subprocess.Popen(command + options[name] + game_args)
+            running[child.pid] = (name, run, seed_pair, slot)
+            if metrics:
+                metrics.games_started.inc()
+        if not running:
+            break
+        pid, status = os.waitpid(-1, 0)
+        if pid not in running:
+            continue
+        name, run, seed_pair, slot = running.pop(pid)
+        free_slots.append(slot)
+        count_exit(metrics, status)
+        if status:
+            # Crashed or got an invalid response: no score to go on
+            scheduler.fail(name, run)
+            print '%s on seeds %s %s failed (status %s)' % \
+                  (name, seed_pair[0], seed_pair[1], status)
+            continue
+        store = ResultStore(results)
+        score = game_score(store, name, seed_pair)
+        store.close()
+        scheduler.finish(name, run, score)
+        print '%s on seeds %s %s scored %s' % \
+              (name, seed_pair[0], seed_pair[1], score)
+
+
+def run_campaign_in_process(scheduler, variants, game_args, results, slots,
+                            jobs, metrics=None):
+    ''' Like run_campaign, but plays the games in this process '''
+    variant_options = {}
+    for name, options in variants:
+        variant_options[name], _ = make_parser().parse_args(options +
+                                                            game_args)
+        variant_options[name].label = name
+    store = ResultStore(results)
+    pool = SessionPool(jobs, slots, metrics)
+    seeds = [] # The seeds of the n-th game of every variant
+    runs = {} # Session to its run within its variant
+    while True:
+        while pool.pending < jobs:
+            name = scheduler.next_variant()
+            if name is None:
+                break
+            options = copy.copy(variant_options[name])
+            run = scheduler.start(name)
+            options.random1, options.random2 = seeds_for(seeds, run)
+            session = GameSession(options, validator=validation)
+            runs[session] = run
+            pool.submit(session)
+        if not pool.pending:
+            break
+        session = pool.finished()
+        name, run = session.options.label, runs.pop(session)
+        if session.game:
+            store.record_game(session.game)
+        if session.error is not None or session.player.outcome == 'invalid':
+            scheduler.fail(name, run)
+            print '%s on seeds %s %s failed: %s' % \
+                  (name, session.options.random1, session.options.random2,
+                   session.error or 'invalid response')
+            continue
+        score = session.player.score or 0
+        scheduler.finish(name, run, score)
+        print '%s on seeds %s %s scored %s' % \
+              (name, session.options.random1, session.options.random2, score)
+    pool.close()
+    store.close()
+
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [options] -- [game_player.py options]')
+    parser.add_option("-f", "--variants", dest="variants", metavar="FILE",
+                      help="Player configurations to compare, one per line")
+    parser.add_option("-o", "--results", dest="results", metavar="FILE",
+                      default="campaign.db", help="Results database")
+    parser.add_option("-n", "--max-games", dest="max_games", type="int",
+                      default=500, help="Stop after this many games")
+    parser.add_option("-m", "--min-runs", dest="min_runs", type="int",
+                      default=5, help="Games of every variant before any is \
+                      eliminated")
+    parser.add_option("-z", dest="z", type="float", default=1.96,
+                      help="Standard errors in a confidence interval")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int",
+                      help="Games to run at once, one per CPU by default")
+    parser.add_option("--no-pin", dest="pin", action="store_false",
+                      default=True, help="Do not pin games to CPUs")
+    parser.add_option("--in-process", dest="in_process", action="store_true",
+                      default=False, help="Play the games in this process")
+    add_metrics_options(parser)
+    options, args = parser.parse_args()
+    check_game_args(parser, args)
+
+    if options.variants:
+        variants = read_variants(open(options.variants))
+    else:
+        variants = [(name, ['-p', name]) for name in sorted(PLAYERS)]
+    for _, variant_args in variants:
+        check_game_args(parser, variant_args)
+
+    slots = []
+    if options.pin:
+        slots = make_slots(get_affinity(), 1)
+    jobs = options.jobs or len(slots) or 1
+    if slots:
+        jobs = min(jobs, len(slots))
+
+    scheduler = Scheduler([name for name, _ in variants], options.min_runs,
+                          options.max_games, options.z)
+    metrics, metrics_writer = start_metrics(STAGES, options.metrics_port,
+                                            options.metrics_file)
+    if options.in_process:
+        run_campaign_in_process(scheduler, variants, args, options.results,
+                                slots, jobs, metrics)
+    else:
+        run_campaign(scheduler, variants, args, options.results, slots, jobs,
+                     metrics)
+    if metrics_writer:
+        metrics_writer.write()
+    failed = sum([variant.failures for variant in scheduler.variants])
+    print '%d games played, %d failed, leader %s' % (scheduler.started, failed,
+                                                     scheduler.leader())
+    for line in scheduler.report():
+        print line
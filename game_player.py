@@ -1,128 +1,63 @@
 #!/usr/bin/env python
 
 import sys
-import time
 import logging
-from json import loads
-from optparse import OptionParser
-from contextlib import closing
 
 # Modify the python path so module load correctly
 sys.path.insert(0, "./validation")
 sys.path.insert(0, "./player")
 
 import validation
-from pexpect import spawn
-from player import BreadcrumbPlayer, SelfPreservationPlayer, GoldDigger,\
-        GreedyPlayer, FighterPlayer
+from session import GameSession, make_parser, setup_logging
+from results import ResultStore, STAGES
+from metrics import start_metrics
 
 # Get options from command line
-parser = OptionParser()
-parser.add_option("-l", "--larceny", dest="larceny", default="larceny",
-                  help="Location of larceny binary", metavar="FILE")
-parser.add_option("-g", "--game", dest="game", help="Location of game file")
-parser.add_option("-c", "--charactertimeout", dest="character_timeout",
-                  help="Time out for reading characters", type="float",
-                  default=0.09)
-parser.add_option("-r", "--responsetimeout", dest="response_timeout",
-                  help="Timeout for total reading from shell", type="float",
-                  default=10.00)
-parser.add_option("-t", "--testcastle", dest="test_castle", metavar="FILE",
-                  help="Run in test mode, with specified castle file")
-parser.add_option("-d", "--debug", action='store_true', dest="debug",
-                  default=False, help="Should we log DEBUG level information?")
-parser.add_option("-i", "--info", dest="info", action='store_true',
-                  default=False, help="Should we log INFO level information?")
-parser.add_option("-s", "--random1", dest="random1", help="Random seed variable \
-                  1", type="int")
-parser.add_option("-q", "--random2", dest="random2", help="Random seed variable \
-                  1", type="int")
-parser.add_option("-p", "--player", dest="player", help="Player you want to use", \
-                  default="SelfPreservationPlayer")
+parser = make_parser()
 options, args = parser.parse_args()
 
-# Get important options
-character_timeout = options.character_timeout
-response_timeout = options.response_timeout
-
-# Determine if we are running our tester, or the actual game program
-if options.test_castle:
-    # Setup test file with specified castle
-    process = "python ./player/dummy_game.py -c %s" % (options.test_castle)
-else:
-    # Make sure they specific a game
-    if options.game == None:
-        parser.error("Please specify a game location, see --help for details")
-    # Setup command to execute program
-    process = '%s -r6rs -program %s' % (options.larceny, options.game)
-
-    if options.random1 and options.random2:
-        process += ' -- outputfile %i %i' % (options.random1, options.random2)
-
-# Setup the player
-player_class = {'BreadcrumbPlayer' : BreadcrumbPlayer,
-                'SelfPreservationPlayer' : SelfPreservationPlayer,
-                'GreedyPlayer' : GreedyPlayer,
-                'FighterPlayer' : FighterPlayer,
-                'GoldDigger' : GoldDigger}[options.player]
-player = player_class()
+# Make sure they specific a game
+if not options.test_castle and options.game == None:
+    parser.error("Please specify a game location, see --help for details")
+if options.trie and not (options.random1 and options.random2):
+    parser.error("--trie needs both seeds, -s and -q")
 
 # Setup logging
-if options.debug or options.info:
-    if options.debug:
-        level = logging.DEBUG
-    elif options.info:
-        level = logging.INFO
-    else:
-        level = logging.WARN
-    logging_filename = './runlog-%s.log' % int(time.time())
-    logging.basicConfig(level=level,
-                        format='%(asctime)s %(levelname)s %(message)s',
-                        filename=logging_filename,
-                        filemode='w')
+logging_filename = setup_logging(options)
+if logging_filename:
     print 'Logging to file', logging_filename
 
-time_start = time.time()
-logging.info('Start at %s' % time_start)
-
-# Start process
-with closing(spawn(process)) as child:
-
-    # Send lines until you receive a False
-    while True:
-        # Get response
-        response = child.receive_response_json_dict(response_timeout, character_timeout).lstrip('\r\n')
-
-        # Encode response
-        # Strip first line for decoding, it's either the Version number or the last move
-        response = response[response.find('\n') + 1:]
-
-        # log the response
-        logging.debug("Response:\n" + response)
+# Live metrics, if asked for
+metrics, metrics_writer = start_metrics(STAGES, options.metrics_port,
+                                        options.metrics_file)
 
-        # Validate the response
-        # Validation turn off when testing
-        if (not options.test_castle) and (not validation.validate(response)):
-            print "Got invalid response from game:"
-            print response
-            sys.exit(-1)
+session = GameSession(options, validator=validation, metrics=metrics)
 
-        response = loads(response)
+# The flight recorder can also be dumped on SIGUSR1
+if session.recorder:
+    session.recorder.dump_on_signal(directory=options.flight_dir)
 
-        # Determine next move and tell the game program
-        next_move = player.handle_response(response)
+# Play the game
+session.run()
 
-                # log the response
-        logging.debug("Next Move:\n" + str(next_move))
+if session.invalid_response is not None:
+    print "Got invalid response from game:"
+    print session.invalid_response
 
-        # If next_move is false then stop playing
-        if next_move == False:
-            break
+if session.profiler:
+    for line in session.profiler.report():
+        logging.info(line)
+        print >> sys.stderr, line
 
-        child.sendline(next_move)
+if metrics_writer:
+    metrics_writer.write()
 
-time_end = time.time()
-logging.info('End at %s' % time_end)
+# Record the outcome of the game
+if options.results:
+    store = ResultStore(options.results)
+    store.record_game(session.game,
+                      options.record_turns and session.turns or None)
+    store.close()
 
-elapsed = time_end - time_start
-logging.info("Took %s seconds to run, which is the same as %s minutes" % (elapsed, elapsed/60.0))
\ No newline at end of file
+if session.player.outcome == 'invalid':
+    sys.exit(-1)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+''' Maps a castle with several games at once, then plays it.
+
+    All the games are played on the same seeds, so in the same castle. K
+    explorers (player/mapping.py) share one map of it, each heading for a
+    different unexplored door. Once nothing is left to explore, one more
+    game takes the shortest known route to the frog and out. Options after
+    "--" are those of game_player.py, e.g.:
+
+    $ python map_player.py -k 4 -- -g game.sps.slfasl -s 675434126 -q 879542811
+'''
+import sys
+import copy
+import time
+from optparse import OptionParser
+
+# Modify the python path so module load correctly
+sys.path.insert(0, "./validation")
+sys.path.insert(0, "./player")
+
+import validation
+from affinity import get_affinity
+from batch_player import make_slots
+from mapping import CastleMap, MappingPlayer, RoutePlayer
+from results import ResultStore
+from session import GameSession, SessionPool, make_parser
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [options] -- [game_player.py options]')
+    parser.add_option("-k", "--explorers", dest="explorers", type="int",
+                      default=2, help="Games exploring the castle at once")
+    parser.add_option("--no-pin", dest="pin", action="store_false",
+                      default=True, help="Do not pin games to CPUs")
+    options, args = parser.parse_args()
+
+    game_options, _ = make_parser().parse_args(args)
+    if not game_options.test_castle and not (game_options.random1 and
+                                             game_options.random2):
+        parser.error("Please give the seeds (-s and -q), so that every game "
+                     "is played in the same castle")
+
+    slots = []
+    if options.pin:
+        slots = make_slots(get_affinity(), 1)
+
+    # Explore
+    castle = CastleMap()
+    started = time.time()
+    pool = SessionPool(options.explorers, slots)
+    for _ in range(options.explorers):
+        explorer_options = copy.copy(game_options)
+        explorer_options.label = 'explorer'
+        pool.submit(GameSession(explorer_options,
+                                player=MappingPlayer(castle),
+                                validator=validation))
+    explorers = [pool.finished() for _ in range(options.explorers)]
+    pool.close()
+    print 'Mapped %d rooms with %d explorers in %.2f seconds' % \
+          (len(castle.exits), options.explorers, time.time() - started)
+    for explorer in explorers:
+        if explorer.error:
+            print 'An explorer failed: %s' % explorer.error
+
+    route = castle.route()
+    if route is None:
+        print 'No known route to the frog and out'
+        sys.exit(1)
+    print 'Route: %s' % ' '.join(route)
+
+    # Play
+    game_options.label = 'mapped route'
+    session = GameSession(game_options, player=RoutePlayer(route),
+                          validator=validation)
+    session.run()
+    print 'Outcome: %s, score %s' % (session.player.outcome,
+                                     session.player.score)
+    if game_options.results:
+        store = ResultStore(game_options.results)
+        for game in [explorer.game for explorer in explorers] + [session.game]:
+            if game:
+                store.record_game(game)
+        store.close()
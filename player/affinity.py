@@ -0,0 +1,75 @@
+''' Pins processes to CPU cores, so parallel games stop migrating between
+    cores and fighting over the same caches.
+
+    Python 3 has os.sched_setaffinity; on Python 2 the same Linux system
+    call is made through ctypes. A process's affinity is inherited by the
+    processes it spawns, so pinning the driver before it spawns the game
+    pins the pair.
+
+    >>> parse_cpus('0-2,5')
+    [0, 1, 2, 5]
+    >>> format_cpus([0, 1, 2, 5, 7, 8])
+    '0-2,5,7-8'
+'''
+import os
+import ctypes
+import ctypes.util
+
+__all__ = ['parse_cpus', 'format_cpus', 'get_affinity', 'set_affinity']
+
+# The kernel's cpu_set_t holds 1024 bits
+_CPU_SETSIZE = 1024
+_cpu_set_t = ctypes.c_ulong * (_CPU_SETSIZE // (8 * ctypes.sizeof(ctypes.c_ulong)))
+_BITS = 8 * ctypes.sizeof(ctypes.c_ulong)
+
+
+def parse_cpus(text):
+    ''' Parses a CPU list like the ones taskset takes ("0-3,6") '''
+    cpus = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part.strip():
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpus(cpus):
+    ''' The inverse of parse_cpus, collapsing runs into ranges '''
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join([first == last and str(first) or '%d-%d' % (first, last)
+                     for first, last in ranges])
+
+
+def _libc():
+    return ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+
+def get_affinity(pid=0):
+    ''' Returns the sorted list of CPUs the process may run on. A pid of 0
+        means this process.
+    '''
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(pid))
+    mask = _cpu_set_t()
+    if _libc().sched_getaffinity(pid, ctypes.sizeof(mask), ctypes.byref(mask)):
+        raise OSError(ctypes.get_errno(), 'sched_getaffinity failed')
+    return [cpu for cpu in range(_CPU_SETSIZE)
+            if mask[cpu // _BITS] & (1 << (cpu % _BITS))]
+
+
+def set_affinity(cpus, pid=0):
+    ''' Restricts the process to the given CPUs '''
+    if hasattr(os, 'sched_setaffinity'):
+        return os.sched_setaffinity(pid, cpus)
+    mask = _cpu_set_t()
+    for cpu in cpus:
+        mask[cpu // _BITS] |= 1 << (cpu % _BITS)
+    if _libc().sched_setaffinity(pid, ctypes.sizeof(mask), ctypes.byref(mask)):
+        raise OSError(ctypes.get_errno(), 'sched_setaffinity failed')
@@ -0,0 +1,179 @@
+''' Decides which player configuration to run next in a campaign, so that
+    games are spent where they can still change the answer.
+
+    Every variant is first played min_runs times. After that the variant
+    with the best mean score is the leader, and only variants whose
+    confidence interval for the mean still overlaps the leader's keep being
+    played, the one with the fewest games first. The campaign is over when
+    the leader is the only contender left, or when the game budget is spent.
+
+    >>> scheduler = Scheduler(['careful', 'greedy', 'lucky'], min_runs=3,
+    ...                       max_games=30)
+    >>> scores = {'careful' : [100, 110, 105], 'greedy' : [10, 12, 11],
+    ...           'lucky' : [0, 200, 100]}
+    >>> while not scheduler.done():
+    ...     variant = scheduler.next_variant()
+    ...     run = scheduler.start(variant)
+    ...     scheduler.finish(variant, run, scores[variant][run % 3])
+    >>> [(variant.name, variant.runs) for variant in scheduler.variants]
+    [('careful', 14), ('greedy', 3), ('lucky', 13)]
+    >>> scheduler.contenders()
+    ['careful', 'lucky']
+    >>> scheduler.leader()
+    'careful'
+
+    A game which failed has no score. It is counted apart, and its run is
+    used up: seeded games are deterministic, so playing the same seeds again
+    would only fail again. The variant goes on with the next run:
+
+    >>> scheduler = Scheduler(['careful'], min_runs=2)
+    >>> scheduler.start('careful'), scheduler.start('careful')
+    (0, 1)
+    >>> scheduler.fail('careful', 0)
+    >>> scheduler.finish('careful', 1, 100)
+    >>> scheduler.start('careful')
+    2
+    >>> scheduler.finish('careful', 2, 110)
+    >>> variant = scheduler.variants[0]
+    >>> variant.scores, variant.failures
+    ([100, 110], 1)
+    >>> scheduler.report()[0].endswith('contender  1 failed')
+    True
+'''
+import math
+
+__all__ = ['Scheduler', 'Variant']
+
+
+class Variant(object):
+    ''' The scores of one player configuration '''
+
+    def __init__(self, name):
+        self.name = name
+        self.scores = []
+        self.playing = set([]) # Runs started but not finished
+        self.next_run = 0 # The run the next game is, counting from 0
+        self.failures = 0 # Games which crashed or got an invalid response
+
+    @property
+    def pending(self):
+        return len(self.playing)
+
+    @property
+    def runs(self):
+        return len(self.scores)
+
+    @property
+    def mean(self):
+        return sum(self.scores) / float(len(self.scores))
+
+    def interval(self, z):
+        ''' The confidence interval of the mean score, as (low, high) '''
+        if len(self.scores) < 2:
+            return (float('-inf'), float('inf'))
+        mean = self.mean
+        variance = sum([(score - mean) ** 2 for score in self.scores]) / \
+                   (len(self.scores) - 1)
+        half_width = z * math.sqrt(variance / len(self.scores))
+        return (mean - half_width, mean + half_width)
+
+
+class Scheduler(object):
+    ''' A bandit style scheduler over named variants. z is the number of
+        standard errors in a confidence interval, 1.96 for 95%.
+    '''
+
+    def __init__(self, names, min_runs=5, max_games=None, z=1.96):
+        self.variants = [Variant(name) for name in names]
+        self._by_name = dict((variant.name, variant)
+                             for variant in self.variants)
+        self.min_runs = min_runs
+        self.max_games = max_games
+        self.z = z
+        self.started = 0
+
+    def leader(self):
+        ''' The name of the variant with the best mean score so far '''
+        played = [variant for variant in self.variants if variant.runs]
+        if not played:
+            return None
+        return max(played, key=lambda variant: variant.mean).name
+
+    def contenders(self):
+        ''' Names of the variants whose interval overlaps the leader's '''
+        leader = self.leader()
+        if leader is None:
+            return [variant.name for variant in self.variants]
+        low = self._by_name[leader].interval(self.z)[0]
+        return [variant.name for variant in self.variants
+                if not variant.runs or variant.interval(self.z)[1] >= low]
+
+    def next_variant(self):
+        ''' The name of the variant to play next, or None if no more games
+            should be started
+        '''
+        if self.max_games is not None and self.started >= self.max_games:
+            return None
+        queued = lambda variant: variant.runs + variant.pending
+        warming = [variant for variant in self.variants
+                   if queued(variant) < self.min_runs]
+        if warming:
+            return min(warming, key=queued).name
+        if any([variant.runs < self.min_runs for variant in self.variants]):
+            return None # Wait for the first games before eliminating any
+        contenders = self.contenders()
+        if len(contenders) < 2:
+            return None
+        return min([self._by_name[name] for name in contenders],
+                   key=queued).name
+
+    def start(self, name):
+        ''' Notes that a game of the named variant started. Returns its run,
+            the number of that game within the variant counting from 0, so
+            that the n-th run of every variant can be played on the same
+            seeds. Every run is started once, whether it ends or fails.
+        '''
+        variant = self._by_name[name]
+        run = variant.next_run
+        variant.next_run += 1
+        variant.playing.add(run)
+        self.started += 1
+        return run
+
+    def finish(self, name, run, score):
+        ''' Notes the score of the given run of the named variant '''
+        variant = self._by_name[name]
+        variant.playing.remove(run)
+        variant.scores.append(score)
+
+    def fail(self, name, run):
+        ''' Notes that the given run of the named variant failed. It counts
+            against the game budget, but not as a score.
+        '''
+        variant = self._by_name[name]
+        variant.playing.remove(run)
+        variant.failures += 1
+
+    def done(self):
+        ''' True when no more games should be played and none are running '''
+        return self.next_variant() is None and \
+               not any([variant.pending for variant in self.variants])
+
+    def report(self):
+        ''' A line per variant, best mean score first '''
+        lines = []
+        contenders = self.contenders()
+        for variant in sorted(self.variants, reverse=True,
+                              key=lambda variant: variant.runs and
+                                                  variant.mean or 0):
+            failed = variant.failures and '  %d failed' % variant.failures or ''
+            if not variant.runs:
+                lines.append('%-20s no games%s' % (variant.name, failed))
+                continue
+            low, high = variant.interval(self.z)
+            lines.append('%-20s %4d games  mean %9.2f  interval %9.2f .. '
+                         '%-9.2f %s%s' % (variant.name, variant.runs,
+                                          variant.mean, low, high,
+                                          variant.name in contenders and
+                                          'contender' or 'eliminated', failed))
+        return lines
@@ -0,0 +1,179 @@
+''' Stores per-turn metrics for a game as one binary column file per metric,
+    so that many games can be analysed in vectorized form later on.
+
+    Each column is written in the NumPy .npy format (version 1.0), which is
+    a short text header followed by the raw little-endian values. Writing
+    needs nothing beyond the standard library; loading and summarizing use
+    NumPy, which memory-maps each file instead of parsing it.
+
+    Every game gets its own directory of columns under the directory given
+    to the driver with --columns:
+
+    >>> import os, tempfile
+    >>> writer = ColumnWriter(tempfile.mkdtemp())
+    >>> writer.append(receive_time=0.25, bytes=120, health=-1)
+    >>> writer.append(receive_time=0.5, bytes=80, health=4)
+    >>> len(writer)
+    2
+    >>> writer.close()
+    >>> data = open(os.path.join(writer.path, 'bytes.npy'), 'rb').read()
+    >>> data[:6] == MAGIC, (len(data) - 2 * 4) % 64, data[-4:] == '\\x50\\x00\\x00\\x00'
+    (True, 0, True)
+
+    Run as a script to summarize a set of game directories:
+
+    $ python player/columns.py columns/*
+'''
+import os
+import sys
+import time
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['COLUMNS', 'ColumnWriter', 'load_columns', 'summarize']
+
+# Name, array typecode and .npy type of each column. Integers which are not
+# known on a turn (like health before the first threat) are stored as -1
+COLUMNS = [('receive_time', 'd', '<f8'),
+           ('validate_time', 'd', '<f8'),
+           ('decode_time', 'd', '<f8'),
+           ('decide_time', 'd', '<f8'),
+           ('send_time', 'd', '<f8'),
+           ('bytes', 'i', '<i4'),
+           ('rooms_visited', 'i', '<i4'),
+           ('inventory', 'i', '<i4'),
+           ('health', 'i', '<i4'),
+           ('tired', 'i', '<i4'),
+           ('ill', 'i', '<i4')]
+
+MAGIC = '\x93NUMPY'
+
+
+def _npy_header(descr, length):
+    ''' Builds a version 1.0 .npy header for a one dimensional array, padded
+        so that the data starts on a 64 byte boundary as NumPy's own are.
+    '''
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % \
+             (descr, length)
+    # magic (6) + version (2) + header length (2) + header + newline
+    padding = -(10 + len(header) + 1) % 64
+    header += ' ' * padding + '\n'
+    return MAGIC + '\x01\x00' + chr(len(header) & 0xff) + \
+           chr(len(header) >> 8) + header
+
+
+class ColumnWriter(object):
+    ''' Collects the metrics of each turn of one game in memory, and writes
+        them out as column files when the game is over.
+    '''
+
+    def __init__(self, directory, name=None):
+        if name is None:
+            name = 'game-%d-%d' % (int(time.time()), os.getpid())
+        self.path = os.path.join(directory, name)
+        self._columns = [(column, array(typecode), descr)
+                         for column, typecode, descr in COLUMNS]
+
+    def __len__(self):
+        return len(self._columns[0][1])
+
+    def append(self, **values):
+        ''' Adds a turn. Columns not given are stored as 0 or -1 '''
+        for column, values_array, _ in self._columns:
+            value = values.get(column)
+            if value is None:
+                value = values_array.typecode == 'i' and -1 or 0.0
+            values_array.append(value)
+
+    def close(self):
+        ''' Writes every column to its own .npy file '''
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        for column, values_array, descr in self._columns:
+            if sys.byteorder != 'little':
+                values_array.byteswap()
+            with open(os.path.join(self.path, column + '.npy'), 'wb') as out:
+                out.write(_npy_header(descr, len(values_array)))
+                values_array.tofile(out)
+
+
+def load_columns(paths, columns=None):
+    ''' Memory-maps the columns of each game directory in paths and joins
+        them end to end. Returns a dict of column name to array, along with
+        a 'game' array giving the index in paths of the game of each turn
+        and a 'turn' array giving the turn number within that game.
+    '''
+    if numpy is None:
+        raise ImportError('NumPy is needed to load column files')
+    if columns is None:
+        columns = [column for column, _, _ in COLUMNS]
+    loaded = dict((column, []) for column in columns)
+    games, turns = [], []
+    for index, path in enumerate(paths):
+        length = None
+        for column in columns:
+            values = numpy.load(os.path.join(path, column + '.npy'),
+                                mmap_mode='r')
+            loaded[column].append(values)
+            length = len(values)
+        if length:
+            games.append(numpy.repeat(numpy.int32(index), length))
+            turns.append(numpy.arange(1, length + 1, dtype=numpy.int32))
+    result = dict((column, numpy.concatenate(parts))
+                  for column, parts in loaded.iteritems() if parts)
+    if games:
+        result['game'] = numpy.concatenate(games)
+        result['turn'] = numpy.concatenate(turns)
+    return result
+
+
+def summarize(data, percents=(50, 90, 99)):
+    ''' Computes campaign wide statistics from the result of load_columns.
+        Returns a list of (name, value) pairs.
+    '''
+    stats = [('games', len(numpy.unique(data['game']))),
+             ('turns', len(data['game']))]
+    for column, _, descr in COLUMNS:
+        if column not in data or not descr.startswith('<f'):
+            continue
+        values = data[column]
+        stats.append(('%s mean' % column, values.mean()))
+        for percent, value in zip(percents,
+                                  numpy.percentile(values, percents)):
+            stats.append(('%s p%s' % (column, percent), value))
+    if 'bytes' in data:
+        stats.append(('bytes mean', data['bytes'].mean()))
+    turns_per_game = numpy.bincount(data['game'])
+    stats.append(('turns per game mean', turns_per_game.mean()))
+    stats.append(('turns per game max', turns_per_game.max()))
+    # The turns of a game are next to each other. Inventory goes down as
+    # items are dropped or used, so each game counts with its peak rather
+    # than its last turn; for rooms_visited the two are the same
+    starts = numpy.flatnonzero(numpy.r_[True, data['game'][1:] !=
+                                              data['game'][:-1]])
+    for column in ('rooms_visited', 'inventory'):
+        if column in data:
+            peaks = numpy.maximum.reduceat(data[column], starts)
+            stats.append(('%s max per game mean' % column, peaks.mean()))
+    for column in ('health', 'tired', 'ill'):
+        if column in data:
+            known = data[column][data[column] >= 0]
+            if len(known):
+                stats.append(('%s mean' % column, known.mean()))
+    return stats
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+
+    parser = OptionParser(usage='%prog GAME_DIRECTORY...')
+    options, args = parser.parse_args()
+    if not args:
+        parser.error("Please give at least one game directory")
+
+    for name, value in summarize(load_columns(args)):
+        print '%-28s %s' % (name, value)
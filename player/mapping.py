@@ -0,0 +1,211 @@
+''' Cooperative mapping of a castle by several games on the same seeds.
+
+    With fixed seeds every game is played in the same castle, so several
+    explorers can map it at once, each in its own game. They share one
+    CastleMap: each explorer records the rooms it sees and the doors it
+    goes through, and claims the unexplored door it heads for, so the
+    others pick different ones. Once the castle is mapped, a RoutePlayer
+    plays one more game on the same seeds, straight to the frog and out
+    through the nearest exit.
+
+    >>> castle = CastleMap()
+    >>> castle.observe('A', ['east', 'north'])
+    >>> castle.observe('B', ['west', 'east'], frog=True)
+    >>> castle.link('A', 'east', 'B')
+    >>> castle.link('B', 'west', 'A')
+    >>> castle.link('A', 'north', OUTSIDE)
+    >>> castle.unexplored('B')
+    ['east']
+    >>> castle.route()
+    ['(go east)', '(carry (frog))', '(go west)', '(go north)']
+'''
+import logging
+import threading
+from collections import deque
+
+from player_util import Player
+
+__all__ = ['CastleMap', 'MappingPlayer', 'RoutePlayer', 'OUTSIDE', 'FROG']
+
+# Where a door leading out of the castle goes
+OUTSIDE = 'OUTSIDE'
+
+# The step of a route where the frog is picked up
+FROG = '(carry (frog))'
+
+
+class CastleMap(object):
+    ''' The rooms and doors of one castle, as found so far by any explorer.
+        Safe to share between explorers in different threads.
+    '''
+
+    def __init__(self):
+        self.start = None        # The room every game starts in
+        self.exits = {}          # Room id to the directions out of it
+        self.doors = {}          # Room id to {direction : room id}
+        self.frog = None         # The room the frog was seen in
+        self._claims = {}        # (room id, direction) to explorers heading there
+        self._lock = threading.RLock()
+
+    def observe(self, room, exits, frog=False):
+        ''' Records a room an explorer is in '''
+        with self._lock:
+            if self.start is None:
+                self.start = room
+            if room not in self.exits:
+                self.exits[room] = frozenset(exits)
+                self.doors[room] = {}
+            if frog and self.frog is None:
+                self.frog = room
+
+    def link(self, room, direction, other):
+        ''' Records that going direction from room leads to other '''
+        with self._lock:
+            self.doors.setdefault(room, {})[direction] = other
+            self._claims.pop((room, direction), None)
+
+    def unexplored(self, room):
+        ''' The doors of room no explorer has been through yet '''
+        with self._lock:
+            return sorted(self.exits.get(room, frozenset([])) -
+                          set(self.doors.get(room, {})))
+
+    def claim(self, room, direction):
+        with self._lock:
+            key = (room, direction)
+            self._claims[key] = self._claims.get(key, 0) + 1
+
+    def release(self, room, direction):
+        with self._lock:
+            key = (room, direction)
+            if self._claims.get(key):
+                self._claims[key] -= 1
+
+    def paths_from(self, room):
+        ''' Shortest known paths from room to every room reachable from it,
+            as a dict of room id to list of directions
+        '''
+        with self._lock:
+            paths = {room : []}
+            queue = deque([room])
+            while queue:
+                current = queue.popleft()
+                for direction, other in sorted(self.doors.get(current,
+                                                              {}).items()):
+                    if other != OUTSIDE and other not in paths:
+                        paths[other] = paths[current] + [direction]
+                        queue.append(other)
+            return paths
+
+    def next_door(self, room):
+        ''' The unexplored door to head for from room, as (room, direction,
+            path there). Doors fewer explorers are heading for come first,
+            then nearer ones. None once nothing reachable is left to explore.
+        '''
+        with self._lock:
+            best = None
+            for other, path in self.paths_from(room).iteritems():
+                for direction in self.unexplored(other):
+                    rank = (self._claims.get((other, direction), 0), len(path))
+                    if best is None or rank < best[0]:
+                        best = (rank, other, direction, path)
+            return best and best[1:]
+
+    def route(self):
+        ''' The moves from the start to the frog and out of the nearest exit,
+            or None if the frog or a way out of its room are not known
+        '''
+        with self._lock:
+            if self.frog is None or self.start is None:
+                return None
+            to_frog = self.paths_from(self.start).get(self.frog)
+            if to_frog is None:
+                return None
+            way_out = None
+            for room, path in self.paths_from(self.frog).iteritems():
+                for direction, other in sorted(self.doors[room].items()):
+                    if other == OUTSIDE and (way_out is None or
+                                             len(path) < len(way_out) - 1):
+                        way_out = path + [direction]
+            if way_out is None:
+                return None
+            return ['(go %s)' % d for d in to_frog] + [FROG] + \
+                   ['(go %s)' % d for d in way_out]
+
+
+class MappingPlayer(Player):
+    ''' An explorer which only maps the castle. It records every room in
+        the shared map and heads for the unexplored door fewest explorers
+        are heading for. It stops once nothing is left to explore.
+    '''
+
+    def __init__(self, castle):
+        super(MappingPlayer, self).__init__()
+        self.castle = castle
+        self.target = None     # (room, direction) we are heading for
+        self.last_move = None  # (room, direction) of our last go
+
+    def handle_response(self, json):
+        move = super(MappingPlayer, self).handle_response(json)
+        if move is False and self.target:
+            self.castle.release(*self.target)
+            self.target = None
+        return move
+
+    def next_move(self, location, items, threats):
+        if location.is_outside or location.in_moat:
+            if self.last_move:
+                self.castle.link(self.last_move[0], self.last_move[1],
+                                 OUTSIDE)
+                self.last_move = None
+            return '(enter)'
+
+        room = location.identity
+        self.castle.observe(room, location.exits, items.has_frog)
+        if self.last_move:
+            self.castle.link(self.last_move[0], self.last_move[1], room)
+            self.last_move = None
+
+        # Keep heading for our door while nobody has been through it
+        if self.target and self.target[1] not in \
+                self.castle.unexplored(self.target[0]):
+            self.target = None
+        path = None
+        if self.target:
+            path = self.castle.paths_from(room).get(self.target[0])
+        if path is None:
+            if self.target:
+                self.castle.release(*self.target)
+            found = self.castle.next_door(room)
+            if found is None:
+                logging.info('Nothing left to explore')
+                self.target = None
+                return '(stop)'
+            target_room, direction, path = found
+            self.target = (target_room, direction)
+            self.castle.claim(*self.target)
+            logging.info('Heading for door %s of %s' % (direction,
+                                                         target_room))
+
+        if path:
+            direction = path[0]
+        else:
+            direction = self.target[1]
+        self.last_move = (room, direction)
+        return '(go %s)' % direction
+
+
+class RoutePlayer(Player):
+    ''' Follows a route of moves computed from a map, then stops '''
+
+    def __init__(self, route):
+        super(RoutePlayer, self).__init__()
+        self.route = deque(route)
+
+    def next_move(self, location, items, threats):
+        if location.is_outside or not self.route:
+            return '(stop)'
+        move = self.route.popleft()
+        if move == FROG:
+            return self.carry_frog()
+        return move
@@ -0,0 +1,130 @@
+''' Periodic memory snapshots of a long game, to find out which structure
+    is making the driver grow.
+
+    Every few turns the profiler records the resident set size, the deep
+    size of each container attribute of the player (visited_doors,
+    castle_exits, exit_paths, _dropped_items, ...), and a census of live
+    objects. Where Python has tracemalloc the census is a tracemalloc
+    snapshot grouped by allocation site; otherwise it is a count of live
+    objects per type, taken from the garbage collector. At the end of the
+    game the first and last snapshots are compared, so only those two are
+    kept: a census can be large, and a long game takes many.
+
+    >>> class Player(object):
+    ...     def __init__(self):
+    ...         self.visited_doors = {}
+    >>> player = Player()
+    >>> profiler = MemoryProfiler(every=2)
+    >>> for turn in range(1, 7):
+    ...     player.visited_doors[turn] = set(['north', 'south'])
+    ...     profiler.turn(turn, player)
+    >>> [turn for turn, _, _, _ in profiler.snapshots]
+    [2, 6]
+    >>> print '\\n'.join(profiler.report()) # doctest: +ELLIPSIS
+    Memory profile over turns 2 to 6
+    RSS: ... kB -> ... kB
+    Structures (bytes):
+      visited_doors: ... -> ... (+...)
+    Top growing ...
+    ...
+'''
+import gc
+import sys
+import resource
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+__all__ = ['MemoryProfiler', 'deep_size', 'rss_kb']
+
+
+def deep_size(obj, seen=None):
+    ''' Returns the size in bytes of obj and of every container and string
+        it refers to, counting shared objects once
+    '''
+    if seen is None:
+        seen = set([])
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_size(item, seen)
+    return size
+
+
+def rss_kb():
+    ''' The current resident set size, or the peak where it is unknown '''
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() / 1024
+    except (IOError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _census():
+    ''' Counts live objects, by allocation site or else by type '''
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        return tracemalloc.take_snapshot()
+    counts = {}
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+class MemoryProfiler(object):
+    ''' Takes a memory snapshot every given number of turns '''
+
+    def __init__(self, every=100, top=10):
+        self.every = every
+        self.top = top
+        self.snapshots = [] # The first and latest (turn, rss, structure
+                            # sizes, census)
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def turn(self, turn, player):
+        ''' Called after every turn. Cheap, except on snapshot turns '''
+        if turn % self.every == 0:
+            self.snapshot(turn, player)
+
+    def snapshot(self, turn, player):
+        sizes = dict((name, deep_size(value))
+                     for name, value in vars(player).iteritems()
+                     if isinstance(value, (dict, list, set, frozenset)))
+        self.snapshots[1:] = [(turn, rss_kb(), sizes, _census())]
+
+    def report(self):
+        ''' Compares the first and last snapshots. Returns a list of lines '''
+        if len(self.snapshots) < 2:
+            return ['Memory profile: fewer than two snapshots taken']
+        first_turn, first_rss, first_sizes, first_census = self.snapshots[0]
+        last_turn, last_rss, last_sizes, last_census = self.snapshots[-1]
+        lines = ['Memory profile over turns %d to %d' % (first_turn, last_turn),
+                 'RSS: %d kB -> %d kB' % (first_rss, last_rss),
+                 'Structures (bytes):']
+        for name in sorted(last_sizes, key=last_sizes.get, reverse=True):
+            before = first_sizes.get(name, 0)
+            lines.append('  %s: %d -> %d (%+d)' %
+                         (name, before, last_sizes[name],
+                          last_sizes[name] - before))
+        if isinstance(last_census, dict):
+            lines.append('Top growing object types:')
+            growth = [(count - first_census.get(name, 0), name, count)
+                      for name, count in last_census.iteritems()]
+            for grown, name, count in sorted(growth, reverse=True)[:self.top]:
+                lines.append('  %s: %d (%+d)' % (name, count, grown))
+        else:
+            lines.append('Top growing allocation sites:')
+            for stat in last_census.compare_to(first_census,
+                                               'lineno')[:self.top]:
+                lines.append('  %s' % stat)
+        return lines
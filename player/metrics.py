@@ -0,0 +1,223 @@
+''' Live counters and histograms for long running campaigns.
+
+    Updating a metric is an integer addition under an uncontended lock (and,
+    for a histogram, a bisect over a short list of bucket bounds), so the
+    driver can update them on every turn, from as many game threads as a
+    runner has. Reading them is left to a background thread, which either
+    answers HTTP requests in the Prometheus text format or rewrites a stats
+    file every few seconds. A runner keeps one registry for all its games,
+    as only one process can serve a port.
+
+    >>> metrics = Metrics()
+    >>> metrics.counter('games_started', 'Games started').inc()
+    >>> latency = metrics.histogram('turn_seconds', 'Turn latency', [0.1, 1])
+    >>> latency.observe(0.05)
+    >>> latency.observe(0.5)
+    >>> print metrics.render(),
+    # HELP games_started Games started
+    # TYPE games_started counter
+    games_started 1
+    # HELP turn_seconds Turn latency
+    # TYPE turn_seconds histogram
+    turn_seconds_bucket{le="0.1"} 1
+    turn_seconds_bucket{le="1"} 2
+    turn_seconds_bucket{le="+Inf"} 2
+    turn_seconds_sum 0.55
+    turn_seconds_count 2
+'''
+import os
+import time
+import threading
+from bisect import bisect_left
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+__all__ = ['Metrics', 'DriverMetrics', 'Counter', 'Histogram',
+           'serve_metrics', 'write_metrics_periodically', 'start_metrics',
+           'LATENCY_BUCKETS']
+
+# Upper bounds, in seconds, of the default latency buckets
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class Counter(object):
+    ''' A value which only goes up '''
+
+    def __init__(self, name, help, labels=''):
+        self.name, self.help, self.labels = name, help, labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        return [('%s%s' % (self.name, self.labels), self.value)]
+
+
+class Histogram(object):
+    ''' Counts observations into buckets with the given upper bounds '''
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labels=''):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last one is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+
+    def samples(self):
+        # Bucket counts are cumulative in the exposition format
+        label_prefix = self.labels and self.labels[1:-1] + ',' or ''
+        result, total = [], 0
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            total += count
+            result.append(('%s_bucket{%sle="%s"}' %
+                           (self.name, label_prefix, _format(bound)), total))
+        result.append(('%s_sum%s' % (self.name, self.labels), self.sum))
+        result.append(('%s_count%s' % (self.name, self.labels), total))
+        return result
+
+
+def _format(value):
+    ''' Formats a number the way Prometheus expects it, without trailing
+        zeros in the fraction
+
+        >>> [_format(value) for value in [1.0, 0.25, 0.0, 1e+20, 1.5e-05, 3]]
+        ['1', '0.25', '0', '1e+20', '1.5e-05', '3']
+    '''
+    if isinstance(value, float):
+        text = repr(value)
+        if '.' in text and 'e' not in text:
+            text = text.rstrip('0').rstrip('.') or '0'
+        return text
+    return str(value)
+
+
+class Metrics(object):
+    ''' A registry of named metrics, rendered together '''
+
+    def __init__(self):
+        self.started = time.time()
+        self._metrics = []
+
+    def counter(self, name, help, labels=''):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, labels=''):
+        return self._add(Histogram(name, help, buckets, labels))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        ''' Returns every metric in the Prometheus text format '''
+        lines, described = [], set([])
+        for metric in self._metrics:
+            if metric.name not in described:
+                described.add(metric.name)
+                kind = isinstance(metric, Histogram) and 'histogram' or \
+                       'counter'
+                lines.append('# HELP %s %s' % (metric.name, metric.help))
+                lines.append('# TYPE %s %s' % (metric.name, kind))
+            for sample, value in metric.samples():
+                lines.append('%s %s' % (sample, _format(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class DriverMetrics(Metrics):
+    ''' The metrics kept by the game driver. Stage latencies are one
+        histogram labelled by stage.
+    '''
+
+    def __init__(self, stages):
+        super(DriverMetrics, self).__init__()
+        self.games_started = self.counter('games_started_total',
+                                          'Games started')
+        self.games_finished = self.counter('games_finished_total',
+                                           'Games played to the end')
+        self.turns = self.counter('turns_total', 'Turns played')
+        self.validation_failures = self.counter(
+            'validation_failures_total', 'Responses which failed validation')
+        self.timeouts = self.counter('timeouts_total',
+                                     'Times the game did not respond in time')
+        self.stage_seconds = dict(
+            (stage, self.histogram('stage_seconds',
+                                   'Time spent in each stage of a turn',
+                                   labels='{stage="%s"}' % stage))
+            for stage in stages)
+
+    def turn(self, timings):
+        ''' Records one turn, given a dict of stage to seconds taken '''
+        self.turns.inc()
+        for stage, elapsed in timings.iteritems():
+            self.stage_seconds[stage].observe(elapsed)
+
+
+def serve_metrics(metrics, port, host='127.0.0.1'):
+    ''' Answers HTTP GET requests on the given port with the rendered
+        metrics, from a daemon thread. Returns the server.
+    '''
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.render()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass # Scrapes are not worth a line in the log
+
+    server = HTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def write_metrics_periodically(metrics, filename, interval=5.0):
+    ''' Rewrites filename with the rendered metrics every interval seconds,
+        from a daemon thread. The file is replaced atomically, so a reader
+        never sees half of it. Returns the thread.
+    '''
+    def write():
+        temporary = '%s.%d.tmp' % (filename, os.getpid())
+        with open(temporary, 'w') as out:
+            out.write(metrics.render())
+            out.write('# uptime_seconds %s\n' % (time.time() - metrics.started))
+        os.rename(temporary, filename)
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            write()
+
+    thread = threading.Thread(target=loop)
+    thread.daemon = True
+    thread.start()
+    thread.write = write # So the last values can be written on exit
+    return thread
+
+
+def start_metrics(stages, port=None, filename=None):
+    ''' Makes the driver metrics for the given stages, served on port and
+        rewritten to filename as asked. Returns the metrics and the thread
+        writing them, either of which is None if not asked for.
+    '''
+    if not port and not filename:
+        return None, None
+    metrics, writer = DriverMetrics(stages), None
+    if port:
+        serve_metrics(metrics, port)
+    if filename:
+        writer = write_metrics_periodically(metrics, filename)
+    return metrics, writer
@@ -391,6 +391,7 @@ class spawn (object):
         self.exitstatus = None
         self.signalstatus = None
         self.status = None # status returned by os.waitpid
+        self.rusage = None # resources used by the child, once it is reaped
         self.flag_eof = False
         self.pid = None
         self.child_fd = -1 # initially closed
@@ -1091,7 +1092,7 @@ class spawn (object):
         is still alive until its output is read. """
 
         if self.isalive():
-            pid, status = os.waitpid(self.pid, 0)
+            pid, status = self._wait4(0)
         else:
             raise ExceptionPexpect ('Cannot wait for dead child process.')
         self.exitstatus = os.WEXITSTATUS(status)
@@ -1109,6 +1110,16 @@ class spawn (object):
             raise ExceptionPexpect ('Wait was called for a child process that is stopped. This is not supported. Is some other process attempting job control with our child pid?')
         return self.exitstatus
 
+    def _wait4(self, options):
+
+        """This is os.waitpid for the child, which also keeps the resources
+        the child used in self.rusage once it has been reaped. """
+
+        pid, status, rusage = os.wait4(self.pid, options)
+        if pid != 0:
+            self.rusage = rusage
+        return pid, status
+
     def isalive(self):
 
         """This tests if the child process is running or not. This is
@@ -1129,7 +1140,7 @@ class spawn (object):
             waitpid_options = os.WNOHANG
 
         try:
-            pid, status = os.waitpid(self.pid, waitpid_options)
+            pid, status = self._wait4(waitpid_options)
         except OSError, e: # No child processes
             if e[0] == errno.ECHILD:
                 raise ExceptionPexpect ('isalive() encountered condition where "terminated" is 0, but there was no child process. Did someone else call waitpid() on our process?')
@@ -1141,7 +1152,7 @@ class spawn (object):
         # report, and the value of status is undefined.
         if pid == 0:
             try:
-                pid, status = os.waitpid(self.pid, waitpid_options) ### os.WNOHANG) # Solaris!
+                pid, status = self._wait4(waitpid_options) ### os.WNOHANG) # Solaris!
             except OSError, e: # This should never happen...
                 if e[0] == errno.ECHILD:
                     raise ExceptionPexpect ('isalive() encountered condition that should never happen. There was no child process. Did someone else call waitpid() on our process?')
@@ -1587,7 +1598,7 @@ class spawn (object):
         try:
             chars.append(self.read_nonblocking(1,response_timeout))
         except TIMEOUT:
-            raise Exception("Program timed out , didnt receive a response after \
+            raise TIMEOUT("Program timed out , didnt receive a response after \
                                         %f " % (response_timeout))
         
         # We've got at least one character of response
@@ -1613,7 +1624,7 @@ class spawn (object):
         try:
             chars.append(self.read_nonblocking(1,response_timeout))
         except TIMEOUT:
-            raise Exception("Program timed out , didnt receive a response after \
+            raise TIMEOUT("Program timed out , didnt receive a response after \
                                         %f " % (response_timeout))
         
         open_curlies = 0
@@ -42,6 +42,10 @@ class BreadcrumbPlayer(Player):
     DIRECTIONS = ['north', 'down', 'east', 'west', 'up', 'south']
     REVERSE_DIRECTIONS = dict(zip(DIRECTIONS, reversed(DIRECTIONS)))
 
+    # Items not worth picking up. Set on an instance to try other choices
+    ignored_weapons = IGNORED_WEAPONS
+    ignored_treasure = IGNORED_TREASURE
+
     def __init__(self):
         super(BreadcrumbPlayer, self).__init__()
 
@@ -220,6 +224,18 @@ class BreadcrumbPlayer(Player):
 
         return "(enter)"
 
+    def escape(self, reason):
+        ''' When we are stuck, give up on exploring (and on finding hidden
+            parts of the castle), head for the nearest exit we know of, and
+            stop once we are outside.
+        '''
+        logging.info("Told we are stuck (%s). Heading out." % reason)
+        self.stop_on_exit = True
+        self.restart_on_exit = False
+        if self.last_origin in self.exit_paths:
+            self.override_path = self.find_nearest_outdoors()
+        return True
+
     def maybe_handle_items(self, location, items, threats):
         ''' Determines if we want to do anything with the given items.
             Returns None if we don't want to do anything
@@ -317,7 +333,7 @@ class SelfPreservationPlayer(BreadcrumbPlayer):
                 self.drop_weapon(self.current_weapon)
 
         # First, we look for a new and better weapon
-        fweapons = filter(lambda x: x[0] not in IGNORED_WEAPONS, items.weapons)
+        fweapons = filter(lambda x: x[0] not in self.ignored_weapons, items.weapons)
         if fweapons:
             best_name, best_lethality = max(fweapons, key=lambda x: x[1])
             if not self.current_weapon:
@@ -341,7 +357,7 @@ class SelfPreservationPlayer(BreadcrumbPlayer):
             for treasure in sorted(items.treasures, lambda x, y: y[1] - x[1]):
                 name, _ = treasure
                 dropped = treasure in self._dropped_items
-                if not dropped and name not in IGNORED_TREASURE:
+                if not dropped and name not in self.ignored_treasure:
                     return self.carry_treasure(treasure)
 #        # Pick up artifacts too
 #        if items.artifacts:
@@ -392,7 +408,7 @@ class FighterPlayer(BreadcrumbPlayer):
         return self.weapons[0]
 
     def maybe_handle_items(self, location, items, threats):
-        filtered = filter(lambda x: x[0] not in IGNORED_WEAPONS, items.weapons)
+        filtered = filter(lambda x: x[0] not in self.ignored_weapons, items.weapons)
         if filtered:
             best_name, best_lethality = max(filtered, key=lambda x: x[1])
             if not self.current_weapon:
@@ -457,7 +473,7 @@ class GoldDigger(BreadcrumbPlayer):
             for treasure in sorted(items.treasures, lambda x, y: y[1] - x[1]):
                 name, _ = treasure
                 dropped = treasure in self._dropped_items
-                if not dropped and name not in IGNORED_TREASURE:
+                if not dropped and name not in self.ignored_treasure:
                     return self.carry_treasure(treasure)
 #        # Pick up artifacts too
 #        if items.artifacts:
@@ -99,15 +99,17 @@ class Location(object):
     '''
 
     @classmethod
-    def from_json(cls, location):
-        ''' Given some JSON, construct the proper Location from it '''
+    def from_json(cls, location, identities=None):
+        ''' Given some JSON, construct the proper Location from it. Rooms
+            share identities through the given dict, see Room.
+        '''
         if location == "outside the castle":
             return Outside()
         elif location == "in the moat":
             return InMoat()
         elif 'room' in location:
             room = location['room']
-            return Room(room)
+            return Room(room, identities)
         else:
             raise Exception('Invalid JSON for Location: %s' % location)
 
@@ -137,12 +139,32 @@ class Location(object):
 
 class Room(Location):
     ''' Represents a Room in the dungeon which has exits. Each room is uniquely
-        identified by its purpose and attributes.
+        identified by its purpose and attributes. Given a dict of the
+        identities seen so far, which each player keeps for its own game, a
+        room seen before gets the very same identity object, so looking it
+        up in the player's dicts does not hash it again.
+
+        >>> room = {'purpose' : 'Foo', 'attributes' : ['bar'], 'exits' : []}
+        >>> identities = {}
+        >>> Room(room, identities).identity is \\
+        ...     Room(dict(room), identities).identity
+        True
+        >>> Room(room).identity == Room(room, identities).identity
+        True
     '''
 
-    def __init__(self, room):
-        self._identity = frozenset([room['purpose']] + room['attributes'])
-        self._exits = frozenset(room['exits'])
+    def __init__(self, room, identities=None):
+        self._room = room
+        self._exits = None # Built the first time they are asked for
+        if identities is None:
+            identity = frozenset([room['purpose']] + room['attributes'])
+        else:
+            key = (room['purpose'], tuple(room['attributes']))
+            identity = identities.get(key)
+            if identity is None:
+                identity = frozenset([room['purpose']] + room['attributes'])
+                identities[key] = identity
+        self._identity = identity
 
     @property
     def identity(self):
@@ -150,6 +172,8 @@ class Room(Location):
 
     @property
     def exits(self):
+        if self._exits is None:
+            self._exits = frozenset(self._room['exits'])
         return self._exits
 
 
@@ -184,15 +208,25 @@ class InMoat(Location):
 
 class Items(object):
     ''' Convience class for items in a room. Sorts items into useful groups.
-        The properties return defensive copies of the attribute lists.
+        The properties return defensive copies of the attribute lists. The
+        items are only sorted the first time a property is asked for, so a
+        player which does not look at them does not pay for them.
+
+        >>> items = Items([{'treasure' : 'gold', 'value' : 5}, {'frog' : []}])
+        >>> items.has_frog, items.treasures, items.weapons
+        (True, [('gold', 5)], [])
     '''
 
     def __init__(self, items):
+        self._items = items
+        self._treasures = None # Set by _sort
+
+    def _sort(self):
         self._has_frog = False
         self._treasures = []
         self._weapons = []
         self._artifacts = []
-        for item in items:
+        for item in self._items:
             if 'frog' in item:
                 self._has_frog = True
             elif 'treasure' in item:
@@ -205,32 +239,49 @@ class Items(object):
 
     @property
     def has_frog(self):
+        if self._treasures is None:
+            self._sort()
         return self._has_frog
 
     @property
     def treasures(self):
+        if self._treasures is None:
+            self._sort()
         return [] + self._treasures
 
     @property
     def weapons(self):
+        if self._treasures is None:
+            self._sort()
         return [] + self._weapons
 
     @property
     def artifacts(self):
+        if self._treasures is None:
+            self._sort()
         return [] + self._artifacts
 
 
 class Threats(object):
-    ''' Convience class for threats'''
+    ''' Convience class for threats. Like Items, the threats are only looked
+        through the first time a property is asked for.
+
+        >>> threats = Threats([{'tired' : 3}, {'attacked' : ['minion']}])
+        >>> threats.tired, threats.ill, threats.attacked, threats.attacked_by
+        (3, None, True, ['minion'])
+    '''
 
     def __init__(self, problems):
+        self._problems = problems
+        self._attacked = None # Set by _read
 
+    def _read(self):
         self._attacked = False
         # Assign null values to indicate we haven't received anything
         self._ill, self._tired, self._injured, self._attacked_by = \
             None, None, None, None
 
-        for problem in problems:
+        for problem in self._problems:
             if 'ill' in problem:
                 self._ill = problem['ill']
 
@@ -246,25 +297,39 @@ class Threats(object):
 
     @property
     def ill(self):
+        if self._attacked is None:
+            self._read()
         return self._ill
 
     @property
     def health(self):
+        if self._attacked is None:
+            self._read()
         return self._injured
 
     @property
     def tired(self):
+        if self._attacked is None:
+            self._read()
         return self._tired
 
     @property
     def attacked(self):
+        if self._attacked is None:
+            self._read()
         return self._attacked
 
     @property
     def attacked_by(self):
+        if self._attacked is None:
+            self._read()
         return self._attacked_by
 
 
+# Shared by every turn without items or threats
+NO_ITEMS, NO_THREATS = Items([]), Threats([])
+
+
 class Player(object):
     ''' Abstract class to represent any game player. It has attributes for
         tracking inventory.Its handle_response is passed JSON, and that JSON is
@@ -278,6 +343,8 @@ class Player(object):
         self.prev_health, self.prev_tired, self.prev_ill = 9, 9, 9 # Statuses
         self.weapons, self.artifacts, self.treasure = [], [], []   # Inventory
         self.last_visited_location = None   # The location we saw last
+        self.outcome, self.score = None, None  # How the game ended, if it has
+        self.room_identities = {}  # Of the rooms seen in this game, see Room
 
     def handle_response(self, json):
         ''' Converts the given json into useable objects. Returns either a
@@ -287,6 +354,7 @@ class Player(object):
 
         if 'congratulations' in json:
             win = WinMessage(json['congratulations'])
+            self.outcome, self.score = 'won', win.score
             logging.info('You won. Score:' + str(win.score) + \
                          ' Hoard: ' + str(win.hoard) + \
                          ' Chronicle: ' + str(win.chronicle))
@@ -294,31 +362,37 @@ class Player(object):
 
         if 'condolences' in json:
             loss = LossMessage(json['condolences'])
+            self.outcome = 'lost'
+            if loss.win:
+                self.score = loss.win.score
             logging.info('You lost. Error: ' + str(loss.error) + \
                          '\n Win: ' + str(loss.win))
             return False
 
-        location = Location.from_json(json['location'])
-        items, threats = Items([]), Threats([])
+        location = Location.from_json(json['location'], self.room_identities)
+        items, threats = NO_ITEMS, NO_THREATS
         if 'stuff' in json:
             items = Items(json['stuff'])
 
         if 'threats' in json:
             threats = Threats(json['threats'])
 
-            logging.info('THREATS. HEALTH: ' + str(threats.health))
-            logging.info('THREATS. TIRED: ' + str(threats.tired))
-            logging.info('THREATS. ATTACKED: ' + str(threats.attacked))
-            logging.info('THREATS. ATTACKED BY: ' + str(threats.attacked_by))
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info('THREATS. HEALTH: ' + str(threats.health))
+                logging.info('THREATS. TIRED: ' + str(threats.tired))
+                logging.info('THREATS. ATTACKED: ' + str(threats.attacked))
+                logging.info('THREATS. ATTACKED BY: ' +
+                             str(threats.attacked_by))
 
         move = self.next_move(location, items, threats)
         self.last_visited_location = location.identity
 
         # 'or' statement because we should use previous if
         # there's not an update
-        self.prev_health = threats.health or self.prev_health
-        self.prev_tired = threats.tired or self.prev_tired
-        self.prev_ill = threats.ill or self.prev_ill
+        if threats is not NO_THREATS:
+            self.prev_health = threats.health or self.prev_health
+            self.prev_tired = threats.tired or self.prev_tired
+            self.prev_ill = threats.ill or self.prev_ill
 
         return move
 
@@ -326,6 +400,13 @@ class Player(object):
         ''' Determines the player's next move in the dungeon '''
         raise NotImplementedError
 
+    def escape(self, reason):
+        ''' Called when the driver thinks the player is stuck, for the given
+            reason. Returns True if the player changed its plans to get
+            unstuck, or False to have the driver stop the game.
+        '''
+        return False
+
     # Helper functions for signaling to carry or drop items in the room
     def carry_frog(self):
         return Player.make_message("carry", "frog", "")
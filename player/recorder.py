@@ -0,0 +1,95 @@
+''' A flight recorder for the game driver. It keeps the raw response, move
+    and stage timings of the last few turns in a fixed size ring buffer, and
+    only writes them out when something goes wrong. Recording a turn is a
+    couple of list operations, so it can stay on while logging is at INFO.
+
+    >>> recorder = FlightRecorder(2)
+    >>> for turn in range(1, 4):
+    ...     recorder.record(turn, '{ "turn" : %d }' % turn)
+    ...     recorder.finish('(go north)', {'receive' : 0.5})
+    >>> [entry[1] for entry in recorder.entries()]
+    [2, 3]
+    >>> import tempfile
+    >>> filename = recorder.dump('invalid response', tempfile.mkdtemp())
+    >>> print open(filename).read(), # doctest: +ELLIPSIS
+    Flight recorder dump: invalid response
+    <BLANKLINE>
+    ---- Turn 2 at ...
+    Timings: receive=0.500000
+    Response:
+    { "turn" : 2 }
+    Move: (go north)
+    <BLANKLINE>
+    ---- Turn 3 at ...
+    Timings: receive=0.500000
+    Response:
+    { "turn" : 3 }
+    Move: (go north)
+'''
+import os
+import time
+import signal
+import logging
+import itertools
+from collections import deque
+
+__all__ = ['FlightRecorder']
+
+# Numbers dumps, so dumps in the same second get their own file even when
+# several games share the process
+_dump_numbers = itertools.count(1)
+
+
+class FlightRecorder(object):
+    ''' Remembers the last size turns of a game '''
+
+    def __init__(self, size=50):
+        self._entries = deque(maxlen=size)
+
+    def record(self, turn, response):
+        ''' Starts a turn with the response received from the game '''
+        self._entries.append([time.time(), turn, response, None, None])
+
+    def finish(self, move, timings):
+        ''' Completes the current turn with the move sent and the time each
+            stage took
+        '''
+        entry = self._entries[-1]
+        entry[3], entry[4] = move, timings
+
+    def entries(self):
+        ''' Returns the recorded turns, oldest first, as lists of
+            [time, turn, response, move, timings]
+        '''
+        return list(self._entries)
+
+    def dump(self, reason, directory='.'):
+        ''' Writes the recorded turns to a new file in the given directory
+            and returns its name
+        '''
+        filename = os.path.join(directory, 'flight-%d-%d-%d.log' %
+                                (int(time.time()), os.getpid(),
+                                 next(_dump_numbers)))
+        with open(filename, 'w') as out:
+            out.write('Flight recorder dump: %s\n' % reason)
+            for when, turn, response, move, timings in self.entries():
+                out.write('\n---- Turn %s at %s\n' %
+                          (turn, time.strftime('%Y-%m-%d %H:%M:%S',
+                                               time.localtime(when))))
+                if timings:
+                    out.write('Timings: %s\n' % ' '.join(
+                        ['%s=%f' % item for item in sorted(timings.items())]))
+                out.write('Response:\n%s\n' % response)
+                if move is not None:
+                    out.write('Move: %s\n' % move)
+        logging.info('Dumped the last %d turns to %s' %
+                     (len(self._entries), filename))
+        return filename
+
+    def dump_on_signal(self, signum=signal.SIGUSR1, directory='.'):
+        ''' Dumps the recorded turns whenever the process gets signum, without
+            stopping the game
+        '''
+        def handler(signum, frame):
+            self.dump('signal %d' % signum, directory)
+        signal.signal(signum, handler)
@@ -0,0 +1,247 @@
+''' Keeps the outcome of every game we play in a local SQLite database, so
+    strategies can be compared with a query instead of by grepping logs.
+
+    One row is stored per game in the games table. If asked, one row per turn
+    is also stored in the turns table. Rows are buffered in memory and written
+    in batches, each batch in a single transaction.
+
+    Run as a script to query a results database:
+
+    $ python player/results.py -f results.db scores
+    $ python player/results.py -f results.db slowest -n 20
+    $ python player/results.py -f results.db latency -c validate_time
+    $ python player/results.py -f results.db resources
+
+    >>> store = ResultStore(':memory:', batch_size=2)
+    >>> store.record_game({'player' : 'BreadcrumbPlayer', 'outcome' : 'won',
+    ...                    'score' : 10, 'turns' : 3, 'wall_time' : 1.5},
+    ...                   [{'turn' : 1, 'move' : '(go north)'}])
+    >>> store.record_game({'player' : 'BreadcrumbPlayer', 'outcome' : 'lost',
+    ...                    'score' : 30, 'turns' : 5, 'wall_time' : 0.5})
+    >>> store.mean_score_by_player()
+    [(u'BreadcrumbPlayer', 2, 20.0, 10, 30)]
+    >>> store.slowest_games(1)[0][-1]
+    1.5
+    >>> store.percentiles('wall_time', [50, 100])
+    [(50, 0.5), (100, 1.5)]
+    >>> store.percentiles('move', [50])
+    Traceback (most recent call last):
+    ...
+    ValueError: Cannot compute percentiles of column move
+    >>> store.close()
+'''
+import math
+import sqlite3
+
+__all__ = ['ResultStore', 'GAME_COLUMNS', 'TURN_COLUMNS', 'STAGES']
+
+# The stages of a single turn, in the order the driver runs them
+STAGES = ['receive', 'validate', 'decode', 'decide', 'send']
+
+# What a game cost: CPU seconds of the game child (as reaped with wait4) and
+# of the driver, and resident memory in kB. The game's peak RSS is its own;
+# the driver's RSS is at the end of the game, and its growth during it
+RESOURCE_COLUMNS = ['game_user_time', 'game_sys_time', 'game_max_rss',
+                    'driver_user_time', 'driver_sys_time', 'driver_rss',
+                    'driver_rss_growth']
+
+# Column name and SQL type for a game. Stage timings are totals in seconds
+GAME_COLUMNS = [('started', 'REAL'),
+                ('player', 'TEXT'),
+                ('seed1', 'INTEGER'),
+                ('seed2', 'INTEGER'),
+                ('game_hash', 'TEXT'),
+                ('outcome', 'TEXT'),
+                ('score', 'INTEGER'),
+                ('turns', 'INTEGER'),
+                ('wall_time', 'REAL')] + \
+               [('%s_time' % stage, 'REAL') for stage in STAGES] + \
+               [('watchdog', 'TEXT'),
+                ('cpus', 'TEXT'),
+                ('label', 'TEXT'),
+                ('replayed_turns', 'INTEGER')] + \
+               [(column, 'REAL') for column in RESOURCE_COLUMNS]
+
+# Column name and SQL type for a single turn of a game
+TURN_COLUMNS = [('turn', 'INTEGER'),
+                ('move', 'TEXT'),
+                ('bytes', 'INTEGER')] + \
+               [('%s_time' % stage, 'REAL') for stage in STAGES]
+
+# Columns that the CLI sorts or aggregates on get an index, so that those
+# queries stay fast no matter how many games have been recorded
+INDEXED_COLUMNS = ['wall_time', 'score'] + \
+                  ['%s_time' % stage for stage in STAGES]
+
+# The same for single turns, whose stage timings latency --turns sorts
+INDEXED_TURN_COLUMNS = ['%s_time' % stage for stage in STAGES]
+
+_SCHEMA = ['CREATE TABLE IF NOT EXISTS games (id INTEGER PRIMARY KEY, %s)' %
+               ', '.join('%s %s' % column for column in GAME_COLUMNS),
+           'CREATE TABLE IF NOT EXISTS turns (game_id INTEGER, %s)' %
+               ', '.join('%s %s' % column for column in TURN_COLUMNS),
+           'CREATE INDEX IF NOT EXISTS games_player ON games (player, score)',
+           'CREATE INDEX IF NOT EXISTS games_seeds ON games (seed1, seed2)',
+           'CREATE INDEX IF NOT EXISTS turns_game ON turns (game_id, turn)'] + \
+          ['CREATE INDEX IF NOT EXISTS games_%s ON games (%s)' % (c, c)
+               for c in INDEXED_COLUMNS] + \
+          ['CREATE INDEX IF NOT EXISTS turns_%s ON turns (%s)' % (c, c)
+               for c in INDEXED_TURN_COLUMNS]
+
+
+class ResultStore(object):
+    ''' A SQLite database of game results. Games are held in memory until
+        batch_size of them have been recorded, or until flush or close is
+        called.
+    '''
+
+    def __init__(self, filename, batch_size=100):
+        self.batch_size = batch_size
+        self._pending = [] # (game, turns) pairs not yet written
+        self._connection = sqlite3.connect(filename)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            for statement in _SCHEMA:
+                self._connection.execute(statement)
+            self._add_missing_columns('games', GAME_COLUMNS)
+            self._add_missing_columns('turns', TURN_COLUMNS)
+
+    def _add_missing_columns(self, table, columns):
+        ''' Databases made before a column was added get it added empty '''
+        existing = set([row[1] for row in self._connection.execute(
+            'PRAGMA table_info(%s)' % table)])
+        for name, kind in columns:
+            if name not in existing:
+                self._connection.execute('ALTER TABLE %s ADD COLUMN %s %s' %
+                                         (table, name, kind))
+
+    def record_game(self, game, turns=None):
+        ''' Queue a game to be written. game is a dict keyed by the names in
+            GAME_COLUMNS, and turns an optional list of dicts keyed by the
+            names in TURN_COLUMNS. Missing keys are stored as NULL.
+        '''
+        self._pending.append((game, turns))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        ''' Write all queued games in one transaction '''
+        if not self._pending:
+            return
+        game_names = [name for name, _ in GAME_COLUMNS]
+        turn_names = [name for name, _ in TURN_COLUMNS]
+        insert_game = 'INSERT INTO games (%s) VALUES (%s)' % \
+                (', '.join(game_names), ', '.join('?' * len(game_names)))
+        insert_turn = 'INSERT INTO turns (game_id, %s) VALUES (?, %s)' % \
+                (', '.join(turn_names), ', '.join('?' * len(turn_names)))
+        with self._connection:
+            cursor = self._connection.cursor()
+            for game, turns in self._pending:
+                cursor.execute(insert_game, [game.get(n) for n in game_names])
+                if turns:
+                    game_id = cursor.lastrowid
+                    cursor.executemany(insert_turn,
+                                       [[game_id] + [t.get(n) for n in turn_names]
+                                        for t in turns])
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def query(self, sql, args=()):
+        ''' Runs the given SQL against the stored games, returning all rows '''
+        self.flush()
+        return self._connection.execute(sql, args).fetchall()
+
+    def mean_score_by_player(self):
+        ''' Returns (player, games, mean score, min score, max score) rows '''
+        return self.query('SELECT player, COUNT(*), AVG(score), MIN(score), '
+                          'MAX(score) FROM games GROUP BY player '
+                          'ORDER BY AVG(score) DESC')
+
+    def resources_by_player(self):
+        ''' Returns (player, games, wall, game CPU, driver CPU, idle, game
+            peak RSS, driver RSS) rows of means per game. Idle is the wall
+            time neither the game nor the driver spent on a CPU.
+        '''
+        return self.query('SELECT player, COUNT(*), AVG(wall_time), '
+                          'AVG(game_user_time + game_sys_time), '
+                          'AVG(driver_user_time + driver_sys_time), '
+                          'AVG(wall_time - game_user_time - game_sys_time - '
+                          'driver_user_time - driver_sys_time), '
+                          'AVG(game_max_rss), AVG(driver_rss) FROM games '
+                          'GROUP BY player ORDER BY player')
+
+    def slowest_games(self, limit=10):
+        ''' Returns the seeds and player of the games which took the longest '''
+        return self.query('SELECT seed1, seed2, player, turns, wall_time '
+                          'FROM games ORDER BY wall_time DESC LIMIT ?',
+                          (limit,))
+
+    def percentiles(self, column, percents=(50, 90, 99), table='games'):
+        ''' Returns (percent, value) pairs for the given timing column. The
+            timing columns of both tables are indexed, so each percentile is
+            a single walk of the index rather than a sort.
+        '''
+        columns = dict(TURN_COLUMNS if table == 'turns' else GAME_COLUMNS)
+        if columns.get(column) != 'REAL' or table not in ('games', 'turns'):
+            raise ValueError('Cannot compute percentiles of column %s' % column)
+        count = self.query('SELECT COUNT(%s) FROM %s' % (column, table))[0][0]
+        result = []
+        for percent in percents:
+            if not count:
+                result.append((percent, None))
+                continue
+            # Nearest rank: the smallest value with percent of values <= it
+            offset = max(0, int(math.ceil(count * percent / 100.0)) - 1)
+            value = self.query('SELECT %s FROM %s WHERE %s IS NOT NULL '
+                               'ORDER BY %s LIMIT 1 OFFSET ?' %
+                               (column, table, column, column), (offset,))
+            result.append((percent, value[0][0]))
+        return result
+
+
+def _print_rows(header, rows):
+    print '\t'.join(header)
+    for row in rows:
+        print '\t'.join([str(value) for value in row])
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+
+    parser = OptionParser(usage='%prog -f FILE scores|slowest|latency|resources')
+    parser.add_option("-f", "--file", dest="filename", metavar="FILE",
+                      default="results.db", help="Results database to query")
+    parser.add_option("-n", "--limit", dest="limit", type="int", default=10,
+                      help="Number of games to list for slowest")
+    parser.add_option("-c", "--column", dest="column", default="wall_time",
+                      help="Timing column to use for latency")
+    parser.add_option("--turns", dest="table", action="store_const",
+                      const="turns", default="games",
+                      help="Compute latency over single turns, not games")
+    options, args = parser.parse_args()
+
+    if len(args) != 1:
+        parser.error("Please give one query: scores, slowest, latency or "
+                     "resources")
+
+    store = ResultStore(options.filename)
+    if args[0] == 'scores':
+        _print_rows(['player', 'games', 'mean', 'min', 'max'],
+                    store.mean_score_by_player())
+    elif args[0] == 'slowest':
+        _print_rows(['seed1', 'seed2', 'player', 'turns', 'wall_time'],
+                    store.slowest_games(options.limit))
+    elif args[0] == 'latency':
+        _print_rows(['percent', options.column],
+                    store.percentiles(options.column, table=options.table))
+    elif args[0] == 'resources':
+        _print_rows(['player', 'games', 'wall', 'game_cpu', 'driver_cpu',
+                     'idle', 'game_max_rss', 'driver_rss'],
+                    store.resources_by_player())
+    else:
+        parser.error("Unknown query %s" % args[0])
+    store.close()
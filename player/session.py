@@ -0,0 +1,548 @@
+''' Plays games from inside Python. A GameSession is one game: the command
+    which starts the game, the transport which talks to it, the validator
+    which checks its responses, the player which answers them, and the
+    driver options. game_player.py is a thin command line over a single
+    session; batch_player.py and campaign_player.py can run many sessions
+    in one process, so each game costs only the spawning of the game.
+
+    >>> options, _ = make_parser().parse_args(['-t', 'castle.txt',
+    ...                                        '-p', 'GoldDigger'])
+    >>> game_command(options)
+    'python ./player/dummy_game.py -c castle.txt'
+    >>> make_player(options).__class__.__name__
+    'GoldDigger'
+    >>> session = GameSession(options)
+    >>> session.player.ignored_treasure
+    set(['art'])
+'''
+import os
+import sys
+import time
+import logging
+import resource
+import itertools
+import threading
+from Queue import Queue
+from hashlib import sha1
+from json import loads
+from optparse import OptionParser
+from contextlib import closing
+
+from pexpect import spawn, TIMEOUT
+from player import BreadcrumbPlayer, SelfPreservationPlayer, GoldDigger,\
+        GreedyPlayer, FighterPlayer
+from results import STAGES
+from columns import ColumnWriter
+from recorder import FlightRecorder
+from watchdog import Watchdog
+from affinity import parse_cpus, format_cpus, get_affinity, set_affinity
+from memprofile import MemoryProfiler, rss_kb
+from trie import trie_transport
+
+__all__ = ['GameSession', 'SessionPool', 'PLAYERS', 'make_parser',
+           'setup_logging', 'game_command', 'make_player']
+
+PLAYERS = {'BreadcrumbPlayer' : BreadcrumbPlayer,
+           'SelfPreservationPlayer' : SelfPreservationPlayer,
+           'GreedyPlayer' : GreedyPlayer,
+           'FighterPlayer' : FighterPlayer,
+           'GoldDigger' : GoldDigger}
+
+# Numbers the column files of sessions started in the same second
+_session_numbers = itertools.count(1)
+
+# Hashes of game files, by path and modification time
+_game_hashes = {}
+
+# The driver's CPU time is measured for the calling thread where the system
+# can, so sessions running side by side in threads are told apart
+if hasattr(resource, 'RUSAGE_THREAD'):
+    _RUSAGE_DRIVER = resource.RUSAGE_THREAD
+elif sys.platform.startswith('linux'):
+    _RUSAGE_DRIVER = 1 # RUSAGE_THREAD, which Python 2 does not name
+else:
+    _RUSAGE_DRIVER = resource.RUSAGE_SELF
+
+
+def make_parser():
+    ''' The options of game_player.py '''
+    parser = OptionParser()
+    parser.add_option("-l", "--larceny", dest="larceny", default="larceny",
+                      help="Location of larceny binary", metavar="FILE")
+    parser.add_option("-g", "--game", dest="game",
+                      help="Location of game file")
+    parser.add_option("-c", "--charactertimeout", dest="character_timeout",
+                      help="Time out for reading characters", type="float",
+                      default=0.09)
+    parser.add_option("-r", "--responsetimeout", dest="response_timeout",
+                      help="Timeout for total reading from shell",
+                      type="float", default=10.00)
+    parser.add_option("-t", "--testcastle", dest="test_castle",
+                      metavar="FILE",
+                      help="Run in test mode, with specified castle file")
+    parser.add_option("-d", "--debug", action='store_true', dest="debug",
+                      default=False,
+                      help="Should we log DEBUG level information?")
+    parser.add_option("-i", "--info", dest="info", action='store_true',
+                      default=False,
+                      help="Should we log INFO level information?")
+    parser.add_option("-s", "--random1", dest="random1",
+                      help="Random seed variable 1", type="int")
+    parser.add_option("-q", "--random2", dest="random2",
+                      help="Random seed variable 2", type="int")
+    parser.add_option("-p", "--player", dest="player",
+                      help="Player you want to use",
+                      default="SelfPreservationPlayer")
+    parser.add_option("-o", "--results", dest="results", metavar="FILE",
+                      help="Append the outcome of the game to a SQLite \
+                      database")
+    parser.add_option("--record-turns", dest="record_turns",
+                      action='store_true', default=False, help="Also store \
+                      every turn in the results database")
+    parser.add_option("--columns", dest="columns", metavar="DIR",
+                      help="Write per turn metrics as column files under DIR")
+    parser.add_option("--metrics-port", dest="metrics_port", type="int",
+                      help="Serve live metrics on this local port")
+    parser.add_option("--metrics-file", dest="metrics_file", metavar="FILE",
+                      help="Rewrite live metrics to FILE every few seconds")
+    parser.add_option("--flight-recorder", dest="flight_recorder",
+                      type="int", default=0, metavar="N", help="Keep the \
+                      last N turns in memory and write them out if the game \
+                      fails")
+    parser.add_option("--flight-dir", dest="flight_dir", metavar="DIR",
+                      default=".", help="Where flight recorder dumps are \
+                      written")
+    parser.add_option("-w", "--watchdog", dest="watchdog", type="choice",
+                      choices=["hint", "stop"], help="When the player is \
+                      stuck in a cycle or over budget, give it a hint to \
+                      leave or stop the game")
+    parser.add_option("--max-turns", dest="max_turns", type="int",
+                      help="Turn budget for the watchdog")
+    parser.add_option("--max-seconds", dest="max_seconds", type="float",
+                      help="Wall clock budget for the watchdog")
+    parser.add_option("--cpus", dest="cpus", metavar="LIST",
+                      help="Pin the driver and the game to these CPUs \
+                      (e.g. 2-3)")
+    parser.add_option("--memory-profile", dest="memory_profile", type="int",
+                      metavar="N", help="Take a memory snapshot every N \
+                      turns and report what grew at the end of the game")
+    parser.add_option("--ignored-weapons", dest="ignored_weapons",
+                      metavar="LIST", help="Comma separated weapons the \
+                      player should not pick up")
+    parser.add_option("--ignored-treasure", dest="ignored_treasure",
+                      metavar="LIST", help="Comma separated treasure the \
+                      player should not pick up")
+    parser.add_option("--label", dest="label", help="Name for this \
+                      configuration of the player in the results database")
+    parser.add_option("--trie", dest="trie", metavar="FILE", help="Answer \
+                      from the responses of earlier games with the same \
+                      seeds in FILE where possible, and add new ones to it. \
+                      Needs both -s and -q")
+    return parser
+
+
+def setup_logging(options):
+    ''' Logs to a new file if -d or -i was given. Returns its name, if any '''
+    if not (options.debug or options.info):
+        return None
+    if options.debug:
+        level = logging.DEBUG
+    else:
+        level = logging.INFO
+    logging_filename = './runlog-%s.log' % int(time.time())
+    logging.basicConfig(level=level,
+                        format='%(asctime)s %(levelname)s %(message)s',
+                        filename=logging_filename,
+                        filemode='w')
+    return logging_filename
+
+
+def game_command(options):
+    ''' The command which starts the game, or our tester '''
+    if options.test_castle:
+        # Setup test file with specified castle
+        return "python ./player/dummy_game.py -c %s" % (options.test_castle)
+    # Setup command to execute program
+    process = '%s -r6rs -program %s' % (options.larceny, options.game)
+    if options.random1 and options.random2:
+        process += ' -- outputfile %i %i' % (options.random1, options.random2)
+    return process
+
+
+def make_player(options):
+    ''' A new player of the class and with the tunables in options '''
+    player = PLAYERS[options.player]()
+    if options.ignored_weapons is not None:
+        player.ignored_weapons = set(filter(None,
+                                            options.ignored_weapons.split(',')))
+    if options.ignored_treasure is not None:
+        player.ignored_treasure = set(filter(None,
+                                             options.ignored_treasure.split(',')))
+    return player
+
+
+def game_hash(filename):
+    ''' The sha1 of a game file, only read again when it changes '''
+    key = (filename, os.path.getmtime(filename))
+    if key not in _game_hashes:
+        with open(filename, 'rb') as game_file:
+            _game_hashes[key] = sha1(game_file.read()).hexdigest()
+    return _game_hashes[key]
+
+
+class GameSession(object):
+    ''' One game. The validator is the validation module, or anything else
+        with its validate and version_from_banner functions; when it is
+        None, or when playing a test castle, responses are not validated.
+        Metrics may be shared between sessions.
+
+        After run, the session holds the player, the game's row for the
+        results database (game) and, with --record-turns, a row per turn.
+        A response which does not validate ends the game as invalid, and
+        the flight recorder, if on, is dumped:
+
+        >>> class Game(object):
+        ...     def __init__(self, command):
+        ...         self.moves = []
+        ...     def receive_response_json_dict(self, *timeouts):
+        ...         return 'Version 8\\n{ "location" : "in the moat" , }'
+        ...     def sendline(self, move):
+        ...         self.moves.append(move)
+        ...     def close(self):
+        ...         pass
+        >>> class Validator(object):
+        ...     def version_from_banner(self, banner):
+        ...         return banner.split()[-1]
+        ...     def validate(self, response, version=None):
+        ...         return not response.rstrip('} ').endswith(',')
+        >>> import tempfile
+        >>> directory = tempfile.mkdtemp()
+        >>> options, _ = make_parser().parse_args(['-g', __file__,
+        ...     '--flight-recorder', '5', '--flight-dir', directory])
+        >>> session = GameSession(options, transport=Game,
+        ...                       validator=Validator())
+        >>> session.run()['outcome']
+        'invalid'
+        >>> session.invalid_response
+        '{ "location" : "in the moat" , }'
+        >>> [open(os.path.join(directory, name)).readline()
+        ...  for name in os.listdir(directory)]
+        ['Flight recorder dump: invalid response\\n']
+    '''
+
+    def __init__(self, options, player=None, transport=spawn,
+                 validator=None, metrics=None):
+        self.options = options
+        self.player = player or make_player(options)
+        self.transport = transport
+        self.validator = validator
+        self.metrics = metrics
+        self.command = game_command(options)
+        self.number = next(_session_numbers)
+        if options.trie and transport is spawn:
+            if not (options.random1 and options.random2):
+                raise ValueError('--trie needs both seeds, -s and -q')
+            self.transport = trie_transport(options.trie,
+                                            (game_hash(options.test_castle or
+                                                       options.game),
+                                             options.random1,
+                                             options.random2))
+
+        self.game = None
+        self.turns = [] # Per turn timings, only kept when recording turns
+        self.invalid_response = None # The response which failed validation
+
+        # Flight recorder of the last few turns, dumped on failures
+        self.recorder = None
+        if options.flight_recorder:
+            self.recorder = FlightRecorder(options.flight_recorder)
+
+        # Watchdog for players stuck in loops, or going over budget
+        self.watchdog = None
+        if options.watchdog or options.max_turns or options.max_seconds:
+            self.watchdog = Watchdog(options.max_turns, options.max_seconds)
+
+        # Memory snapshots every few turns, if asked for
+        self.profiler = None
+        if options.memory_profile:
+            self.profiler = MemoryProfiler(options.memory_profile)
+
+    def run(self):
+        ''' Plays the game and returns its row for the results database.
+            If the game fails, the flight recorder is dumped before the
+            exception is passed on.
+        '''
+        try:
+            return self._run()
+        except Exception, error:
+            if self.recorder:
+                self.recorder.dump('exception: %r' % error,
+                                   self.options.flight_dir)
+            raise
+
+    def _run(self):
+        options, player, metrics = self.options, self.player, self.metrics
+        recorder, watchdog, profiler = \
+                self.recorder, self.watchdog, self.profiler
+        validator = not options.test_castle and self.validator
+
+        # Pin ourselves before spawning the game, so that the game inherits it
+        if options.cpus:
+            set_affinity(parse_cpus(options.cpus))
+        cpus = format_cpus(get_affinity())
+        logging.info('Running on CPUs %s' % cpus)
+
+        time_start = time.time()
+        logging.info('Start at %s' % time_start)
+        usage_start = resource.getrusage(_RUSAGE_DRIVER)
+        rss_start = rss_kb()
+
+        # Time spent in each stage of a turn, summed over the game
+        stage_times = dict((stage, 0.0) for stage in STAGES)
+        turn = 0
+        game_version = None # Announced by the game on its first line
+
+        # Per turn metrics written as column files, if asked for
+        columns = None
+        if options.columns:
+            columns = ColumnWriter(options.columns, 'game-%d-%d-%d' %
+                                   (int(time_start), os.getpid(),
+                                    self.number))
+
+        # Start process
+        if metrics:
+            metrics.games_started.inc()
+        child = self.transport(self.command)
+        with closing(child):
+
+            # Send lines until you receive a False
+            while True:
+                turn += 1
+                t_start = time.time()
+
+                # Get response
+                try:
+                    response = child.receive_response_json_dict(
+                        options.response_timeout,
+                        options.character_timeout).lstrip('\r\n')
+                except TIMEOUT:
+                    if metrics:
+                        metrics.timeouts.inc()
+                    raise
+                t_received = time.time()
+                received = len(response)
+                if recorder:
+                    recorder.record(turn, response)
+
+                # Encode response
+                # Strip first line for decoding, it's either the Version
+                # number or the last move
+                first_line_end = response.find('\n')
+                if turn == 1 and validator:
+                    game_version = validator.version_from_banner(
+                        response[:first_line_end])
+                    logging.info('Game version %s' % game_version)
+                response = response[first_line_end + 1:]
+
+                # log the response
+                logging.debug("Response:\n%s", response)
+
+                # Validate the response
+                # Validation turn off when testing
+                if validator and not validator.validate(response,
+                                                        version=game_version):
+                    self.invalid_response = response
+                    player.outcome = 'invalid'
+                    if metrics:
+                        metrics.validation_failures.inc()
+                    if recorder:
+                        recorder.dump('invalid response', options.flight_dir)
+                    break
+                t_validated = time.time()
+
+                response = loads(response)
+                t_decoded = time.time()
+
+                # Only a response which validated and decoded goes in the trie
+                if hasattr(child, 'accept'):
+                    child.accept()
+
+                # Determine next move and tell the game program
+                next_move = player.handle_response(response)
+
+                # Check that we are not stuck. When we are, either the player
+                # takes a hint to get out, or the game is stopped
+                if watchdog and next_move != False:
+                    event = watchdog.check(player.last_visited_location,
+                                           next_move)
+                    if event:
+                        kind, detail = event
+                        if options.watchdog != "stop" and \
+                                kind != "grace" and player.escape(detail):
+                            watchdog.hinted()
+                        else:
+                            next_move = "(stop)"
+                t_decided = time.time()
+
+                # log the response
+                logging.debug("Next Move:\n%s", next_move)
+
+                # If next_move is false then stop playing
+                if next_move != False:
+                    child.sendline(next_move)
+                t_sent = time.time()
+
+                timings = dict(zip(STAGES, [t_received - t_start,
+                                            t_validated - t_received,
+                                            t_decoded - t_validated,
+                                            t_decided - t_decoded,
+                                            t_sent - t_decided]))
+                for stage, elapsed in timings.iteritems():
+                    stage_times[stage] += elapsed
+                if metrics:
+                    metrics.turn(timings)
+                if recorder:
+                    recorder.finish(next_move, timings)
+                if profiler:
+                    profiler.turn(turn, player)
+                if options.record_turns:
+                    row = dict(('%s_time' % stage, elapsed)
+                               for stage, elapsed in timings.iteritems())
+                    row.update(turn=turn, move=next_move or None,
+                               bytes=received)
+                    self.turns.append(row)
+                if columns is not None:
+                    columns.append(bytes=received,
+                                   rooms_visited=len(getattr(player,
+                                                             'visited_doors',
+                                                             ())),
+                                   inventory=len(player.weapons) + \
+                                             len(player.treasure) + \
+                                             len(player.artifacts),
+                                   health=player.prev_health,
+                                   tired=player.prev_tired,
+                                   ill=player.prev_ill,
+                                   **dict(('%s_time' % stage, elapsed)
+                                          for stage, elapsed
+                                          in timings.iteritems()))
+
+                if next_move == False:
+                    break
+
+        time_end = time.time()
+        logging.info('End at %s' % time_end)
+        usage_end = resource.getrusage(_RUSAGE_DRIVER)
+        rss_end = rss_kb()
+
+        elapsed = time_end - time_start
+        logging.info("Took %s seconds to run, which is the same as %s "
+                     "minutes" % (elapsed, elapsed/60.0))
+
+        if columns is not None:
+            columns.close()
+
+        if profiler:
+            profiler.snapshot(turn, player)
+
+        if metrics and player.outcome != 'invalid':
+            metrics.games_finished.inc()
+
+        self.game = {'started' : time_start,
+                     'player' : options.player,
+                     'seed1' : options.random1,
+                     'seed2' : options.random2,
+                     'game_hash' : game_hash(options.test_castle or
+                                             options.game),
+                     'outcome' : player.outcome,
+                     'score' : player.score,
+                     'turns' : turn,
+                     'wall_time' : elapsed,
+                     'cpus' : cpus,
+                     'label' : options.label or options.player}
+        if watchdog and watchdog.events:
+            self.game['watchdog'] = '; '.join(['turn %d %s: %s' % event
+                                               for event in watchdog.events])
+        self.game.update(('%s_time' % stage, total)
+                         for stage, total in stage_times.iteritems())
+
+        if hasattr(child, 'replayed'):
+            self.game['replayed_turns'] = child.replayed
+
+        # What the game and the driver cost. The child is reaped on close
+        game_usage = getattr(child, 'rusage', None)
+        if game_usage is not None:
+            self.game.update(game_user_time=game_usage.ru_utime,
+                             game_sys_time=game_usage.ru_stime,
+                             game_max_rss=game_usage.ru_maxrss)
+        self.game.update(driver_user_time=usage_end.ru_utime -
+                                          usage_start.ru_utime,
+                         driver_sys_time=usage_end.ru_stime -
+                                         usage_start.ru_stime,
+                         driver_rss=rss_end,
+                         driver_rss_growth=rss_end - rss_start)
+        logging.info('Driver CPU %.3f s, RSS %d kB (%+d kB)' %
+                     (self.game['driver_user_time'] +
+                      self.game['driver_sys_time'], rss_end,
+                      rss_end - rss_start))
+        if game_usage is not None:
+            logging.info('Game CPU %.3f s, peak RSS %d kB' %
+                         (game_usage.ru_utime + game_usage.ru_stime,
+                          game_usage.ru_maxrss))
+        return self.game
+
+
+class SessionPool(object):
+    ''' Runs sessions in worker threads, jobs at a time. Each worker can be
+        pinned to its own slot of CPUs, which the games it spawns inherit.
+        The driver mostly waits on its game, so threads are enough.
+
+        Finished sessions come back from finished() in the order they end,
+        with the exception which stopped them, if any, in session.error.
+        Sessions submitted without metrics of their own update the pool's.
+    '''
+
+    def __init__(self, jobs, slots=(), metrics=None):
+        self.metrics = metrics
+        self._todo = Queue()
+        self._done = Queue()
+        self.pending = 0
+        self._workers = []
+        for number in range(jobs):
+            slot = slots and slots[number % len(slots)] or None
+            worker = threading.Thread(target=self._work, args=(slot,))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self, slot):
+        if slot:
+            set_affinity(slot)
+        while True:
+            session = self._todo.get()
+            if session is None:
+                return
+            session.error = None
+            try:
+                session.run()
+            except Exception, error:
+                logging.exception('Game %s failed' % session.command)
+                session.error = error
+            self._done.put(session)
+
+    def submit(self, session):
+        if session.metrics is None:
+            session.metrics = self.metrics
+        self.pending += 1
+        self._todo.put(session)
+
+    def finished(self):
+        ''' Waits for the next session to finish and returns it '''
+        session = self._done.get()
+        self.pending -= 1
+        return session
+
+    def close(self):
+        for _ in self._workers:
+            self._todo.put(None)
+        for worker in self._workers:
+            worker.join()
@@ -0,0 +1,228 @@
+''' A persistent trie of the responses of seeded games, for evaluating
+    strategies without playing the game.
+
+    With the same game and seeds, the game's response to a sequence of moves
+    is always the same. Every response seen is stored in a SQLite trie under
+    (game hash, seeds, moves so far). A TrieChild stands in for the game: it
+    answers from the trie as long as the player stays on move sequences seen
+    before, and only when the player steps off them does it spawn the real
+    game, replay the moves so far to fast-forward it, and carry on live,
+    storing the new responses as it goes. A response from the game is only
+    stored once the driver accepts it, after it validated and decoded, so
+    the trie never replays a bad one. Only games played on both seeds are
+    the same every time, so the key must have both.
+
+    >>> class Game(object):
+    ...     # A game whose response is the number of moves it got
+    ...     def __init__(self, command):
+    ...         self.moves, self.rusage = 0, None
+    ...     def receive_response_json_dict(self, *timeouts):
+    ...         return 'Version 8\\n%d' % self.moves
+    ...     def sendline(self, move):
+    ...         self.moves += 1
+    ...     def close(self):
+    ...         pass
+    >>> trie = ResponseTrie(':memory:')
+    >>> def play(moves):
+    ...     child = TrieChild(trie, ('hash', 1, 2), 'game', spawn=Game)
+    ...     responses = [child.receive_response_json_dict(10, 1)]
+    ...     child.accept()
+    ...     for move in moves:
+    ...         child.sendline(move)
+    ...         responses.append(child.receive_response_json_dict(10, 1))
+    ...         if move != '(bad)':
+    ...             child.accept()
+    ...     child.close()
+    ...     return [r.split()[-1] for r in responses], child.replayed, child.live
+    >>> play(['(go north)', '(go east)'])
+    (['0', '1', '2'], 0, 3)
+    >>> play(['(go north)', '(go east)'])
+    (['0', '1', '2'], 3, 0)
+    >>> play(['(go north)', '(go west)', '(go up)'])
+    (['0', '1', '2', '3'], 2, 2)
+
+    A response the driver did not accept is not stored:
+
+    >>> play(['(go north)', '(bad)'])
+    (['0', '1', '2'], 2, 1)
+    >>> play(['(go north)', '(bad)'])
+    (['0', '1', '2'], 2, 1)
+    >>> count = lambda: trie._connection.execute(
+    ...     'SELECT COUNT(*) FROM nodes').fetchone()[0]
+    >>> before = count()
+    >>> trie.add_root(('hash', 1, 2), 'Version 8\\n0') == \\
+    ...     trie.root(('hash', 1, 2)), count() == before
+    (True, True)
+    >>> TrieChild(trie, ('hash', None, None), 'game', spawn=Game)
+    Traceback (most recent call last):
+    ...
+    ValueError: The trie needs games played on both seeds
+'''
+import logging
+import sqlite3
+
+from pexpect import spawn as pexpect_spawn
+
+__all__ = ['ResponseTrie', 'TrieChild', 'trie_transport']
+
+_SCHEMA = ['CREATE TABLE IF NOT EXISTS roots (game_hash TEXT, seed1 INTEGER, '
+           'seed2 INTEGER, node INTEGER, '
+           'UNIQUE (game_hash, seed1, seed2))',
+           'CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, '
+           'parent INTEGER, move TEXT, response TEXT, '
+           'UNIQUE (parent, move))']
+
+
+class ResponseTrie(object):
+    ''' The trie of responses, in a SQLite database. A node is a position in
+        a game, reached from its parent by a move, and holds the response the
+        game gave there.
+    '''
+
+    def __init__(self, filename):
+        self._connection = sqlite3.connect(filename, timeout=30)
+        self._connection.text_factory = str # Responses as the game sent them
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            for statement in _SCHEMA:
+                self._connection.execute(statement)
+
+    def root(self, key):
+        ''' The node at the start of the game with the given (game hash,
+            seed1, seed2), or None if it was never played
+        '''
+        row = self._connection.execute(
+            'SELECT node FROM roots WHERE game_hash IS ? AND seed1 IS ? AND '
+            'seed2 IS ?', key).fetchone()
+        return row and row[0]
+
+    def child(self, node, move):
+        ''' The node reached from node with move, or None if not seen '''
+        row = self._connection.execute(
+            'SELECT id FROM nodes WHERE parent = ? AND move = ?',
+            (node, move)).fetchone()
+        return row and row[0]
+
+    def response(self, node):
+        return self._connection.execute('SELECT response FROM nodes '
+                                        'WHERE id = ?', (node,)).fetchone()[0]
+
+    def add_root(self, key, response):
+        ''' Stores the first response of a game, unless another game stored
+            it first. Returns its node.
+        '''
+        root = self.root(key)
+        if root is not None:
+            return root
+        node = self._connection.execute(
+            'INSERT INTO nodes (parent, move, response) VALUES (NULL, NULL, ?)',
+            (response,)).lastrowid
+        if not self._connection.execute('INSERT OR IGNORE INTO roots VALUES '
+                                        '(?, ?, ?, ?)', key + (node,)).rowcount:
+            # Lost the race to another game: drop our copy of the root
+            self._connection.execute('DELETE FROM nodes WHERE id = ?', (node,))
+        return self.root(key)
+
+    def add(self, node, move, response):
+        ''' Stores the response to move from node. Returns the new node '''
+        self._connection.execute('INSERT OR IGNORE INTO nodes (parent, move, '
+                                 'response) VALUES (?, ?, ?)',
+                                 (node, move, response))
+        return self.child(node, move)
+
+    def commit(self):
+        self._connection.commit()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+
+class TrieChild(object):
+    ''' Stands in for the spawned game, answering from the trie while it
+        can. It has the parts of pexpect's spawn which the driver uses.
+    '''
+
+    def __init__(self, trie, key, command, spawn=pexpect_spawn,
+                 close_trie=False):
+        if None in key[1:]:
+            raise ValueError('The trie needs games played on both seeds')
+        self.trie = trie
+        self.close_trie = close_trie # Close the trie along with the game
+        self.key = key
+        self.command = command
+        self.spawn = spawn
+        self.node = trie.root(key) # Where we are in the trie, if known
+        self.parent, self.move = None, None # How we got there
+        self.pending = None        # A live response not yet accepted
+        self.moves = []            # Every move sent so far
+        self.child = None          # The real game, once we needed it
+        self.replayed, self.live = 0, 0 # Responses from the trie and game
+
+    @property
+    def rusage(self):
+        return self.child and self.child.rusage
+
+    def _go_live(self, response_timeout, character_timeout):
+        ''' Spawns the game and fast-forwards it through the moves so far '''
+        logging.info('Leaving the trie after %d moves' % len(self.moves))
+        self.child = self.spawn(self.command)
+        for move in self.moves:
+            self.child.receive_response_json_dict(response_timeout,
+                                                  character_timeout)
+            self.child.sendline(move)
+
+    def receive_response_json_dict(self, response_timeout, character_timeout):
+        if self.child is None:
+            if self.node is not None:
+                self.replayed += 1
+                return self.trie.response(self.node)
+            self._go_live(response_timeout, character_timeout)
+        response = self.child.receive_response_json_dict(response_timeout,
+                                                         character_timeout)
+        self.live += 1
+        if self.node is None:
+            self.pending = response
+        return response
+
+    def accept(self):
+        ''' Stores the last response from the game, which the driver found
+            valid. Nothing after a response which was not accepted is
+            stored, as it has no node to hang from.
+        '''
+        response, self.pending = self.pending, None
+        if response is None:
+            return
+        if not self.moves:
+            self.node = self.trie.add_root(self.key, response)
+        elif self.parent is not None:
+            self.node = self.trie.add(self.parent, self.move, response)
+        # Other games may be writing the same trie, so the write lock is
+        # held for one response rather than for the rest of the game
+        self.trie.commit()
+
+    def sendline(self, move):
+        self.moves.append(move)
+        if self.child is not None:
+            self.child.sendline(move)
+        self.parent, self.move = self.node, move
+        self.node = self.trie.child(self.node, move)
+
+    def close(self):
+        if self.child is not None:
+            self.child.close()
+        logging.info('%d responses from the trie, %d from the game' %
+                     (self.replayed, self.live))
+        if self.close_trie:
+            self.trie.close()
+        else:
+            self.trie.commit()
+
+
+def trie_transport(filename, key, spawn=pexpect_spawn):
+    ''' A transport for GameSession which plays through the trie in the
+        given file. The trie is opened by the thread playing the game.
+    '''
+    return lambda command: TrieChild(ResponseTrie(filename), key, command,
+                                     spawn, close_trie=True)
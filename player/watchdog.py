@@ -0,0 +1,105 @@
+''' A watchdog for the game driver, which notices when a player is stuck.
+
+    A player is stuck when it goes over the turn or wall clock budget for a
+    game, or when its last few (room, move) pairs keep repeating the same
+    cycle. For every cycle length up to max_period the watchdog keeps the
+    number of turns in a row which matched the turn one cycle earlier, so
+    each turn costs one comparison per cycle length.
+
+    >>> watchdog = Watchdog(max_turns=100, repeats=3)
+    >>> moves = [('A', '(go north)'), ('B', '(go south)')] * 3
+    >>> [watchdog.check(room, move) for room, move in moves]
+    [None, None, None, None, None, ('cycle', 'period 2 repeated 3 times')]
+    >>> watchdog.events
+    [(6, 'cycle', 'period 2 repeated 3 times')]
+
+    After a player is given a hint it has a grace period to get itself out,
+    after which the watchdog stops the game:
+
+    >>> watchdog = Watchdog(max_turns=2, grace=1)
+    >>> [watchdog.check('A', '(go %s)' % d) for d in ['up', 'down', 'east']]
+    [None, None, ('turns', 'more than 2 turns')]
+    >>> watchdog.hinted()
+    >>> [watchdog.check('B', '(go %s)' % d) for d in ['west', 'north']]
+    [None, ('grace', 'still stuck 1 turns after a hint')]
+'''
+import time
+import logging
+from collections import deque
+
+__all__ = ['Watchdog']
+
+
+class Watchdog(object):
+    ''' Checks every turn of a game against its budgets. Budgets which are
+        None are not enforced.
+    '''
+
+    def __init__(self, max_turns=None, max_seconds=None, repeats=4,
+                 max_period=32, grace=50):
+        self.max_turns = max_turns
+        self.max_seconds = max_seconds
+        self.repeats = repeats     # Times a cycle must repeat to be a loop
+        self.max_period = max_period
+        self.grace = grace         # Turns a player gets after a hint
+        self.events = []           # (turn, kind, detail) of each trigger
+
+        self._started = time.time()
+        self._turn = 0
+        self._history = deque(maxlen=max_period + 1)
+        self._matched = [0] * (max_period + 1) # Indexed by cycle length
+        self._grace_ends = None    # Turn after which a hinted player stops
+        self._budget_spent = False # Budgets only trigger once
+
+    def check(self, room, move):
+        ''' Records a turn in which the player was in room and chose move.
+            Returns a (kind, detail) pair if the player looks stuck, or None.
+        '''
+        self._turn += 1
+        event = None
+        if self._grace_ends is not None and self._turn > self._grace_ends:
+            event = ('grace', 'still stuck %d turns after a hint' %
+                     self.grace)
+        elif not self._budget_spent and self.max_turns is not None and \
+                self._turn > self.max_turns:
+            self._budget_spent = True
+            event = ('turns', 'more than %d turns' % self.max_turns)
+        elif not self._budget_spent and self.max_seconds is not None and \
+                time.time() - self._started > self.max_seconds:
+            self._budget_spent = True
+            event = ('time', 'more than %s seconds' % self.max_seconds)
+        else:
+            event = self._check_cycle((room, move))
+
+        if event:
+            self.events.append((self._turn,) + event)
+            logging.info('WATCHDOG: %s, %s at turn %d' %
+                         (event[0], event[1], self._turn))
+        return event
+
+    def _check_cycle(self, key):
+        history, matched = self._history, self._matched
+        history.append(key)
+        length = len(history)
+        for period in xrange(1, length):
+            if history[-1 - period] == key:
+                matched[period] += 1
+                if matched[period] >= period * (self.repeats - 1):
+                    self._reset_cycles()
+                    return ('cycle', 'period %d repeated %d times' %
+                            (period, self.repeats))
+            else:
+                matched[period] = 0
+        return None
+
+    def _reset_cycles(self):
+        self._history.clear()
+        self._matched = [0] * (self.max_period + 1)
+
+    def hinted(self):
+        ''' Tells the watchdog that the player took a hint. If the player is
+            still playing once the grace period is over, the watchdog
+            triggers again.
+        '''
+        if self._grace_ends is None:
+            self._grace_ends = self._turn + self.grace
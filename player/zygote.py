@@ -0,0 +1,141 @@
+''' A zygote for the game driver: one warmed up process which forks a ready
+    driver for every game it is asked to play.
+
+    The zygote imports the driver, compiles the grammars and then waits on
+    a local socket. Each request is the list of game_player.py options for
+    one game. The zygote forks, the child plays the game as game_player.py
+    would and replies with the game's results row, and the zygote goes
+    back to waiting. Starting a game costs a fork, as the child shares the
+    zygote's modules and grammars copy-on-write. On Pythons which have
+    gc.freeze, everything the zygote built is moved out of the garbage
+    collector's reach first, so collections in the children do not touch
+    (and copy) those pages.
+
+    Requests and replies are a line of JSON each:
+
+    >>> import socket
+    >>> ours, theirs = socket.socketpair()
+    >>> send_message(ours, {'args' : ['-t', 'castle.txt']})
+    >>> receive_message(theirs.makefile('r'))
+    {u'args': [u'-t', u'castle.txt']}
+'''
+import os
+import gc
+import json
+import errno
+import socket
+import select
+import logging
+import traceback
+
+from results import ResultStore
+from session import GameSession, make_parser, setup_logging
+
+__all__ = ['serve', 'play', 'send_message', 'receive_message']
+
+
+def send_message(sock, message):
+    sock.sendall(json.dumps(message) + '\n')
+
+
+def receive_message(sock_file):
+    ''' Reads one message, or returns None if the other end hung up '''
+    line = sock_file.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def warm(validator):
+    ''' Builds everything the children will share: every grammar, then
+        freezes the heap where the garbage collector allows it
+    '''
+    if validator is not None:
+        for version in validator.GRAMMARS:
+            validator.grammar_for(version)
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+
+def _reap():
+    ''' Collects the exit status of finished children, without waiting '''
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except OSError, error:
+            if error.errno == errno.ECHILD:
+                return
+            raise
+        if not pid:
+            return
+
+
+def _play_child(connection, validator):
+    ''' Runs in the forked child: plays the requested game, replies and
+        exits without returning to the zygote's loop
+    '''
+    status = 1
+    try:
+        request = receive_message(connection.makefile('r'))
+        options, _ = make_parser().parse_args(request['args'])
+        setup_logging(options)
+        session = GameSession(options, validator=validator)
+        session.run()
+        if options.results:
+            store = ResultStore(options.results)
+            store.record_game(session.game,
+                              options.record_turns and session.turns or None)
+            store.close()
+        status = int(session.player.outcome == 'invalid')
+        send_message(connection, {'status' : status, 'game' : session.game})
+    except Exception:
+        try:
+            send_message(connection, {'status' : status,
+                                      'error' : traceback.format_exc()})
+        except socket.error:
+            pass
+    finally:
+        os._exit(status)
+
+
+def serve(path, validator=None):
+    ''' Warms up, then forks a driver for every connection to the unix
+        socket at path. Runs until interrupted.
+    '''
+    warm(validator)
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(64)
+    logging.info('Zygote %d listening on %s' % (os.getpid(), path))
+    try:
+        while True:
+            readable, _, _ = select.select([listener], [], [], 1.0)
+            _reap()
+            if not readable:
+                continue
+            connection, _ = listener.accept()
+            if os.fork() == 0:
+                listener.close()
+                _play_child(connection, validator)
+            connection.close()
+    finally:
+        listener.close()
+        os.unlink(path)
+
+
+def play(path, args):
+    ''' Asks the zygote at path to play a game with the given game_player.py
+        options. Waits for the game and returns the reply: a dict with the
+        child's exit status, and the game's results row or an error.
+    '''
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(path)
+    try:
+        send_message(connection, {'args' : list(args)})
+        reply = receive_message(connection.makefile('r'))
+    finally:
+        connection.close()
+    return reply or {'status' : 1, 'error' : 'zygote child hung up'}
@@ -1,36 +1,120 @@
 ''' Module which handles the validation for our project.
     This file defines a method which takes in a string of
     a response from the game program, and will check it against
-    the grammar file saved in this directory
+    the grammar file saved in this directory for the game's version.
+
+    Grammars are compiled the first time a response for their version is
+    validated, so only the grammar the game actually speaks is ever built.
+    Compiled grammars are cached in CACHE_DIR (see cache.py), so after the
+    first time they are loaded rather than compiled.
 '''
+import logging
 from os import path
+from re import compile
 
 from pymeta.grammar import OMeta
 from pymeta.runtime import ParseError
 
+import translate
 from translate import convert_lines
+from cache import GrammarCache
+
+__all__ = ['validate', 'version_from_banner', 'grammar_for', 'GRAMMARS',
+           'DEFAULT_VERSION']
+
+_HERE = path.dirname(path.abspath(__file__))
+
+# The BNF grammar file for each version of the game protocol. The game
+# announces its version on the first line it prints, e.g. "Version 8"
+GRAMMARS = {'0' : path.join(_HERE, "./bnf_0.txt"),
+            '8' : path.join(_HERE, "./bnf_10.txt")}
 
-__all__ = ['validate']
+# The version to use when the game does not say, or says one we don't know
+DEFAULT_VERSION = '8'
 
-# The file which will contain the bnf grammar for the game responses
-BNF_FILE = path.join(path.dirname(path.abspath(__file__)), "./bnf_10.txt")
 # The file which contains some base grammar definitions for JSON
-JSON_GRAMMAR_FILE = path.join(path.dirname(path.abspath(__file__)), "./json_base.grm")
+JSON_GRAMMAR_FILE = path.join(_HERE, "./json_base.grm")
+
+# Whether grammars are run through pymeta's optimizer before being compiled
+OPTIMIZE = True
+
+# Where compiled grammars are cached, or None to always compile them
+CACHE_DIR = path.join(_HERE, "cache")
 
 # The name of the production which all messages extend from in the grammar
 TOP_PRODUCTION = "msg"
 
-# Convert the BNF into pymeta, then add the JSON base to it
-_grammar = "\n\n".join(convert_lines(open(BNF_FILE)))
-_grammar += "\n\n" + "".join(open(JSON_GRAMMAR_FILE))
+# How the game announces its version
+_VERSION_LINE = compile(r"\s*Version\s+(\S+)")
+
+# Compiled parsers, by version
+_parsers = {}
+
+def version_from_banner(banner):
+    ''' Returns the version announced in the first line the game prints, or
+        None if it does not announce one.
+
+        >>> version_from_banner("Version 8")
+        '8'
+        >>> version_from_banner("Version Test | Castle one_room.txt")
+        'Test'
+        >>> version_from_banner('{ "location" : "in the moat" }') is None
+        True
+    '''
+    match = _VERSION_LINE.match(banner)
+    return match and match.group(1) or None
+
+def grammar_for(version=None):
+    ''' Returns the parser class for the given version, compiling it if this
+        is the first time it is needed. Unknown versions get the grammar of
+        DEFAULT_VERSION.
+    '''
+    parser = _parsers.get(version)
+    if parser is None:
+        if version in GRAMMARS:
+            bnf = open(GRAMMARS[version]).read()
+            json_base = open(JSON_GRAMMAR_FILE).read()
+
+            # Load the parser from the cache if it was made from the same
+            # grammar, by the same translation
+            cache, name, key = None, "version-%s" % version, None
+            if CACHE_DIR:
+                cache = GrammarCache(CACHE_DIR)
+                translation = open(translate.__file__.replace(".pyc", ".py"))
+                key = cache.key(bnf + json_base + translation.read() +
+                                str(OPTIMIZE))
+                parser = cache.load(name, key, OMeta, {})
+
+            if parser is None:
+                # Convert the BNF into pymeta, then add the JSON base to it
+                grammar = "\n\n".join(convert_lines(bnf.splitlines(True)))
+                grammar += "\n\n" + json_base
+
+                # Make the parser from it
+                parser = OMeta.makeGrammar(grammar, {}, optimize=OPTIMIZE)
+                if cache:
+                    cache.store(name, key, parser)
+        else:
+            if version is not None:
+                logging.warn("No grammar for version %s, using version %s" %
+                             (version, DEFAULT_VERSION))
+            parser = grammar_for(DEFAULT_VERSION)
+        _parsers[version] = parser
+    return parser
 
-# Make the parser from it
-_parser  = OMeta.makeGrammar(_grammar, {})
+def validate(response, production=TOP_PRODUCTION, version=None):
+    ''' Trys to validate the given response with the grammar for the given
+        version of the game. Returns true if the response is valid in the
+        grammar, and false if it is not
 
-def validate(response, production=TOP_PRODUCTION):
-    ''' Trys to validate the given response with the loaded grammar.
-        Returns true if the response is valid in the grammar
+        >>> validate('{ "location" : "in the moat" }')
+        True
+        >>> validate('{ "location" : "in the moat" , }')
+        False
     '''
-    application = _parser(response)
-    application.apply(production)
+    application = grammar_for(version)(response)
+    try:
+        application.apply(production)
+    except ParseError:
+        return False
     return True
@@ -0,0 +1,104 @@
+''' An on-disk cache of compiled grammars.
+
+    Making a parser from a BNF file means converting it, parsing the result
+    with the OMeta metagrammar and generating and compiling Python code for
+    it. The generated code only depends on the grammar text, pymeta itself
+    and the Python version, so it is kept in a cache directory under a hash
+    of all of those, and later processes load it from there instead.
+
+    Entries are written to a temporary file and renamed into place, so a
+    process never reads a half written entry. When a grammar or pymeta
+    changes, its hash does and the old entry is no longer used; it is
+    removed when the new one is written.
+'''
+import os
+import sys
+import imp
+import glob
+import logging
+import marshal
+import tempfile
+from hashlib import sha1
+from os import path
+
+import pymeta
+from pymeta.builder import loadGrammar, grammarFilename
+
+__all__ = ['GrammarCache']
+
+# Every pymeta module is hashed, as much of it affects the generated
+# grammars: the frozen metagrammar parses them, and the builder, optimizer
+# and runtime shape the code made for them
+_PYMETA_DIR = path.dirname(path.abspath(pymeta.__file__))
+
+_pymeta_hash = None
+
+def _pymeta_digest():
+    ''' A hash of the pymeta source and the Python bytecode version '''
+    global _pymeta_hash
+    if _pymeta_hash is None:
+        digest = sha1(imp.get_magic())
+        for filename in sorted(glob.glob(path.join(_PYMETA_DIR, '*.py'))):
+            digest.update(path.basename(filename))
+            digest.update(open(filename, 'rb').read())
+        _pymeta_hash = digest.digest()
+    return _pymeta_hash
+
+
+class GrammarCache(object):
+    ''' Compiled grammars in a directory, one file per grammar name '''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def key(self, grammar):
+        ''' The hash a grammar's entry is stored under '''
+        return sha1(_pymeta_digest() + grammar).hexdigest()
+
+    def _filename(self, name, key):
+        return path.join(self.directory, '%s-%s.grammar' % (name, key))
+
+    def load(self, name, key, superclass, globals):
+        ''' Returns the cached grammar class, or None if there is none '''
+        try:
+            data = open(self._filename(name, key), 'rb').read()
+        except IOError:
+            return None
+        try:
+            entry = marshal.loads(data)
+            return loadGrammar(entry['class'], entry['source'], superclass,
+                               globals, entry['unmemoized'],
+                               entry['recursive'], entry['code'])
+        except (EOFError, ValueError, TypeError, KeyError), error:
+            logging.warn('Ignoring bad cached grammar %s: %s' % (name, error))
+            return None
+
+    def store(self, name, key, grammarClass):
+        ''' Caches a grammar class made by OMeta.makeGrammar, replacing any
+            entries for older versions of it. Failing to write the cache is
+            not an error.
+        '''
+        module = sys.modules[grammarClass.__module__]
+        source = module.__loader__.get_source(module.__name__)
+        entry = {'class' : grammarClass.__name__,
+                 'source' : source,
+                 'code' : compile(source,
+                                  grammarFilename(grammarClass.__name__),
+                                  'exec'),
+                 'unmemoized' : sorted(grammarClass.unmemoized),
+                 'recursive' : sorted(grammarClass.recursiveRules)}
+        filename = self._filename(name, key)
+        try:
+            if not path.isdir(self.directory):
+                os.makedirs(self.directory)
+            handle, temporary = tempfile.mkstemp(dir=self.directory,
+                                                 prefix='.%s-' % name)
+            with os.fdopen(handle, 'wb') as temporary_file:
+                marshal.dump(entry, temporary_file)
+            os.chmod(temporary, 0644)
+            os.rename(temporary, filename)
+            for old in glob.glob(self._filename(name, '*')):
+                if old != filename:
+                    os.unlink(old)
+        except (IOError, OSError), error:
+            logging.debug('Could not cache grammar %s: %s' % (name, error))
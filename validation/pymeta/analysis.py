@@ -0,0 +1,167 @@
+"""
+Deciding which rules of a grammar are worth memoizing.
+
+Memoizing a rule application costs a memo lookup and a record, which for
+a rule matching a character or two costs more than matching it again. So
+the rules of a grammar are classified when it is built:
+
+ - recursive rules (those which can end up applying themselves) are always
+   memoized, as left recursion is detected through the memo;
+ - cheap rules, which neither backtrack nor repeat and only apply cheap
+   rules, are not memoized;
+ - rules applied in only one place, and not by a recursive rule, are only
+   re-entered at the same position when the rule applying them is, so are
+   not memoized either;
+ - every other rule is, as it may be tried again at the same position by
+   another alternative.
+
+The decision is kept on the grammar class, as the set of rule names it does
+not memoize (C{unmemoized}), which can be replaced per grammar. Profile
+data from parsing sample inputs with every rule memoized can refine it:
+rules whose records are rarely reused are not worth memoizing either.
+"""
+
+def recursiveRules(calls):
+    """
+    The rules which can apply themselves, directly or through others.
+
+    @param calls: A dict of rule name to the names of the rules it applies.
+    """
+    recursive = set()
+    for rule in calls:
+        seen = set()
+        stack = list(calls[rule])
+        while stack:
+            callee = stack.pop()
+            if callee == rule:
+                recursive.add(rule)
+                break
+            if callee not in seen:
+                seen.add(callee)
+                stack.extend(calls.get(callee, ()))
+    return recursive
+
+
+def cheapRules(calls, complex, inheritedCheap):
+    """
+    The rules which neither backtrack nor repeat, and only apply cheap
+    rules.
+
+    @param calls: A dict of rule name to the names of the rules it applies.
+    @param complex: The names of the rules which alternate, repeat, look
+    ahead or match lists.
+    @param inheritedCheap: The names of the cheap rules this grammar
+    inherits.
+    """
+    cheap = set()
+    changed = True
+    while changed:
+        changed = False
+        for rule, callees in calls.iteritems():
+            if rule in cheap or rule in complex:
+                continue
+            for callee in callees:
+                if callee in calls:
+                    if callee not in cheap:
+                        break
+                elif callee not in inheritedCheap:
+                    break
+            else:
+                cheap.add(rule)
+                changed = True
+    return cheap
+
+
+def reenteredRules(calls, sites, recursive):
+    """
+    The rules which may be applied more than once at the same position:
+    those applied in more than one place, or by a recursive rule (which is
+    applied again as its left recursion grows).
+
+    @param calls: A dict of rule name to the names of the rules it applies.
+    @param sites: A dict of rule name to the number of places applying it.
+    @param recursive: The names of the recursive rules.
+    """
+    reentered = set(name for (name, count) in sites.iteritems() if count > 1)
+    for rule in recursive:
+        reentered.update(calls.get(rule, ()))
+    return reentered
+
+
+def classify(calls, complex, sites, inheritedUnmemoized, memoize=None):
+    """
+    Decide which rules of a grammar are not memoized. Returns the names of
+    the rules not memoized, and of the recursive rules.
+
+    @param calls: A dict of each rule of the grammar to the names of the
+    rules it applies.
+    @param complex: The names of the rules which alternate, repeat, look
+    ahead or match lists.
+    @param sites: A dict of rule name to the number of places applying it.
+    @param inheritedUnmemoized: The names of the rules the superclass does
+    not memoize.
+    @param memoize: True to memoize every rule, or names of rules to
+    memoize whatever their class. None to leave it to the analysis.
+    """
+    recursive = recursiveRules(calls)
+    if memoize is True:
+        return frozenset(), frozenset(recursive)
+    unmemoized = set(inheritedUnmemoized) - set(calls)
+    unmemoized |= cheapRules(calls, complex, inheritedUnmemoized)
+    unmemoized |= set(calls) - reenteredRules(calls, sites, recursive)
+    unmemoized -= recursive
+    if memoize:
+        unmemoized -= set(memoize)
+    return frozenset(unmemoized), frozenset(recursive)
+
+
+def profile(grammarClass, inputs, ruleName):
+    """
+    Parse sample inputs with every rule memoized, and count how often each
+    rule's memo records were made and reused. Returns a dict of rule name
+    to [fills, hits].
+
+    @param grammarClass: The grammar to profile.
+    @param inputs: Strings the grammar parses.
+    @param ruleName: The rule to parse them with.
+    """
+    counts = {}
+
+    class Profiled(grammarClass):
+        unmemoized = frozenset()
+
+        def _apply(self, rule, name, args):
+            if not args:
+                records, key = self._memoSlot(name)
+                count = counts.setdefault(name, [0, 0])
+                if records.get(key) is None:
+                    count[0] += 1
+                else:
+                    count[1] += 1
+            return grammarClass._apply(self, rule, name, args)
+
+    for input in inputs:
+        try:
+            Profiled(input).apply(ruleName)
+        except Exception:
+            pass
+    return counts
+
+
+def unmemoizedFromProfile(grammarClass, counts, minHitRate=0.1):
+    """
+    Refine a grammar's choice of rules not to memoize with profile data:
+    rules seen in the profile are memoized if at least minHitRate of their
+    applications were answered from the memo, or if they are recursive.
+    Rules not seen keep the choice made when the grammar was built.
+
+    @param grammarClass: The profiled grammar.
+    @param counts: The result of L{profile}.
+    @param minHitRate: The least reuse of records worth memoizing for.
+    """
+    unmemoized = set(grammarClass.unmemoized) - set(counts)
+    for name, (fills, hits) in counts.iteritems():
+        if (name not in grammarClass.recursiveRules and
+            hits < minHitRate * (fills + hits)):
+            unmemoized.add(name)
+    return frozenset(unmemoized)
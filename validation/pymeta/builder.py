@@ -1,8 +1,11 @@
 from types import ModuleType as module
 import itertools, linecache, sys
+from ast import literal_eval
 from types import FunctionType
 from compiler import ast, compile as python_compile
 from compiler.pycodegen import ExpressionCodeGenerator
+from runtime import ruleIds
+from analysis import classify
 
 class TreeBuilder(object):
     """
@@ -33,6 +36,9 @@ class TreeBuilder(object):
     def _or(self, exprs):
         return ["Or"] + exprs
 
+    def dispatch(self, exprs, starts):
+        return ["Or"] + exprs
+
     def _not(self, expr):
         return ["Not", expr]
 
@@ -289,16 +295,78 @@ class GeneratedCodeLoader(object):
     def get_source(self, name):
         return self.source
 
+def grammarFilename(name):
+    """
+    The file name the generated source of the named grammar is shown as.
+    """
+    return "/pymeta_generated_code/pymeta_grammar__%s.py" % (name,)
+
+
+def loadGrammar(name, source, superclass, globals, unmemoized, recursive,
+                code=None):
+    """
+    Make a grammar class from its generated source, as produced by
+    L{PythonBuilder}.
+
+    @param name: The name of the grammar class.
+    @param source: The Python source of the class.
+    @param superclass: The class it extends.
+    @param globals: A dict of names the grammar's expressions can use.
+    @param unmemoized: The names of the rules not to memoize.
+    @param recursive: The names of the recursive rules.
+    @param code: The source already compiled, if it was.
+    """
+    modname = "pymeta_grammar__"+name
+    filename = grammarFilename(name)
+    mod = module(modname)
+    mod.__dict__.update(globals)
+    mod.__name__ = modname
+    mod.__dict__[superclass.__name__] = superclass
+    mod.__loader__ = GeneratedCodeLoader(source)
+    if code is None:
+        code = compile(source, filename, "exec")
+    eval(code, mod.__dict__)
+    grammarClass = finishGrammar(mod.__dict__[name], globals, unmemoized,
+                                 recursive)
+    sys.modules[modname] = mod
+    linecache.getlines(filename, mod.__dict__)
+    return grammarClass
+
+
+def finishGrammar(grammarClass, globals, unmemoized, recursive):
+    """
+    Give a newly defined grammar class the names its expressions use, its
+    choice of rules to memoize and its rule ids.
+    """
+    grammarClass.globals = globals
+    grammarClass.unmemoized = frozenset(unmemoized)
+    grammarClass.recursiveRules = frozenset(recursive)
+    ruleIds(grammarClass)
+    return grammarClass
+
+
 class PythonBuilder(object):
     """
     Same idea as ASTBuilder but producing literal Python source instead.
     """
-    def __init__(self, name, grammar, superclass, globals):
+    def __init__(self, name, grammar, superclass, globals, memoize=None):
         self.name = name
         self.superclass = superclass
         self.gensymCounter = 0
         self.grammar = grammar
         self.globals = globals
+        self.memoize = memoize
+        self.calls = {}        # Rule name to the rules it applies
+        self.sites = {}        # Rule name to how many places apply it
+        self.complex = set()   # Rules which backtrack or repeat
+        self.constants = []    # Lines defining class attributes
+
+    def _complex(self):
+        """
+        Note that the rule being built backtracks or repeats, so is not
+        cheap to match again.
+        """
+        self.complex.add(getattr(self.grammar, 'name', None))
 
     def _gensym(self, name):
         """
@@ -371,22 +439,18 @@ class PythonBuilder(object):
             ["_locals = {'self': self}",
              "self.locals[%r] = _locals" % (name,)] + list(body)) + ['\n\n']
                                        for (name, body) in rules]))
+        if self.constants:
+            lines = self.constants + ['\n\n'] + lines
         source = '\n'.join(self._suite(
             "class %s(%s):" %(self.name, self.superclass.__name__),
             lines))
-        modname = "pymeta_grammar__"+self.name
-        filename = "/pymeta_generated_code/"+modname+".py"
-        mod = module(modname)
-        mod.__dict__.update(self.globals)
-        mod.__name__ = modname
-        mod.__dict__[self.superclass.__name__] = self.superclass
-        mod.__loader__ = GeneratedCodeLoader(source)
-        code = compile(source, filename, "exec")
-        eval(code, mod.__dict__)
-        mod.__dict__[self.name].globals = self.globals
-        sys.modules[modname] = mod
-        linecache.getlines(filename, mod.__dict__)
-        return mod.__dict__[self.name]
+        calls = dict((name, self.calls.get(name, set()))
+                     for (name, body) in rules)
+        unmemoized, recursive = classify(calls, self.complex, self.sites,
+                                         self.superclass.unmemoized,
+                                         self.memoize)
+        return loadGrammar(self.name, source, self.superclass, self.globals,
+                           unmemoized, recursive)
 
     def compilePythonExpr(self, name, expr):
         """
@@ -401,11 +465,29 @@ class PythonBuilder(object):
         """
         args = [self.compilePythonExpr(codeName, arg) for arg in exprs]
         if ruleName == 'super':
+            self._complex()
             return [self._expr('self.superApply("%s", %s)' % (codeName,
                                                               ', '.join(args)))]
+        self._applies(codeName, ruleName)
+        if ruleName == 'unordered' and len(exprs) == 2:
+            # The runtime applies the rules matched in any order
+            try:
+                members = literal_eval(exprs[1])
+            except (ValueError, SyntaxError):
+                members = ()
+            for member in members:
+                self._applies(codeName, member.rstrip('?'))
         return [self._expr('self.apply("%s", %s)' % (ruleName, ', '.join(args)))]
 
 
+    def _applies(self, codeName, ruleName):
+        """
+        Note that the rule being built applies another.
+        """
+        self.calls.setdefault(codeName, set()).add(ruleName)
+        self.sites[ruleName] = self.sites.get(ruleName, 0) + 1
+
+
     def exactly(self, literal):
         """
         Create a call to self.exactly(expr).
@@ -413,10 +495,18 @@ class PythonBuilder(object):
         return [self._expr('self.exactly(%r)' % (literal,))]
 
 
+    def tokens(self, toks):
+        """
+        Create a call to self.tokens(toks).
+        """
+        return [self._expr('self.tokens(%r)' % (tuple(toks),))]
+
+
     def many(self, expr):
         """
         Create a call to self.many(lambda: expr).
         """
+        self._complex()
         fn, fname = self._newThunkFor("many", expr)
         return self.sequence([fn, "self.many(%s)" %(fname,)])
 
@@ -425,6 +515,7 @@ class PythonBuilder(object):
         """
         Create a call to self.many((lambda: expr), expr).
         """
+        self._complex()
         fn, fname = self._newThunkFor("many", expr)
         return self.sequence([fn, self._expr("self.many(%s, %s())" %(fname, fname))])
 
@@ -441,16 +532,45 @@ class PythonBuilder(object):
         self._or([lambda: expr1, lambda: expr2, ... , lambda: exprN]).
         """
         if len(exprs) > 1:
+            self._complex()
             fs, fnames = zip(*[self._newThunkFor("_or", expr) for expr in exprs])
             return self.sequence(list(fs) + [self._expr("self._or([%s])" %(', '.join(fnames)))])
         else:
             return exprs[0]
 
 
+    def dispatch(self, exprs, starts):
+        """
+        Create a call to
+        self._dispatch(table, [lambda: expr1, lambda: expr2, ... ]), which
+        only tries the alternatives which can start with the next character
+        of the input which is not whitespace.
+
+        @param exprs: The alternatives.
+        @param starts: For each alternative, a string of the characters its
+        matches can start with after any whitespace, or None if they are
+        not known.
+        """
+        self._complex()
+        default = tuple([i for (i, start) in enumerate(starts)
+                         if start is None])
+        table = {}
+        for start in starts:
+            for c in start or ():
+                table[c] = tuple([i for (i, other) in enumerate(starts)
+                                  if other is None or c in other])
+        tname = self._gensym("dispatch")
+        self.constants.append("%s = (%r, %r)" % (tname, table, default))
+        fs, fnames = zip(*[self._newThunkFor("_or", expr) for expr in exprs])
+        return self.sequence(list(fs) + [self._expr(
+            "self._dispatch(self.%s, [%s])" % (tname, ', '.join(fnames)))])
+
+
     def _not(self, expr):
         """
         Create a call to self._not(lambda: expr).
         """
+        self._complex()
         fn, fname = self._newThunkFor("_not", expr)
         return self.sequence([fn, self._expr("self._not(%s)" %(fname))])
 
@@ -459,6 +579,7 @@ class PythonBuilder(object):
         """
         Create a call to self.lookahead(lambda: expr).
         """
+        self._complex()
         fn, fname = self._newThunkFor("lookahead", expr)
         return self.sequence([fn, self._expr("self.lookahead(%s)" %(fname))])
 
@@ -505,5 +626,6 @@ class PythonBuilder(object):
         """
         Generate a call to self.listpattern(lambda: expr).
         """
+        self._complex()
         fn, fname = self._newThunkFor("listpattern", expr)
         return self.sequence([fn, self._expr("self.listpattern(%s)" %(fname))])
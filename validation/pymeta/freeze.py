@@ -0,0 +1,101 @@
+"""
+Generate L{pymeta.metagrammar}: the classes for the grammars pymeta itself
+is made of (the OMeta metagrammar and the null optimizer), ahead of time,
+so that importing pymeta does not compile them.
+
+Run C{python -m pymeta.freeze} after changing either grammar in
+L{pymeta.grammar}, or the code generation in L{pymeta.builder}. With
+C{--check}, it only reports whether the generated module is up to date.
+"""
+import os, sys
+from hashlib import sha1
+from optparse import OptionParser
+
+from pymeta.boot import BootOMetaGrammar
+from pymeta.builder import PythonBuilder
+
+FROZEN_MODULE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "metagrammar.py")
+
+HEADER = '''"""
+The classes for the grammars pymeta itself is made of: the OMeta metagrammar
+and the null optimizer, generated ahead of time from the grammars in
+L{pymeta.grammar} so that importing pymeta does not compile them.
+
+Generated by C{python -m pymeta.freeze}; do not edit.
+"""
+'''
+
+
+def grammarHash(grammar):
+    """
+    The hash of a grammar's text, which the generated module records to
+    tell whether it is still up to date.
+    """
+    return sha1(grammar).hexdigest()
+
+
+def _frozenGrammar(constant, function, grammar, grammarClass):
+    """
+    The lines of the generated module for one grammar: a function making
+    its class from the OMeta class, and a constant with the grammar's hash,
+    that function and its choice of rules to memoize.
+    """
+    module = sys.modules[grammarClass.__module__]
+    source = module.__loader__.get_source(module.__name__)
+    lines = ["", "", "def %s(OMeta):" % (function,)]
+    lines.extend([line and "    " + line for line in source.split("\n")])
+    lines.append("    return %s" % (grammarClass.__name__,))
+    lines.append("")
+    lines.append("%s = (%r, %s,\n    %r,\n    %r)" % (
+        constant, grammarHash(grammar), function,
+        sorted(grammarClass.unmemoized), sorted(grammarClass.recursiveRules)))
+    return lines
+
+
+def generate():
+    """
+    Compile the metagrammar with the bootstrap grammar, and the null
+    optimizer with the metagrammar, and return the source of the module
+    holding both.
+    """
+    from pymeta import grammar
+    metagrammar = BootOMetaGrammar(grammar.ometaGrammar).parseGrammar(
+        "Grammar", PythonBuilder, grammar.OMeta, {})
+    lines = _frozenGrammar("OMETA_GRAMMAR", "makeOMetaGrammar",
+                           grammar.ometaGrammar, metagrammar)
+    optimizer = grammar.OMetaGrammar(
+        grammar.nullOptimizationGrammar).parseGrammar(
+        "Grammar", PythonBuilder, grammar.OMeta, {})
+    lines += _frozenGrammar("NULL_OPTIMIZER", "makeNullOptimizer",
+                            grammar.nullOptimizationGrammar, optimizer)
+    return HEADER + "\n".join(lines) + "\n"
+
+
+def main(argv):
+    parser = OptionParser(usage="%prog [--check]")
+    parser.add_option("--check", dest="check", action="store_true",
+                      default=False, help="Only check that %s is up to date"
+                      % (os.path.basename(FROZEN_MODULE),))
+    options, args = parser.parse_args(argv)
+    source = generate()
+    try:
+        current = open(FROZEN_MODULE).read()
+    except IOError:
+        current = None
+    if options.check:
+        if source != current:
+            print "%s is out of date" % (FROZEN_MODULE,)
+            return 1
+        print "%s is up to date" % (FROZEN_MODULE,)
+        return 0
+    if source != current:
+        temporary = FROZEN_MODULE + ".tmp"
+        open(temporary, "w").write(source)
+        os.rename(temporary, FROZEN_MODULE)
+        print "Wrote %s" % (FROZEN_MODULE,)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
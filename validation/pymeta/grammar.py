@@ -3,16 +3,23 @@ Public interface to OMeta, as well as the grammars used to compile grammar
 definitions.
 """
 import sys, string
-from builder import PythonBuilder
+from hashlib import sha1
+from builder import TreeBuilder, PythonBuilder, finishGrammar
 from boot import BootOMetaGrammar
+import optimizer
 from runtime import OMetaBase, ParseError
+try:
+    import metagrammar as frozen
+except ImportError:
+    frozen = None
 
 class OMeta(OMetaBase):
     """
     Base class for grammar definitions.
     """
     metagrammarClass = BootOMetaGrammar
-    def makeGrammar(cls, grammar, globals, name="Grammar"):
+    def makeGrammar(cls, grammar, globals, name="Grammar", memoize=None,
+                    optimize=False):
         """
         Define a new subclass with the rules in the given grammar.
 
@@ -20,11 +27,47 @@ class OMeta(OMetaBase):
         @param globals: A dict of names that should be accessible by this
         grammar.
         @param name: The name of the class to be generated.
+        @param memoize: True to memoize every rule, or the names of rules to
+        memoize even if they are cheap. By default only the rules which are
+        not cheap to match again are memoized.
+        @param optimize: Whether to run the grammar through
+        L{pymeta.optimizer} before generating its code.
         """
         g = cls.metagrammarClass(grammar)
-        return g.parseGrammar(name, PythonBuilder, cls, globals)
+        if optimize:
+            tree = optimizer.optimize(g.parseGrammar(name, TreeBuilder),
+                                      cls.builtinRules())
+            return optimizer.build(tree, PythonBuilder(name, None, cls,
+                                                       globals, memoize))
+        return g.parseGrammar(name, PythonBuilder, cls, globals, memoize)
     makeGrammar = classmethod(makeGrammar)
 
+    def builtinRules(cls):
+        """
+        The names of the built-in rules of L{OMetaBase} this grammar has not
+        redefined.
+        """
+        return [name[len("rule_"):] for name in dir(OMetaBase)
+                if name.startswith("rule_") and getattr(cls, name).im_func
+                is getattr(OMetaBase, name).im_func]
+    builtinRules = classmethod(builtinRules)
+
+def _grammarClass(frozenGrammar, grammar, globals):
+    """
+    The class for one of pymeta's own grammars: the one generated ahead of
+    time in L{pymeta.metagrammar} if it was generated from this grammar,
+    or else one compiled now.
+
+    @param frozenGrammar: The name of its entry in L{pymeta.metagrammar}.
+    @param grammar: The grammar.
+    @param globals: A dict of names that should be accessible by it.
+    """
+    entry = getattr(frozen, frozenGrammar, None)
+    if entry is not None and entry[0] == sha1(grammar).hexdigest():
+        grammarHash, makeClass, unmemoized, recursive = entry
+        return finishGrammar(makeClass(OMeta), globals, unmemoized, recursive)
+    return OMeta.makeGrammar(grammar, globals)
+
 ometaGrammar = r"""
 number ::= <spaces> ('-' <barenumber>:x => self.builder.exactly(-x)
                     |<barenumber>:x => self.builder.exactly(x))
@@ -103,7 +146,7 @@ grammar ::= <rule>*:rs <spaces> => self.builder.makeGrammar(rs)
 """
 #don't be confused, emacs
 
-class OMetaGrammar(OMeta.makeGrammar(ometaGrammar, globals())):
+class OMetaGrammar(_grammarClass("OMETA_GRAMMAR", ometaGrammar, globals())):
     """
     The base grammar for parsing grammar definitions.
     """
@@ -200,4 +243,4 @@ rulePair ::= [:name <opt>:rule] => (name, rule)
 
 """
 
-NullOptimizer = OMeta.makeGrammar(nullOptimizationGrammar, {})
+NullOptimizer = _grammarClass("NULL_OPTIMIZER", nullOptimizationGrammar, {})
@@ -0,0 +1,525 @@
+"""
+The classes for the grammars pymeta itself is made of: the OMeta metagrammar
+and the null optimizer, generated ahead of time from the grammars in
+L{pymeta.grammar} so that importing pymeta does not compile them.
+
+Generated by C{python -m pymeta.freeze}; do not edit.
+"""
+
+
+def makeOMetaGrammar(OMeta):
+    class Grammar(OMeta):
+        def rule_number(self):
+            _locals = {'self': self}
+            self.locals['number'] = _locals
+            self.apply("spaces", )
+            def _G__or_1():
+                self.exactly('-')
+                _locals['x'] = self.apply("barenumber", )
+                _locals['x']
+                return eval('self.builder.exactly(-x)', self.globals, _locals)
+            def _G__or_2():
+                _locals['x'] = self.apply("barenumber", )
+                _locals['x']
+                return eval('self.builder.exactly(x)', self.globals, _locals)
+            return self._or([_G__or_1, _G__or_2])
+
+
+        def rule_barenumber(self):
+            _locals = {'self': self}
+            self.locals['barenumber'] = _locals
+            def _G__or_10():
+                self.exactly('0')
+                def _G__or_7():
+                    def _G__or_3():
+                        return self.exactly('x')
+                    def _G__or_4():
+                        return self.exactly('X')
+                    self._or([_G__or_3, _G__or_4])
+                    def _G_many_5():
+                        return self.apply("hexdigit", )
+                    _locals['hs'] = self.many(_G_many_5)
+                    _locals['hs']
+                    return eval("int(''.join(hs), 16)", self.globals, _locals)
+                def _G__or_8():
+                    def _G_many_6():
+                        return self.apply("octaldigit", )
+                    _locals['ds'] = self.many(_G_many_6)
+                    _locals['ds']
+                    return eval("int('0'+''.join(ds), 8)", self.globals, _locals)
+                return self._or([_G__or_7, _G__or_8])
+            def _G__or_11():
+                def _G_many_9():
+                    return self.apply("digit", )
+                _locals['ds'] = self.many(_G_many_9, _G_many_9())
+                _locals['ds']
+                return eval("int(''.join(ds))", self.globals, _locals)
+            return self._or([_G__or_10, _G__or_11])
+
+
+        def rule_octaldigit(self):
+            _locals = {'self': self}
+            self.locals['octaldigit'] = _locals
+            _locals['x'] = self.apply("anything", )
+            _locals['x']
+            def _G_pred_12():
+                return eval('x in string.octdigits', self.globals, _locals)
+            self.pred(_G_pred_12)
+            return eval('x', self.globals, _locals)
+
+
+        def rule_hexdigit(self):
+            _locals = {'self': self}
+            self.locals['hexdigit'] = _locals
+            _locals['x'] = self.apply("anything", )
+            _locals['x']
+            def _G_pred_13():
+                return eval('x in string.hexdigits', self.globals, _locals)
+            self.pred(_G_pred_13)
+            return eval('x', self.globals, _locals)
+
+
+        def rule_escapedChar(self):
+            _locals = {'self': self}
+            self.locals['escapedChar'] = _locals
+            self.exactly('\\')
+            def _G__or_14():
+                self.exactly('n')
+                return eval('"\\n"', self.globals, _locals)
+            def _G__or_15():
+                self.exactly('r')
+                return eval('"\\r"', self.globals, _locals)
+            def _G__or_16():
+                self.exactly('t')
+                return eval('"\\t"', self.globals, _locals)
+            def _G__or_17():
+                self.exactly('b')
+                return eval('"\\b"', self.globals, _locals)
+            def _G__or_18():
+                self.exactly('f')
+                return eval('"\\f"', self.globals, _locals)
+            def _G__or_19():
+                self.exactly('"')
+                return eval('\'"\'', self.globals, _locals)
+            def _G__or_20():
+                self.exactly("'")
+                return eval('"\'"', self.globals, _locals)
+            def _G__or_21():
+                self.exactly('\\')
+                return eval('"\\\\"', self.globals, _locals)
+            return self._or([_G__or_14, _G__or_15, _G__or_16, _G__or_17, _G__or_18, _G__or_19, _G__or_20, _G__or_21])
+
+
+        def rule_character(self):
+            _locals = {'self': self}
+            self.locals['character'] = _locals
+            self.apply("token", eval('"\'"', self.globals, _locals))
+            def _G__or_22():
+                return self.apply("escapedChar", )
+            def _G__or_23():
+                return self.apply("anything", )
+            _locals['c'] = self._or([_G__or_22, _G__or_23])
+            _locals['c']
+            self.apply("token", eval('"\'"', self.globals, _locals))
+            return eval('self.builder.exactly(c)', self.globals, _locals)
+
+
+        def rule_string(self):
+            _locals = {'self': self}
+            self.locals['string'] = _locals
+            self.apply("token", eval('\'"\'', self.globals, _locals))
+            def _G_many_27():
+                def _G__or_25():
+                    return self.apply("escapedChar", )
+                def _G__or_26():
+                    def _G__not_24():
+                        return self.exactly('"')
+                    self._not(_G__not_24)
+                    return self.apply("anything", )
+                return self._or([_G__or_25, _G__or_26])
+            _locals['c'] = self.many(_G_many_27)
+            _locals['c']
+            self.apply("token", eval('\'"\'', self.globals, _locals))
+            return eval("self.builder.exactly(''.join(c))", self.globals, _locals)
+
+
+        def rule_name(self):
+            _locals = {'self': self}
+            self.locals['name'] = _locals
+            _locals['x'] = self.apply("letter", )
+            _locals['x']
+            def _G_many_28():
+                return self.apply("letterOrDigit", )
+            _locals['xs'] = self.many(_G_many_28)
+            _locals['xs']
+            eval('xs.insert(0, x)', self.globals, _locals)
+            return eval("''.join(xs)", self.globals, _locals)
+
+
+        def rule_application(self):
+            _locals = {'self': self}
+            self.locals['application'] = _locals
+            self.apply("token", eval("'<'", self.globals, _locals))
+            self.apply("spaces", )
+            _locals['name'] = self.apply("name", )
+            _locals['name']
+            def _G__or_29():
+                self.exactly(' ')
+                _locals['args'] = eval('self.applicationArgs()', self.globals, _locals)
+                _locals['args']
+                return eval('self.builder.apply(name, self.name, *args)', self.globals, _locals)
+            def _G__or_30():
+                self.apply("token", eval("'>'", self.globals, _locals))
+                return eval('self.builder.apply(name, self.name)', self.globals, _locals)
+            return self._or([_G__or_29, _G__or_30])
+
+
+        def rule_expr1(self):
+            _locals = {'self': self}
+            self.locals['expr1'] = _locals
+            def _G__or_31():
+                return self.apply("application", )
+            def _G__or_32():
+                return self.apply("ruleValue", )
+            def _G__or_33():
+                return self.apply("semanticPredicate", )
+            def _G__or_34():
+                return self.apply("semanticAction", )
+            def _G__or_35():
+                return self.apply("number", )
+            def _G__or_36():
+                return self.apply("character", )
+            def _G__or_37():
+                return self.apply("string", )
+            def _G__or_38():
+                self.apply("token", eval("'('", self.globals, _locals))
+                _locals['e'] = self.apply("expr", )
+                _locals['e']
+                self.apply("token", eval("')'", self.globals, _locals))
+                return eval('e', self.globals, _locals)
+            def _G__or_39():
+                self.apply("token", eval("'['", self.globals, _locals))
+                _locals['e'] = self.apply("expr", )
+                _locals['e']
+                self.apply("token", eval("']'", self.globals, _locals))
+                return eval('self.builder.listpattern(e)', self.globals, _locals)
+            return self._or([_G__or_31, _G__or_32, _G__or_33, _G__or_34, _G__or_35, _G__or_36, _G__or_37, _G__or_38, _G__or_39])
+
+
+        def rule_expr2(self):
+            _locals = {'self': self}
+            self.locals['expr2'] = _locals
+            def _G__or_42():
+                self.apply("token", eval("'~'", self.globals, _locals))
+                def _G__or_40():
+                    self.apply("token", eval("'~'", self.globals, _locals))
+                    _locals['e'] = self.apply("expr2", )
+                    _locals['e']
+                    return eval('self.builder.lookahead(e)', self.globals, _locals)
+                def _G__or_41():
+                    _locals['e'] = self.apply("expr2", )
+                    _locals['e']
+                    return eval('self.builder._not(e)', self.globals, _locals)
+                return self._or([_G__or_40, _G__or_41])
+            def _G__or_43():
+                return self.apply("expr1", )
+            return self._or([_G__or_42, _G__or_43])
+
+
+        def rule_expr3(self):
+            _locals = {'self': self}
+            self.locals['expr3'] = _locals
+            def _G__or_50():
+                _locals['e'] = self.apply("expr2", )
+                _locals['e']
+                def _G__or_44():
+                    self.exactly('*')
+                    return eval('self.builder.many(e)', self.globals, _locals)
+                def _G__or_45():
+                    self.exactly('+')
+                    return eval('self.builder.many1(e)', self.globals, _locals)
+                def _G__or_46():
+                    self.exactly('?')
+                    return eval('self.builder.optional(e)', self.globals, _locals)
+                def _G__or_47():
+                    return eval('e', self.globals, _locals)
+                _locals['r'] = self._or([_G__or_44, _G__or_45, _G__or_46, _G__or_47])
+                _locals['r']
+                def _G__or_48():
+                    self.exactly(':')
+                    _locals['n'] = self.apply("name", )
+                    _locals['n']
+                    return eval('self.builder.bind(r, n)', self.globals, _locals)
+                def _G__or_49():
+                    return eval('r', self.globals, _locals)
+                return self._or([_G__or_48, _G__or_49])
+            def _G__or_51():
+                self.apply("token", eval("':'", self.globals, _locals))
+                _locals['n'] = self.apply("name", )
+                _locals['n']
+                return eval('self.builder.bind(self.builder.apply("anything", self.name), n)', self.globals, _locals)
+            return self._or([_G__or_50, _G__or_51])
+
+
+        def rule_expr4(self):
+            _locals = {'self': self}
+            self.locals['expr4'] = _locals
+            def _G_many_52():
+                return self.apply("expr3", )
+            _locals['es'] = self.many(_G_many_52)
+            _locals['es']
+            return eval('self.builder.sequence(es)', self.globals, _locals)
+
+
+        def rule_expr(self):
+            _locals = {'self': self}
+            self.locals['expr'] = _locals
+            _locals['e'] = self.apply("expr4", )
+            _locals['e']
+            def _G_many_53():
+                self.apply("token", eval("'|'", self.globals, _locals))
+                return self.apply("expr4", )
+            _locals['es'] = self.many(_G_many_53)
+            _locals['es']
+            eval('es.insert(0, e)', self.globals, _locals)
+            return eval('self.builder._or(es)', self.globals, _locals)
+
+
+        def rule_ruleValue(self):
+            _locals = {'self': self}
+            self.locals['ruleValue'] = _locals
+            self.apply("token", eval('"=>"', self.globals, _locals))
+            return eval('self.ruleValueExpr()', self.globals, _locals)
+
+
+        def rule_semanticPredicate(self):
+            _locals = {'self': self}
+            self.locals['semanticPredicate'] = _locals
+            self.apply("token", eval('"?("', self.globals, _locals))
+            return eval('self.semanticPredicateExpr()', self.globals, _locals)
+
+
+        def rule_semanticAction(self):
+            _locals = {'self': self}
+            self.locals['semanticAction'] = _locals
+            self.apply("token", eval('"!("', self.globals, _locals))
+            return eval('self.semanticActionExpr()', self.globals, _locals)
+
+
+        def rule_rulePart(self):
+            _locals = {'self': self}
+            self.locals['rulePart'] = _locals
+            _locals['requiredName'] = self.apply("anything", )
+            _locals['requiredName']
+            self.apply("spaces", )
+            _locals['n'] = self.apply("name", )
+            _locals['n']
+            def _G_pred_54():
+                return eval('n == requiredName', self.globals, _locals)
+            self.pred(_G_pred_54)
+            eval('setattr(self, "name", n)', self.globals, _locals)
+            _locals['args'] = self.apply("expr4", )
+            _locals['args']
+            def _G__or_55():
+                self.apply("token", eval('"::="', self.globals, _locals))
+                _locals['e'] = self.apply("expr", )
+                _locals['e']
+                return eval('self.builder.sequence([args, e])', self.globals, _locals)
+            def _G__or_56():
+                return eval('args', self.globals, _locals)
+            return self._or([_G__or_55, _G__or_56])
+
+
+        def rule_rule(self):
+            _locals = {'self': self}
+            self.locals['rule'] = _locals
+            self.apply("spaces", )
+            def _G_lookahead_57():
+                _locals['n'] = self.apply("name", )
+                return _locals['n']
+            self.lookahead(_G_lookahead_57)
+            _locals['r'] = self.apply("rulePart", eval('n', self.globals, _locals))
+            _locals['r']
+            def _G__or_59():
+                def _G_many_58():
+                    return self.apply("rulePart", eval('n', self.globals, _locals))
+                _locals['rs'] = self.many(_G_many_58, _G_many_58())
+                _locals['rs']
+                return eval('(n, self.builder._or([r] + rs))', self.globals, _locals)
+            def _G__or_60():
+                return eval('(n, r)', self.globals, _locals)
+            return self._or([_G__or_59, _G__or_60])
+
+
+        def rule_grammar(self):
+            _locals = {'self': self}
+            self.locals['grammar'] = _locals
+            def _G_many_61():
+                return self.apply("rule", )
+            _locals['rs'] = self.many(_G_many_61)
+            _locals['rs']
+            self.apply("spaces", )
+            return eval('self.builder.makeGrammar(rs)', self.globals, _locals)
+
+
+    return Grammar
+
+OMETA_GRAMMAR = ('f201d7b19b66d90a8fff042dcb33ffd723625f7c', makeOMetaGrammar,
+    ['anything', 'digit', 'end', 'exactly', 'grammar', 'hexdigit', 'letter', 'letterOrDigit', 'octaldigit', 'regex', 'rule', 'ruleValue', 'semanticAction', 'semanticPredicate', 'spaces', 'token'],
+    ['expr', 'expr1', 'expr2', 'expr3', 'expr4'])
+
+
+def makeNullOptimizer(OMeta):
+    class Grammar(OMeta):
+        def rule_opt(self):
+            _locals = {'self': self}
+            self.locals['opt'] = _locals
+            def _G__or_19():
+                def _G_listpattern_3():
+                    self.exactly('Apply')
+                    _locals['ruleName'] = self.apply("anything", )
+                    _locals['ruleName']
+                    _locals['codeName'] = self.apply("anything", )
+                    _locals['codeName']
+                    def _G_listpattern_2():
+                        def _G_many_1():
+                            return self.apply("anything", )
+                        _locals['exprs'] = self.many(_G_many_1)
+                        return _locals['exprs']
+                    return self.listpattern(_G_listpattern_2)
+                self.listpattern(_G_listpattern_3)
+                return eval('self.builder.apply(ruleName, codeName, *exprs)', self.globals, _locals)
+            def _G__or_20():
+                def _G_listpattern_4():
+                    self.exactly('Exactly')
+                    _locals['expr'] = self.apply("anything", )
+                    return _locals['expr']
+                self.listpattern(_G_listpattern_4)
+                return eval('self.builder.exactly(expr)', self.globals, _locals)
+            def _G__or_21():
+                def _G_listpattern_5():
+                    self.exactly('Many')
+                    _locals['expr'] = self.apply("opt", )
+                    return _locals['expr']
+                self.listpattern(_G_listpattern_5)
+                return eval('self.builder.many(expr)', self.globals, _locals)
+            def _G__or_22():
+                def _G_listpattern_6():
+                    self.exactly('Many1')
+                    _locals['expr'] = self.apply("opt", )
+                    return _locals['expr']
+                self.listpattern(_G_listpattern_6)
+                return eval('self.builder.many1(expr)', self.globals, _locals)
+            def _G__or_23():
+                def _G_listpattern_7():
+                    self.exactly('Optional')
+                    _locals['expr'] = self.apply("opt", )
+                    return _locals['expr']
+                self.listpattern(_G_listpattern_7)
+                return eval('self.builder.optional(expr)', self.globals, _locals)
+            def _G__or_24():
+                def _G_listpattern_9():
+                    self.exactly('Or')
+                    def _G_many_8():
+                        return self.apply("opt", )
+                    _locals['exprs'] = self.many(_G_many_8)
+                    return _locals['exprs']
+                self.listpattern(_G_listpattern_9)
+                return eval('self.builder._or(exprs)', self.globals, _locals)
+            def _G__or_25():
+                def _G_listpattern_11():
+                    self.exactly('And')
+                    def _G_many_10():
+                        return self.apply("opt", )
+                    _locals['exprs'] = self.many(_G_many_10)
+                    return _locals['exprs']
+                self.listpattern(_G_listpattern_11)
+                return eval('self.builder.sequence(exprs)', self.globals, _locals)
+            def _G__or_26():
+                def _G_listpattern_12():
+                    self.exactly('Not')
+                    _locals['expr'] = self.apply("opt", )
+                    return _locals['expr']
+                self.listpattern(_G_listpattern_12)
+                return eval('self.builder._not(expr)', self.globals, _locals)
+            def _G__or_27():
+                def _G_listpattern_13():
+                    self.exactly('Lookahead')
+                    _locals['expr'] = self.apply("opt", )
+                    return _locals['expr']
+                self.listpattern(_G_listpattern_13)
+                return eval('self.builder.lookahead(expr)', self.globals, _locals)
+            def _G__or_28():
+                def _G_listpattern_14():
+                    self.exactly('Bind')
+                    _locals['name'] = self.apply("anything", )
+                    _locals['name']
+                    _locals['expr'] = self.apply("opt", )
+                    return _locals['expr']
+                self.listpattern(_G_listpattern_14)
+                return eval('self.builder.bind(expr, name)', self.globals, _locals)
+            def _G__or_29():
+                def _G_listpattern_15():
+                    self.exactly('Predicate')
+                    _locals['expr'] = self.apply("opt", )
+                    return _locals['expr']
+                self.listpattern(_G_listpattern_15)
+                return eval('self.builder.pred(expr)', self.globals, _locals)
+            def _G__or_30():
+                def _G_listpattern_16():
+                    self.exactly('Action')
+                    _locals['expr'] = self.apply("opt", )
+                    return _locals['expr']
+                self.listpattern(_G_listpattern_16)
+                return eval('self.builder.action(expr)', self.globals, _locals)
+            def _G__or_31():
+                def _G_listpattern_17():
+                    self.exactly('Python')
+                    _locals['name'] = self.apply("anything", )
+                    _locals['name']
+                    _locals['code'] = self.apply("anything", )
+                    return _locals['code']
+                self.listpattern(_G_listpattern_17)
+                return eval('self.builder.compilePythonExpr(name, code)', self.globals, _locals)
+            def _G__or_32():
+                def _G_listpattern_18():
+                    self.exactly('List')
+                    _locals['exprs'] = self.apply("opt", )
+                    return _locals['exprs']
+                self.listpattern(_G_listpattern_18)
+                return eval('self.builder.listpattern(exprs)', self.globals, _locals)
+            return self._or([_G__or_19, _G__or_20, _G__or_21, _G__or_22, _G__or_23, _G__or_24, _G__or_25, _G__or_26, _G__or_27, _G__or_28, _G__or_29, _G__or_30, _G__or_31, _G__or_32])
+
+
+        def rule_grammar(self):
+            _locals = {'self': self}
+            self.locals['grammar'] = _locals
+            def _G_listpattern_35():
+                self.exactly('Grammar')
+                def _G_listpattern_34():
+                    def _G_many_33():
+                        return self.apply("rulePair", )
+                    _locals['rs'] = self.many(_G_many_33)
+                    return _locals['rs']
+                return self.listpattern(_G_listpattern_34)
+            self.listpattern(_G_listpattern_35)
+            return eval('self.builder.makeGrammar(rs)', self.globals, _locals)
+
+
+        def rule_rulePair(self):
+            _locals = {'self': self}
+            self.locals['rulePair'] = _locals
+            def _G_listpattern_36():
+                _locals['name'] = self.apply("anything", )
+                _locals['name']
+                _locals['rule'] = self.apply("opt", )
+                return _locals['rule']
+            self.listpattern(_G_listpattern_36)
+            return eval('(name, rule)', self.globals, _locals)
+
+
+    return Grammar
+
+NULL_OPTIMIZER = ('f1a694cc37e3e665318acc7443ffc37c11bbadb3', makeNullOptimizer,
+    ['anything', 'digit', 'end', 'exactly', 'grammar', 'letter', 'letterOrDigit', 'regex', 'rulePair', 'spaces', 'token'],
+    ['opt'])
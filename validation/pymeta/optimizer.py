@@ -0,0 +1,470 @@
+"""
+An optimizing pass over the trees L{pymeta.builder.TreeBuilder} makes of a
+grammar, run before the grammar is turned into code.
+
+ - Token rules with a literal argument become C{Token} nodes, which are
+   generated as a direct call rather than a rule application.
+ - Small rules which are not recursive and bind no names are inlined where
+   they are applied.
+ - A C{spaces} followed by something which skips whitespace itself (a
+   token, or a rule which starts with one) is dropped.
+ - Alternatives of an C{Or} starting with the same expression are
+   left-factored, so the common prefix is matched once rather than once
+   per alternative. Alternatives are only moved past others which cannot
+   match the same input, so the choice stays ordered.
+ - Consecutive tokens are merged into one C{Token} node.
+ - A choice some of whose alternatives are known to start with particular
+   characters (after any whitespace) becomes a C{Dispatch} node, which is
+   generated as a call trying only the alternatives which can start with
+   the next character of the input.
+
+First sets, like inlining, are worked out from the grammar's own rules, so
+a subclass redefining a rule should be optimized along with it.
+
+The optimized tree is then given to a builder with L{build}.
+"""
+from ast import literal_eval
+
+from analysis import recursiveRules
+
+# The largest rule body, in tree nodes, which is inlined
+INLINE_SIZE = 12
+
+# Nodes with one child expression, in their second element
+_ONE_CHILD = ("Many", "Many1", "Optional", "Not", "Lookahead", "List",
+              "Predicate", "Action")
+
+
+def _children(node):
+    """
+    The expressions directly inside a tree node.
+    """
+    kind = node[0]
+    if kind in ("And", "Or"):
+        return node[1:]
+    if kind == "Dispatch":
+        return node[2:]
+    if kind in _ONE_CHILD:
+        return [node[1]]
+    if kind == "Bind":
+        return [node[2]]
+    return []
+
+
+def _mapChildren(node, f):
+    """
+    A copy of a tree node with f applied to the expressions inside it.
+    """
+    kind = node[0]
+    if kind in ("And", "Or"):
+        return [kind] + [f(child) for child in node[1:]]
+    if kind == "Dispatch":
+        return node[:2] + [f(child) for child in node[2:]]
+    if kind in _ONE_CHILD:
+        return [kind, f(node[1])]
+    if kind == "Bind":
+        return ["Bind", node[1], f(node[2])]
+    return node
+
+
+def _walk(node):
+    """
+    Every node of a tree.
+    """
+    yield node
+    for child in _children(node):
+        for n in _walk(child):
+            yield n
+
+
+def _elements(node):
+    """
+    The expressions of a sequence, or the node alone if it is not one.
+    """
+    if node[0] == "And":
+        return list(node[1:])
+    return [node]
+
+
+def _sequence(elements):
+    if len(elements) == 1:
+        return elements[0]
+    return ["And"] + elements
+
+
+def _choice(alternatives):
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return ["Or"] + alternatives
+
+
+def _flatten(node):
+    """
+    Splice sequences into the sequences holding them, and choices into
+    choices, and drop one-element sequences and choices.
+    """
+    node = _mapChildren(node, _flatten)
+    kind = node[0]
+    if kind == "And":
+        elements = []
+        last = len(node) - 2
+        for i, child in enumerate(node[1:]):
+            # An empty sequence only matters as the value of the last one
+            if child[0] == "And" and (len(child) > 1 or i < last):
+                elements.extend(child[1:])
+            else:
+                elements.append(child)
+        return elements and _sequence(elements) or ["And"]
+    if kind == "Or":
+        alternatives = []
+        for child in node[1:]:
+            if child[0] == "Or":
+                alternatives.extend(child[1:])
+            else:
+                alternatives.append(child)
+        return _choice(alternatives)
+    return node
+
+
+class Optimizer(object):
+    """
+    Optimizes the rules of one grammar.
+    """
+
+    def __init__(self, rules, builtins):
+        """
+        @param rules: A list of (rule name, tree) pairs.
+        @param builtins: The names of the built-in rules of L{OMetaBase}
+        the grammar has not redefined.
+        """
+        self.builtins = set(builtins) - set(name for (name, body) in rules)
+        self.definitions = {}
+        for name, body in rules:
+            self.definitions[name] = _flatten(self._tokens(body))
+        self.recursive = recursiveRules(dict(
+            (name, set(n[1] for n in _walk(body) if n[0] == "Apply"))
+            for (name, body) in self.definitions.iteritems()))
+        self._firsts = {}
+        self._skips = {}
+
+    def _isApply(self, node, name):
+        """
+        Whether node applies the built-in rule of that name, without
+        arguments.
+        """
+        return (node[0] == "Apply" and node[1] == name and not node[3]
+                and name in self.builtins)
+
+    def _tokens(self, node):
+        """
+        Turn applications of the token rule to a literal into Token nodes.
+        """
+        if (node[0] == "Apply" and node[1] == "token" and len(node[3]) == 1
+            and "token" in self.builtins):
+            try:
+                token = literal_eval(node[3][0])
+            except (ValueError, SyntaxError):
+                return node
+            if isinstance(token, basestring):
+                return ["Token", [token]]
+            return node
+        return _mapChildren(node, self._tokens)
+
+    def inlinable(self, name):
+        """
+        Whether applications of the named rule are replaced by its body: it
+        is small, not recursive, and binds, evaluates and applies nothing
+        that depends on being in its own rule.
+        """
+        body = self.definitions.get(name)
+        if body is None or name in self.recursive:
+            return False
+        nodes = list(_walk(body))
+        if len(nodes) > INLINE_SIZE:
+            return False
+        for node in nodes:
+            if node[0] in ("Bind", "Python", "Action", "Predicate"):
+                return False
+            if node[0] == "Apply" and (node[3] or node[1] == "super"):
+                return False
+        return True
+
+    def _inline(self, node):
+        if node[0] == "Apply" and not node[3] and self.inlinable(node[1]):
+            return self._inline(self.definitions[node[1]])
+        return _mapChildren(node, self._inline)
+
+    def pure(self, node, seen=()):
+        """
+        Whether matching node has no effect but consuming input: it
+        evaluates no Python except in predicates, and applies only pure
+        rules.
+        """
+        kind = node[0]
+        if kind in ("Python", "Action"):
+            return False
+        if kind == "Predicate":
+            return True
+        if kind == "Apply":
+            name = node[1]
+            if name in self.definitions:
+                return name in seen or self.pure(self.definitions[name],
+                                                 seen + (name,))
+            return name in self.builtins
+        for child in _children(node):
+            if not self.pure(child, seen):
+                return False
+        return True
+
+    def first(self, node, seen=()):
+        """
+        The literal prefixes one of which the input must start with, after
+        any whitespace, for node to match; or None if that is not known.
+        """
+        kind = node[0]
+        if kind == "Token":
+            token = node[1][0]
+            if token and not token[0].isspace():
+                return frozenset([token])
+            return None
+        if kind == "Exactly":
+            if (isinstance(node[1], basestring) and node[1]
+                and not node[1][0].isspace()):
+                return frozenset([node[1]])
+            return None
+        if kind == "And":
+            for element in node[1:]:
+                if not self._isApply(element, "spaces"):
+                    return self.first(element, seen)
+            return None
+        if kind == "Or":
+            firsts = frozenset()
+            for alternative in node[1:]:
+                first = self.first(alternative, seen)
+                if first is None:
+                    return None
+                firsts |= first
+            return firsts
+        if kind in ("Bind", "Many1"):
+            return self.first(_children(node)[0], seen)
+        if kind == "Apply" and not node[3] and node[1] in self.definitions:
+            name = node[1]
+            if name in seen:
+                return None
+            if name not in self._firsts:
+                self._firsts[name] = self.first(self.definitions[name],
+                                                seen + (name,))
+            return self._firsts[name]
+        return None
+
+    def exclusive(self, a, b):
+        """
+        Whether no input can be matched by both a and b.
+        """
+        firstA, firstB = self.first(a), self.first(b)
+        if firstA is None or firstB is None:
+            return False
+        for x in firstA:
+            for y in firstB:
+                if x.startswith(y) or y.startswith(x):
+                    return False
+        return True
+
+    def skipsSpaces(self, node, seen=()):
+        """
+        Whether the first thing node does is skip whitespace.
+        """
+        kind = node[0]
+        if kind == "Token" or self._isApply(node, "spaces"):
+            return True
+        if kind == "And":
+            return len(node) > 1 and self.skipsSpaces(node[1], seen)
+        if kind == "Or":
+            for alternative in node[1:]:
+                if not self.skipsSpaces(alternative, seen):
+                    return False
+            return True
+        if kind in ("Bind", "Many1"):
+            return self.skipsSpaces(_children(node)[0], seen)
+        if kind == "Apply" and not node[3] and node[1] in self.definitions:
+            name = node[1]
+            if name in seen:
+                return False
+            if name not in self._skips:
+                self._skips[name] = self.skipsSpaces(self.definitions[name],
+                                                     seen + (name,))
+            return self._skips[name]
+        return False
+
+    def _dropSpaces(self, node):
+        node = _mapChildren(node, self._dropSpaces)
+        if node[0] != "And":
+            return node
+        elements = node[1:]
+        kept = [element for (i, element) in enumerate(elements[:-1])
+                if not (self._isApply(element, "spaces") and
+                        self.skipsSpaces(elements[i + 1]))]
+        return _sequence(kept + elements[-1:])
+
+    def _safeHead(self, node):
+        """
+        Whether node can be matched once for several alternatives starting
+        with it: it is deterministic and has no effects.
+        """
+        if node[0] in ("Token", "Exactly"):
+            return True
+        if node[0] == "Bind":
+            return self._safeHead(node[2])
+        return (node[0] == "Apply" and not node[3] and node[1] != "super"
+                and self.pure(node))
+
+    def _factor(self, node):
+        node = _mapChildren(node, self._factor)
+        if node[0] != "Or":
+            return node
+        groups = []    # [head, alternatives, whether they all have a tail]
+        for alternative in node[1:]:
+            elements = _elements(alternative)
+            target = None
+            if elements and self._safeHead(elements[0]):
+                for group in reversed(groups):
+                    if (group[0] == elements[0] and group[2]
+                        and len(elements) > 1):
+                        target = group
+                        break
+                    for other in group[1]:
+                        if not self.exclusive(alternative, _sequence(other)):
+                            break
+                    else:
+                        continue
+                    break
+            if target is not None:
+                target[1].append(elements)
+            else:
+                groups.append([elements and elements[0], [elements],
+                               len(elements) > 1])
+        alternatives = []
+        for head, members, hasTails in groups:
+            if len(members) > 1:
+                rest = self._factor(_choice([_sequence(m[1:])
+                                             for m in members]))
+                alternatives.append(_sequence([head] + _elements(rest)))
+            else:
+                alternatives.append(_sequence(members[0]) if members[0]
+                                    else ["And"])
+        return _choice(alternatives)
+
+    def _mergeTokens(self, node):
+        node = _mapChildren(node, self._mergeTokens)
+        if node[0] != "And":
+            return node
+        elements = []
+        for element in node[1:]:
+            if element[0] == "Token" and elements and \
+                   elements[-1][0] == "Token":
+                elements[-1] = ["Token", elements[-1][1] + element[1]]
+            else:
+                elements.append(element)
+        return _sequence(elements)
+
+    def starts(self, node):
+        """
+        The characters input matched by node can start with, after any
+        whitespace, as a string; or None if that is not known.
+        """
+        first = self.first(node)
+        if first is None:
+            return None
+        return "".join(sorted(set(prefix[0] for prefix in first)))
+
+    def _predict(self, node):
+        if node[0] == "Or":
+            starts = [self.starts(alternative) for alternative in node[1:]]
+            if [start for start in starts if start is not None]:
+                node = ["Dispatch", starts] + node[1:]
+        return _mapChildren(node, self._predict)
+
+    def rule(self, name):
+        """
+        The optimized tree of the named rule.
+        """
+        node = self.definitions[name]
+        for step in (self._inline, _flatten, self._dropSpaces, self._factor,
+                     _flatten, self._mergeTokens, self._predict):
+            node = step(node)
+        return node
+
+
+def optimize(tree, builtins):
+    """
+    Optimize the tree of a grammar.
+
+    @param tree: A tree made by L{pymeta.builder.TreeBuilder}.
+    @param builtins: The names of the built-in rules of L{OMetaBase} the
+    grammar's superclass has not redefined.
+    """
+    rules = tree[1]
+    optimizer = Optimizer(rules, builtins)
+    return ["Grammar", [(name, optimizer.rule(name)) for (name, body)
+                        in rules]]
+
+
+class _Emitter(object):
+    """
+    Hands a tree to a builder, the way the metagrammar would have while
+    parsing the grammar. The builder's grammar is the emitter, whose name
+    is that of the rule being built.
+    """
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.name = None
+        builder.grammar = self
+
+    def emit(self, node):
+        b = self.builder
+        kind = node[0]
+        if kind == "Apply":
+            # Applications inlined from other rules now belong to this one
+            return b.apply(node[1], self.name, *node[3])
+        if kind == "Exactly":
+            return b.exactly(node[1])
+        if kind == "Token":
+            return b.tokens(node[1])
+        if kind == "Python":
+            # As an expression of its own, e.g. an alternative left by
+            # factoring "A B => x | A => y", it is a sequence of one
+            return b.sequence([b.compilePythonExpr(node[1], node[2])])
+        if kind in ("Action", "Predicate") and node[1][0] == "Python":
+            python = b.compilePythonExpr(node[1][1], node[1][2])
+            if kind == "Action":
+                return b.action(python)
+            return b.pred(python)
+        if kind == "Bind":
+            return b.bind(self.emit(node[2]), node[1])
+        if kind == "Or":
+            return b._or([self.emit(child) for child in node[1:]])
+        if kind == "Dispatch":
+            return b.dispatch([self.emit(child) for child in node[2:]],
+                              node[1])
+        if kind == "And":
+            return b.sequence([self.emit(child) for child in node[1:]])
+        method = {"Many": b.many, "Many1": b.many1, "Optional": b.optional,
+                  "Not": b._not, "Lookahead": b.lookahead, "List":
+                  b.listpattern, "Predicate": b.pred, "Action": b.action}
+        return method[kind](self.emit(node[1]))
+
+    def grammar(self, tree):
+        rules = []
+        for name, body in tree[1]:
+            self.name = name
+            rules.append((name, self.emit(body)))
+        return self.builder.makeGrammar(rules)
+
+
+def build(tree, builder):
+    """
+    Build a grammar from its tree, optimized or not, with a builder such as
+    L{pymeta.builder.PythonBuilder}.
+    """
+    return _Emitter(builder).grammar(tree)
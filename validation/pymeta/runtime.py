@@ -1,6 +1,8 @@
 """
 Code needed to run a grammar after it has been compiled.
 """
+import re
+
 class ParseError(Exception):
     """
     ?Redo from start
@@ -29,60 +31,206 @@ class unicodeCharacter(unicode):
         """
         raise TypeError("Characters are not iterable")
 
+class _Characters(dict):
+    """
+    The character objects for one type of string, made once per distinct
+    character and shared by every input.
+    """
+    def __init__(self, characterType):
+        dict.__init__(self)
+        self.characterType = characterType
+
+    def __missing__(self, c):
+        ch = self[c] = self.characterType(c)
+        return ch
+
+_characters = _Characters(character)
+for _c in map(chr, range(256)):
+    _characters[_c]
+del _c
+_unicodeCharacters = _Characters(unicodeCharacter)
+
+
 class InputStream(object):
     """
     The basic input mechanism used by OMeta grammars.
+
+    An input stream is a position in the original string (or list) being
+    parsed. Characters are not copied out of it: L{head} looks up a shared
+    L{character} object for the one at the current position. All the
+    streams over one input share a table of streams by position, so moving
+    back and forth reuses the same objects. Memo records are not kept on
+    the streams but in the parser's L{MemoTable}, at the stream's offset
+    plus its position.
     """
+    __slots__ = ('data', 'position', 'offset', '_characters', '_streams')
 
-    def fromIterable(cls, iterable):
+    def fromIterable(cls, iterable, offset=0):
         """
         @param iterable: Any iterable Python object.
+        @param offset: Where this input's positions start in the memo table.
         """
+        if isinstance(iterable, (character, unicodeCharacter)):
+            iter(iterable) # Raises TypeError: characters are not sequences
         if isinstance(iterable, str):
-            data = [character(c) for c in iterable]
+            data, characters = iterable, _characters
         elif isinstance(iterable, unicode):
-            data = [unicodeCharacter(c) for c in iterable]
+            data, characters = iterable, _unicodeCharacters
         else:
-            data = list(iterable)
-        return cls(data, 0)
+            data, characters = list(iterable), None
+        return cls(data, 0, characters, offset=offset)
     fromIterable = classmethod(fromIterable)
 
-    def __init__(self, data, position):
+    def __init__(self, data, position, characters=None, streams=None,
+                 offset=0):
         self.data = data
         self.position = position
-        self.memo = {}
-        self.tl = None
+        self.offset = offset
+        self._characters = characters
+        if streams is None:
+            streams = [None] * (len(data) + 1)
+        if 0 <= position < len(streams):
+            streams[position] = self
+        self._streams = streams
+
+    def _at(self, position):
+        """
+        The stream at the given position of the same input.
+        """
+        if 0 <= position < len(self._streams):
+            stream = self._streams[position]
+            if stream is not None:
+                return stream
+        return InputStream(self.data, position, self._characters,
+                           self._streams, self.offset)
+
+    def __eq__(self, other):
+        return (isinstance(other, InputStream) and other.data is self.data
+                and other.position == self.position)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.data), self.position))
 
     def head(self):
         if self.position >= len(self.data):
             raise IndexError("out of range")
-        return self.data[self.position]
+        if self._characters is None:
+            return self.data[self.position]
+        return self._characters[self.data[self.position]]
 
     def tail(self):
-        if self.tl is None:
-            self.tl = InputStream(self.data, self.position+1)
-        return self.tl
+        return self._at(self.position + 1)
 
     def prev(self):
-        return InputStream(self.data, self.position-1)
+        return self._at(self.position - 1)
 
-    def getMemo(self, name):
+
+def _text(stream):
+    """
+    The string an input stream is over, or None if it is not over a string.
+    """
+    if isinstance(stream, InputStream) and stream._characters is not None:
+        return stream.data
+    return None
+
+
+# Compiled regular expressions for the regex rule, by pattern
+_regexes = {}
+
+
+def _skipWhitespace(data, position):
+    """
+    The position of the first character of a string at or after the given
+    one which is not whitespace, or its length if there is none.
+    """
+    end = len(data)
+    while position < end and data[position].isspace():
+        position += 1
+    return position
+
+
+def _isLetter(c):
+    return c.isalpha()
+
+def _isLetterOrDigit(c):
+    return c.isalnum() or c == '_'
+
+def _isDigit(c):
+    return c.isdigit()
+
+
+class MemoTable(object):
+    """
+    The packrat memo of one parse: a flat dict keyed by
+    C{position * stride + rule id}, where rule ids are the small integers
+    given to a grammar's rules when it is built and C{stride} is how many
+    there are.
+
+    Every input of the parse (the string, and each list matched by a list
+    pattern) reserves its own range of positions. With a window, records
+    for positions more than C{window} behind the furthest position reached
+    are dropped as the parse moves on, which bounds the memory used on
+    long inputs at the cost of re-parsing if the parser backtracks that
+    far.
+    """
+
+    def __init__(self, stride, window=None):
         """
-        Returns the memo record for the named rule.
-        @param name: A rule name.
+        @param stride: The number of rule ids of the grammar.
+        @param window: How many positions of records to keep, or None to
+        keep them all.
         """
-        return self.memo.get(name, None)
+        self.stride = stride
+        self.window = window
+        self.records = {}
+        self.hits = 0
+        self.fills = 0
+        self.evictions = 0
+        self.size = 0
+        self.nextEviction = window
 
+    def reserve(self, length):
+        """
+        Reserve positions for an input of the given length. Returns the
+        offset of its first position.
+        """
+        offset = self.size
+        self.size += length + 1
+        return offset
 
-    def setMemo(self, name, rec):
+    def evict(self, position):
         """
-        Store a memo record for the given value and position for the given
-        rule.
-        @param name: A rule name.
-        @param rec: A memo record.
+        Drop the records for positions more than a window behind the given
+        one. Records of rules still being applied are kept, so left
+        recursion is still detected.
         """
-        self.memo[name] = rec
-        return rec
+        cutoff = (position - self.window) * self.stride
+        records = self.records
+        for key in [k for k, rec in records.iteritems()
+                    if isinstance(k, int) and k < cutoff
+                    and not isinstance(rec, LeftRecursion)]:
+            del records[key]
+            self.evictions += 1
+        self.nextEviction = position + self.window
+
+    def stats(self):
+        """
+        A dict of the counters: hits, fills and evictions, the hit rate
+        (hits per memoized application) and the fill rate (records made per
+        slot of the positions x rules table).
+        """
+        applications = self.hits + self.fills
+        slots = self.size * self.stride
+        return {'hits': self.hits,
+                'fills': self.fills,
+                'evictions': self.evictions,
+                'records': len(self.records),
+                'hitRate': applications and float(self.hits) / applications,
+                'fillRate': slots and float(self.fills) / slots}
+
 
 class ArgInput(object):
     def __init__(self, arg, parent):
@@ -122,12 +270,43 @@ class LeftRecursion(object):
     """
     detected = False
 
+
+def ruleIds(cls):
+    """
+    The ids of the rules of a grammar class: a dict of rule name to a small
+    integer, made the first time they are asked for (when the grammar is
+    built) and kept on the class.
+
+    @param cls: An OMetaBase subclass.
+    """
+    ids = cls.__dict__.get('_ruleIds')
+    if ids is None:
+        names = sorted(name[len("rule_"):] for name in dir(cls)
+                       if name.startswith("rule_"))
+        ids = dict((name, i) for (i, name) in enumerate(names))
+        cls._ruleIds = ids
+    return ids
+
 class OMetaBase(object):
     """
     Base class providing implementations of the fundamental OMeta
     operations. Built-in rules are defined here.
     """
     globals = None
+
+    # How many positions of memo records to keep behind the furthest
+    # position reached, or None to keep every record until the parse ends
+    memoWindow = None
+
+    # The rules whose applications are not memoized: the built-in ones,
+    # which match a character or a run of them and are cheaper to match
+    # again. Grammars add their own cheap rules (see L{pymeta.analysis})
+    unmemoized = frozenset(["anything", "exactly", "spaces", "end", "token",
+                            "letter", "letterOrDigit", "digit", "regex"])
+
+    # The rules which can apply themselves, and so are always memoized
+    recursiveRules = frozenset()
+
     def __init__(self, string, globals=None):
         """
         @param string: The string to be parsed.
@@ -135,7 +314,10 @@ class OMetaBase(object):
         @param globals: A dictionary of names to objects, for use in evaluating
         embedded Python expressions.
         """
+        self._ruleIds = ruleIds(self.__class__)
+        self.memo = MemoTable(len(self._ruleIds), self.memoWindow)
         self.input = InputStream.fromIterable(string)
+        self.memo.reserve(len(self.input.data))
         self.locals = {}
         if self.globals is None:
             if globals is None:
@@ -152,7 +334,8 @@ class OMetaBase(object):
         """
         r = getattr(super(self.__class__, self), "rule_"+ruleName, None)
         if r is not None:
-            self.input.setMemo(ruleName, None)
+            records, key = self._memoSlot(ruleName)
+            records.pop(key, None)
             return self._apply(r, ruleName, args)
         else:
             raise NameError("No rule named '%s'" %(ruleName,))
@@ -171,6 +354,27 @@ class OMetaBase(object):
             raise NameError("No rule named '%s'" %(ruleName,))
 
 
+    def _memoSlot(self, ruleName):
+        """
+        Where the memo record for applying the named rule at the current
+        position goes: a dict and the key in it.
+
+        @param ruleName: A rule name.
+        """
+        input = self.input
+        if input.__class__ is InputStream:
+            memo = self.memo
+            ruleId = self._ruleIds.get(ruleName)
+            if ruleId is not None:
+                position = input.offset + input.position
+                if memo.window is not None and position >= memo.nextEviction:
+                    memo.evict(position)
+                return memo.records, position * memo.stride + ruleId
+            return memo.records, (input.offset + input.position, ruleName)
+        # Rule arguments pushed onto the input keep their own memo
+        return input.memo, ruleName
+
+
     def _apply(self, rule, ruleName, args):
         """
         Apply a rule method to some args.
@@ -185,14 +389,17 @@ class OMetaBase(object):
                 return rule()
             else:
                 return rule(*args)
-        memoRec = self.input.getMemo(ruleName)
+        if ruleName in self.unmemoized:
+            return rule()
+        records, key = self._memoSlot(ruleName)
+        memoRec = records.get(key)
         if memoRec is None:
+            self.memo.fills += 1
             oldPosition = self.input
             lr = LeftRecursion()
-            memoRec = self.input.setMemo(ruleName, lr)
+            records[key] = lr
 
-            memoRec = self.input.setMemo(ruleName,
-                                         [rule(), self.input])
+            memoRec = records[key] = [rule(), self.input]
             if lr.detected:
                 sentinel = self.input
                 while True:
@@ -202,8 +409,7 @@ class OMetaBase(object):
                         if (self.input == sentinel):
                             break
 
-                        memoRec = oldPosition.setMemo(ruleName,
-                                                     [ans, self.input])
+                        memoRec = records[key] = [ans, self.input]
                     except ParseError:
                         break
             self.input = oldPosition
@@ -211,6 +417,8 @@ class OMetaBase(object):
         elif isinstance(memoRec, LeftRecursion):
             memoRec.detected = True
             raise ParseError()
+        else:
+            self.memo.hits += 1
         self.input = memoRec[1]
         return memoRec[0]
 
@@ -233,6 +441,13 @@ class OMetaBase(object):
         @param wanted: What to match.
         """
         i = self.input
+        data = _text(i)
+        if data is not None:
+            position = i.position
+            if position < len(data) and data[position] == wanted:
+                self.input = i._at(position + 1)
+                return wanted
+            raise ParseError()
         try:
             val = self.input.head()
             self.input = self.input.tail()
@@ -280,6 +495,34 @@ class OMetaBase(object):
                 self.input = m
         raise ParseError()
 
+    def _dispatch(self, table, fns):
+        """
+        Call those of a list of functions which can match the input, as
+        L{_or} would, going by the next character of the input which is not
+        whitespace.
+
+        @param table: A pair of a dict of characters to the indices of the
+        functions which can match when the input continues with them, and
+        the indices of the functions which can match however it continues.
+        @param fns: A list of no-argument callables.
+        """
+        m = self.input
+        data = _text(m)
+        if data is not None:
+            position = _skipWhitespace(data, m.position)
+            if position < len(data):
+                candidates = table[0].get(data[position], table[1])
+            else:
+                candidates = table[1]
+        else:
+            candidates = range(len(fns))
+        for i in candidates:
+            try:
+                return fns[i]()
+            except ParseError:
+                self.input = m
+        raise ParseError()
+
     def _not(self, fn):
         """
         Call the given function. Raise ParseError iff it does not.
@@ -299,6 +542,11 @@ class OMetaBase(object):
         """
         Consume input until a non-whitespace character is reached.
         """
+        data = _text(self.input)
+        if data is not None:
+            self.input = self.input._at(_skipWhitespace(data,
+                                                        self.input.position))
+            return True
         while True:
             try:
                 c = self.input.head()
@@ -336,6 +584,7 @@ class OMetaBase(object):
             self.input = InputStream.fromIterable(v)
         except TypeError:
             raise ParseError()
+        self.input.offset = self.memo.reserve(len(self.input.data))
         r = expr()
         self.end()
         self.input = oldInput
@@ -370,6 +619,13 @@ class OMetaBase(object):
         Match and return the given string, consuming any preceding whitespace.
         """
         m = self.input
+        data = _text(m)
+        if data is not None:
+            position = _skipWhitespace(data, m.position)
+            if data.startswith(tok, position):
+                self.input = m._at(position + len(tok))
+                return tok
+            raise ParseError()
         try:
             self.eatWhitespace()
             for c in tok:
@@ -381,51 +637,143 @@ class OMetaBase(object):
 
     rule_token = token
 
-    def letter(self):
+    def tokens(self, toks):
         """
-        Match a single letter.
+        Match a sequence of strings, each after any whitespace, as a
+        sequence of L{token}s would. Returns the last one.
         """
+        m = self.input
+        data = _text(m)
+        if data is not None:
+            position = m.position
+            for tok in toks:
+                position = _skipWhitespace(data, position)
+                if not data.startswith(tok, position):
+                    raise ParseError()
+                position += len(tok)
+            self.input = m._at(position)
+            return tok
         try:
-            x = self.input.head()
-            if x.isalpha():
-                self.input = self.input.tail()
-                return x
-            else:
-                raise ParseError()
-        except IndexError:
+            for tok in toks:
+                self.eatWhitespace()
+                for c in tok:
+                    self.exactly(c)
+            return tok
+        except ParseError:
+            self.input = m
+            raise
+
+    def regex(self, pattern):
+        """
+        Match a regular expression at the current position of a string
+        input, and return the text it matched. Each pattern is compiled the
+        first time it is used.
+
+        @param pattern: A regular expression, as for L{re.compile}.
+        """
+        m = self.input
+        data = _text(m)
+        if data is None:
+            raise ParseError()
+        compiled = _regexes.get(pattern)
+        if compiled is None:
+            compiled = _regexes[pattern] = re.compile(pattern)
+        match = compiled.match(data, m.position)
+        if match is None:
             raise ParseError()
+        self.input = m._at(match.end())
+        return match.group()
 
-    rule_letter = letter
+    rule_regex = regex
 
-    def letterOrDigit(self):
+    def _one(self, test):
         """
-        Match a single alphanumeric character.
+        Match and return a single item of the input for which the given
+        function is true.
         """
+        m = self.input
+        data = _text(m)
+        if data is not None:
+            position = m.position
+            if position < len(data) and test(data[position]):
+                self.input = m._at(position + 1)
+                return m._characters[data[position]]
+            raise ParseError()
         try:
-            x = self.input.head()
+            x = m.head()
         except IndexError:
             raise ParseError()
-        if x.isalnum() or x == '_':
-            self.input = self.input.tail()
+        if test(x):
+            self.input = m.tail()
             return x
         else:
             raise ParseError()
 
+    def unordered(self, separator, members):
+        """
+        Match each of the named rules once, in any order, with a token
+        between them. Names ending in "?" are of rules which may be left
+        out. At each position every rule not yet matched is tried once, so
+        this takes time linear in the input rather than trying each order
+        in turn. Returns a dict of rule name to the value it matched.
+
+        @param separator: The token between the rules' matches.
+        @param members: A list of rule names.
+        """
+        m = self.input
+        end = m
+        remaining = list(members)
+        values = {}
+        while remaining:
+            try:
+                if values:
+                    self.token(separator)
+                self.eatWhitespace()
+            except ParseError:
+                break
+            start = self.input
+            for member in remaining:
+                name = member.rstrip("?")
+                try:
+                    values[name] = self.apply(name)
+                except ParseError:
+                    self.input = start
+                else:
+                    remaining.remove(member)
+                    break
+            else:
+                break
+            end = self.input
+        self.input = end
+        for member in remaining:
+            if not member.endswith("?"):
+                self.input = m
+                raise ParseError()
+        return values
+
+    rule_unordered = unordered
+
+    def letter(self):
+        """
+        Match a single letter.
+        """
+        return self._one(_isLetter)
+
+    rule_letter = letter
+
+    def letterOrDigit(self):
+        """
+        Match a single alphanumeric character.
+        """
+        return self._one(_isLetterOrDigit)
+
     rule_letterOrDigit = letterOrDigit
 
     def digit(self):
         """
         Match a single digit.
         """
-        try:
-            x = self.input.head()
-        except IndexError:
-            raise ParseError()
-        if x.isdigit():
-            self.input = self.input.tail()
-            return x
-        else:
-            raise ParseError()
+        return self._one(_isDigit)
 
     rule_digit = digit
 
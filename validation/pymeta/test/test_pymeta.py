@@ -1,4 +1,4 @@
-import sys, linecache
+import sys, os, glob, linecache
 from types import ModuleType as module
 from twisted.trial import unittest
 from pymeta.runtime import ParseError, OMetaBase
@@ -77,6 +77,59 @@ class OMetaTestCase(unittest.TestCase):
 
 
 
+    def test_tokens(self):
+        """
+        Tokens match strings after any whitespace, and the input is rewound
+        when they do not match.
+        """
+        g = self.compile("""
+        abc ::= <token "ab"> <token 'c'>
+        x ::= <abc> | <token 'a'> 'b' <anything>:y => y
+        """)
+        self.assertEqual(g.abc(" \tab\n c"), "c")
+        self.assertEqual(g.abc(u"ab c"), "c")
+        self.assertEqual(g.abc(["a", "b", " ", "c"]), "c")
+        self.assertEqual(g.x(" abd"), "d")
+        self.assertRaises(ParseError, g.abc, "a b c")
+        self.assertRaises(ParseError, g.abc, " a")
+
+
+    def test_regex(self):
+        """
+        A regular expression matches a run of a string input at once, and
+        the text it matched is the value.
+        """
+        g = self.compile("""
+        number ::= <regex '-?[0-9]+'>:n ','? => int(n)
+        numbers ::= <number>+
+        """)
+        self.assertEqual(g.number("-12,"), -12)
+        self.assertEqual(g.numbers("1,23,4"), [1, 23, 4])
+        self.assertRaises(ParseError, g.number, "x1")
+        self.assertRaises(ParseError, g.number, ["1"])
+
+
+    def test_unordered(self):
+        """
+        Rules can be matched once each in any order, some of them only if
+        present.
+        """
+        g = self.compile("""
+        a ::= <token 'a'> <digit>
+        b ::= <token 'b'> <digit>
+        c ::= <token 'c'> <digit>
+        abc ::= <token '{'> <unordered ',' ['a', 'b?', 'c?']>:v <token '}'>
+                => sorted(v.items())
+        """)
+        self.assertEqual(g.abc("{a1}"), [("a", "1")])
+        self.assertEqual(g.abc("{ c3 , a1 }"), [("a", "1"), ("c", "3")])
+        self.assertEqual(g.abc("{b2,c3,a1}"),
+                         [("a", "1"), ("b", "2"), ("c", "3")])
+        self.assertRaises(ParseError, g.abc, "{b2,c3}")
+        self.assertRaises(ParseError, g.abc, "{a1,a1}")
+        self.assertRaises(ParseError, g.abc, "{a1,}")
+
+
     def test_integers(self):
         """
         Input matches can be made on literal integers.
@@ -443,6 +496,246 @@ class MakeGrammarTest(unittest.TestCase):
         self.assertEqual(TestGrammar2("x").apply("expr"), "x")
         self.assertEqual(TestGrammar2("3").apply("expr"), "3")
 
+class MemoTest(unittest.TestCase):
+    """
+    Tests of the packrat memo table.
+    """
+
+    def setUp(self):
+        from pymeta.grammar import OMeta
+        grammar = """
+        item ::= <letter> | <digit>
+        list ::= (<item> ',' <list> | <item> ';' <list> | <item>)
+        """
+        self.grammarClass = OMeta.makeGrammar(grammar, {})
+
+
+    def test_ruleIds(self):
+        """
+        Every rule of a grammar, its own and inherited ones, has a small
+        integer id once the grammar is built.
+        """
+        ids = self.grammarClass._ruleIds
+        self.assertEqual(sorted(ids.values()), range(len(ids)))
+        for name in ["item", "list", "letter", "anything"]:
+            self.assertIn(name, ids)
+
+
+    def test_counters(self):
+        """
+        Re-applying a rule at the same position is answered from the memo.
+        """
+        g = self.grammarClass("a;b;c")
+        g.apply("list")
+        stats = g.memo.stats()
+        self.assertTrue(stats['hits'] > 0)
+        self.assertTrue(stats['fills'] > 0)
+        self.assertEqual(stats['evictions'], 0)
+        self.assertTrue(0 < stats['hitRate'] < 1)
+        self.assertTrue(0 < stats['fillRate'] < 1)
+
+
+    def test_unmemoized(self):
+        """
+        Cheap rules, and rules only applied in one place, are not memoized.
+        Recursive rules and rules tried at the same position by several
+        alternatives are.
+        """
+        cls = self.grammarClass
+        self.assertEqual(cls.recursiveRules, frozenset(["list"]))
+        self.assertIn("digit", cls.unmemoized)
+        self.assertNotIn("list", cls.unmemoized)
+        self.assertNotIn("item", cls.unmemoized)
+        from pymeta.grammar import OMeta
+        g = OMeta.makeGrammar("""
+        sign ::= '-'
+        number ::= <sign> <digit>+ | <digit>+
+        """, {})
+        self.assertIn("sign", g.unmemoized)
+        self.assertIn("number", g.unmemoized)
+        g = OMeta.makeGrammar("number ::= '-' <digit>+", {}, memoize=True)
+        self.assertEqual(g.unmemoized, frozenset())
+
+
+    def test_profile(self):
+        """
+        Profiling counts the records made and reused for each rule.
+        """
+        from pymeta.analysis import profile, unmemoizedFromProfile
+        counts = profile(self.grammarClass, ["a;b;c", "1,2"], "list")
+        fills, hits = counts["item"]
+        self.assertEqual(fills, 5)
+        self.assertTrue(hits > 0)
+        unmemoized = unmemoizedFromProfile(self.grammarClass, counts, 1.0)
+        self.assertIn("item", unmemoized)
+        self.assertNotIn("list", unmemoized)
+
+
+    def test_window(self):
+        """
+        With a window, records far behind the parse are evicted, without
+        changing what is parsed.
+        """
+        self.grammarClass.memoWindow = 4
+        try:
+            g = self.grammarClass(",".join("abcdefghij"))
+            self.assertEqual(g.apply("list"), "j")
+        finally:
+            del self.grammarClass.memoWindow
+        self.assertTrue(g.memo.evictions > 0)
+        self.assertTrue(len(g.memo.records) < g.memo.fills)
+
+
+
+class FrozenMetagrammarTest(unittest.TestCase):
+    """
+    Tests of the metagrammar generated ahead of time.
+    """
+
+    def test_upToDate(self):
+        """
+        pymeta.metagrammar is what pymeta.freeze generates from the current
+        grammars and code generation.
+        """
+        from pymeta import freeze
+        self.assertEqual(open(freeze.FROZEN_MODULE).read(), freeze.generate())
+
+
+    def test_used(self):
+        """
+        The metagrammar and null optimizer come from the generated module.
+        """
+        from pymeta import grammar, metagrammar
+        self.assertEqual(grammar.OMetaGrammar.__bases__[0].__module__,
+                         metagrammar.__name__)
+        self.assertEqual(grammar.NullOptimizer.__module__,
+                         metagrammar.__name__)
+
+
+
+class OptimizerTest(OMetaTestCase):
+    """
+    Tests of OMeta grammar compilation via the optimizer.
+    """
+
+    def compile(self, grammar):
+        """
+        Produce an object capable of parsing via this grammar.
+
+        @param grammar: A string containing an OMeta grammar.
+        """
+        from pymeta.grammar import OMeta
+        return HandyWrapper(OMeta.makeGrammar(grammar, {}, "TestGrammar",
+                                              optimize=True))
+
+
+    def optimize(self, grammar):
+        """
+        The optimized tree of a grammar's rules, by name.
+        """
+        from pymeta.grammar import OMeta, OMetaGrammar
+        from pymeta.optimizer import optimize
+        tree = OMetaGrammar(grammar).parseGrammar("TestGrammar", TreeBuilder)
+        return dict(optimize(tree, OMeta.builtinRules())[1])
+
+
+    def test_leftFactoring(self):
+        """
+        Alternatives starting alike share the match of their common start,
+        and tokens in a row are matched together.
+        """
+        rules = self.optimize("""
+        pair ::= <token '('> <spaces> <a> <token ','> <spaces> <b> <token ')'>
+               | <token '('> <spaces> <b> <token ','> <spaces> <a> <token ')'>
+               | <token '('> <spaces> <a> <token ')'>
+        a ::= <token '"a"'> <token ':'> <digit>
+        b ::= <token '"b"'> <token ':'> <digit>
+        """)
+        self.assertEqual(rules["pair"],
+            ["And", ["Token", ["("]],
+             ["Dispatch", ['"', '"'],
+              ["And", ["Token", ['"a"', ":"]], ["Apply", "digit", "a", ()],
+               ["Dispatch", [",", ")"],
+                ["And", ["Token", [",", '"b"', ":"]],
+                 ["Apply", "digit", "b", ()], ["Token", [")"]]],
+                ["Token", [")"]]]],
+              ["And", ["Token", ['"b"', ":"]], ["Apply", "digit", "b", ()],
+               ["Token", [",", '"a"', ":"]], ["Apply", "digit", "a", ()],
+               ["Token", [")"]]]]])
+        g = self.compile("""
+        pair ::= <token '('> <spaces> <a> <token ','> <spaces> <b> <token ')'>
+               | <token '('> <spaces> <b> <token ','> <spaces> <a> <token ')'>
+               | <token '('> <spaces> <a> <token ')'>
+        a ::= <token '"a"'> <token ':'> <digit>
+        b ::= <token '"b"'> <token ':'> <digit>
+        """)
+        self.assertEqual(g.pair('( "a" :1 , "b":2 )'), ")")
+        self.assertEqual(g.pair('("b":2,"a":1)'), ")")
+        self.assertEqual(g.pair('( "a":1 )'), ")")
+        self.assertRaises(ParseError, g.pair, '( "b":1 )')
+
+
+    def test_orderKept(self):
+        """
+        Alternatives are not moved past others which could match the same
+        input.
+        """
+        rules = self.optimize("""
+        x ::= 'a' 'b' | <anything> 'c' | 'a' 'c'
+        """)
+        self.assertEqual(rules["x"][0], "Dispatch")
+        self.assertEqual(len(rules["x"][2:]), 3)
+
+
+    def test_factoredActions(self):
+        """
+        An alternative left with only an action after factoring still
+        compiles, and gives its value.
+        """
+        g = self.compile("""
+        x ::= 'a' 'b' => 1
+            | 'a' => 2
+        """)
+        self.assertEqual(g.x("ab"), 1)
+        self.assertEqual(g.x("a"), 2)
+
+
+    def test_grammarFiles(self):
+        """
+        The grammars under validation/grammar compile optimized.
+        """
+        directory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 os.pardir, os.pardir, "grammar")
+        filenames = sorted(glob.glob(os.path.join(directory, "*.grm")))
+        self.assertTrue(filenames)
+        for filename in filenames:
+            self.compile(open(filename).read())
+
+
+    def test_dispatch(self):
+        """
+        Only the alternatives which can start with the next character which
+        is not whitespace are tried, in their order.
+        """
+        rules = self.optimize("""
+        x ::= <token 'a'> <digit> | <token 'b'> <digit> | <letter>
+            | <token 'b'> <letter>
+        """)
+        self.assertEqual(rules["x"][:2], ["Dispatch", ["a", "b", None, "b"]])
+        g = self.compile("""
+        x ::= <token 'a'> <digit> | <token 'b'> <digit> | <letter>
+            | <token 'b'> <letter>
+        """)
+        self.assertEqual(g.x(" a1"), "1")
+        self.assertEqual(g.x(" b2"), "2")
+        self.assertEqual(g.x(" bc"), "c")
+        self.assertEqual(g.x("b"), "b")
+        self.assertEqual(g.x("c"), "c")
+        self.assertRaises(ParseError, g.x, " c")
+        self.assertRaises(ParseError, g.x, "")
+
+
+
 class SelfHostingTest(OMetaTestCase):
     """
     Tests for the OMeta grammar parser defined with OMeta.
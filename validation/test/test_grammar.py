@@ -6,19 +6,42 @@
     and the right is the production name from the syntax file to run on that
     string.
 
-    Outputs the result of each test, and reports the failures.
+    Outputs the result of each test, and reports the failures. With
+    --compare, each test is also parsed by the grammar made without pymeta's
+    optimizer, and any test on which the two parsers disagree fails.
 """
 import sys
 from pymeta.grammar import OMeta
 from pymeta.runtime import ParseError
 from optparse import OptionParser
 
-def run_tests(grammar_iter, tests_iter, expecting=False):
+def parse(parser, to_parse, production):
+    """ Returns the value of parsing the given string with the given
+        production, or the exception parsing it raised
+    """
+    try:
+        return parser(to_parse).apply(production)
+    except Exception as e:
+        return e
+
+def same_result(a, b):
+    """ Whether two results of parse are the same value, or failures of the
+        same kind
+    """
+    if isinstance(a, Exception) or isinstance(b, Exception):
+        return a.__class__ is b.__class__
+    return a == b
+
+def run_tests(grammar_iter, tests_iter, expecting=False, compare=False):
     """ Creates an OMeta grammar from the given grammar iterable, and
-        tries to parse each test in the given test iterable
+        tries to parse each test in the given test iterable. If compare is
+        true, the grammar is made both with and without optimizing it, and
+        the results of the two are compared.
     """
     grammar_string = "".join(grammar_iter)
-    parser = OMeta.makeGrammar(grammar_string, {})
+    parser = OMeta.makeGrammar(grammar_string, {}, optimize=True)
+    if compare:
+        unoptimized = OMeta.makeGrammar(grammar_string, {})
 
     results = []
     failures = []
@@ -29,6 +52,17 @@ def run_tests(grammar_iter, tests_iter, expecting=False):
         else:
             to_parse, production = [x.strip() for x in test.split("|||")]
 
+        if compare:
+            expected_result = parse(unoptimized, to_parse, production)
+            result = parse(parser, to_parse, production)
+            if not same_result(expected_result, result):
+                results.append("F")
+                fail = "Test %s, %s failed" % (to_parse, production)
+                ex   = "Unoptimized gave %r, optimized gave %r" % (
+                    expected_result, result)
+                failures.append((fail, ex))
+                continue
+
         application = parser(to_parse)
         try:
             result_value   = application.apply(production)
@@ -53,11 +87,13 @@ if __name__ == "__main__":
             help="Should the grammar file be read from stdin?", default=False)
     opt.add_option("-e", "--expecting", action="store_true", dest="expecting",
             help="Do these tests have a third column for expected value?", default=False)
+    opt.add_option("-c", "--compare", action="store_true", dest="compare",
+            help="Check the optimized grammar parses like the unoptimized one", default=False)
     options, args = opt.parse_args()
 
     ac = len(args)
     if (options.from_stdin and ac != 1) or (ac != 2 and not options.from_stdin):
-        print "usage: tester.py [-i] [<grammar_file>] <tests_file>"
+        print "usage: tester.py [-i] [-e] [-c] [<grammar_file>] <tests_file>"
         sys.exit(-1)
 
     if options.from_stdin:
@@ -67,7 +103,8 @@ if __name__ == "__main__":
         grammar_file = open(args[0])
         tests_file  = open(args[1])
 
-    results, failures = run_tests(grammar_file, tests_file, options.expecting)
+    results, failures = run_tests(grammar_file, tests_file, options.expecting,
+                                  options.compare)
     print "===Results==="
     print "".join(results)
     if failures:
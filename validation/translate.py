@@ -4,12 +4,24 @@
         <state2> ::= []
                   |  [1]
     and converts it to PyMeta syntax
+
+    References joined by & match in any order, each at most once, with a
+    comma between them; a reference followed by ? may be left out. So
+        <state3> ::= { <a> & <b>? & <c>? }
+    matches an object with an a, and a b, a c, both or neither, in any
+    order. These become a call of pymeta's unordered rule, which matches
+    them without trying each order in turn.
 """
 from re import compile
 
 production_start = compile("\s*<(.*?)>\s*::=\s*(.*)")
 production_cont  = compile("\s*\|\s*(.*)")
 production_ref   = compile("<.*?>")
+permutation      = compile("<[^>]*>\??(?:\s*&\s*<[^>]*>\??)+")
+permutation_ref  = compile("<(.*?)>(\??)")
+
+# The token between the members of a permutation
+PERMUTATION_SEPARATOR = ","
 
 def convert_lines(lines):
     new_prod = None
@@ -39,6 +51,25 @@ def convert_lines(lines):
     yield "\n".join(prod)
 
 def convert_body(body):
+    result = []
+    groups = permutation.findall(body)
+    for part in permutation.split(body):
+        result.append(convert_sequence(part))
+        if groups:
+            result.append(convert_permutation(groups.pop(0)))
+    return " ".join([r for r in result if r])
+
+def convert_permutation(group):
+    """ Converts references joined by & into a call of pymeta's unordered
+        rule
+
+        >>> convert_permutation("<a> & <b>? & <c>?")
+        "<unordered ',' ['a', 'b?', 'c?']>"
+    """
+    members = ["%s%s" % ref for ref in permutation_ref.findall(group)]
+    return "<unordered %r %r>" % (PERMUTATION_SEPARATOR, members)
+
+def convert_sequence(body):
     result = []
     refs = production_ref.findall(body)
     needs_tokens = production_ref.split(body)
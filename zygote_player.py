@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+''' Starts a driver zygote, or plays a game through one.
+
+    $ python zygote_player.py --serve &
+    $ python zygote_player.py -- -g game.sps.slfasl -o results.db
+
+    The zygote imports the driver and compiles the grammars once, then
+    forks a ready driver for every game (see player/zygote.py). Options
+    after "--" are those of game_player.py. batch_player.py --zygote sends
+    all of its games to a running zygote.
+'''
+import sys
+import json
+import signal
+from optparse import OptionParser
+
+# Modify the python path so module load correctly
+sys.path.insert(0, "./validation")
+sys.path.insert(0, "./player")
+
+from zygote import serve, play
+
+# Where the zygote listens unless told otherwise
+SOCKET = './zygote.sock'
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [options] -- [game_player.py options]')
+    parser.add_option("--serve", dest="serve", action="store_true",
+                      default=False, help="Run the zygote")
+    parser.add_option("-S", "--socket", dest="socket", default=SOCKET,
+                      metavar="FILE", help="The zygote's unix socket")
+    options, args = parser.parse_args()
+
+    if options.serve:
+        import validation
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print >> sys.stderr, 'Zygote listening on', options.socket
+        try:
+            serve(options.socket, validation)
+        except KeyboardInterrupt:
+            pass
+    else:
+        reply = play(options.socket, args)
+        if 'error' in reply:
+            print >> sys.stderr, reply['error']
+        else:
+            print json.dumps(reply['game'], indent=2, sort_keys=True)
+        sys.exit(reply['status'])